@@ -1,22 +1,17 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import pandas as pd
 import numpy as np
-from prophet import Prophet
-from ortools.constraint_solver import routing_enums_pb2, pywrapcp
-import folium
-from streamlit_folium import folium_static
-from web3 import Web3
 import json
-import requests
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import logging
+import os
 from datetime import datetime, timedelta
-from math import sqrt
-
-# Tắt log CmdStanPy
-logging.getLogger('cmdstanpy').setLevel(logging.WARNING)
+from distance_engine import available_metrics, build_distance_matrix, leg_distances
+from route_cache import RouteCache, cached_optimize_route
+from order_ingestion import load_orders
+# Các thư viện nặng (ortools, folium, web3, plotly...) chỉ được nạp khi tab cần đến
+from lazy_imports import lazy_import, import_timings
+import instrumentation
+from instrumentation import span, timed
 
 # Dữ liệu người dùng cố định cho mô phỏng đăng nhập
 USERS = {
@@ -48,29 +43,21 @@ def login():
 
     return st.session_state['authenticated'], st.session_state['name']
 
-# Hàm tính khoảng cách Euclidean
-def calculate_distance(lat1, lon1, lat2, lon2):
-    return max(1.0, sqrt((lat2 - lat1)**2 + (lon2 - lon1)**2) * 100)  # Đảm bảo giá trị dương
+# Nguồn thời tiết dùng chung: cache TTL theo thành phố, phiên HTTP chung với timeout chặt, làm mới ở nền
+@st.cache_resource
+def get_weather_provider():
+    weather_provider = lazy_import('weather_provider')
+    api_key = st.secrets.get("OPENWEATHERMAP_KEY", "YOUR_OPENWEATHERMAP_KEY")
+    return weather_provider.WeatherProvider(weather_provider.OpenWeatherMapBackend(api_key), ttl=600)
 
 # Hàm lấy thời tiết thực thời gian
+@timed("weather")
 def get_weather(city="Ho Chi Minh City"):
-    api_key = st.secrets.get("OPENWEATHERMAP_KEY", "YOUR_OPENWEATHERMAP_KEY")
-    url = f"http://api.openweathermap.org/data/2.5/weather?q={city}&appid={api_key}"
     try:
-        response = requests.get(url).json()
-        weather = response['weather'][0]['main']
-        if weather == "Rain":
-            return "Rainy", 1.2  # Tăng ETA 20%
-        return "Sunny", 1.0
-    except:
+        return get_weather_provider().get(city)
+    except Exception:
         return "Sunny", 1.0
 
-# Hàm giả lập tắc nghẽn giao thông
-def get_traffic_status(from_lat, from_lon, to_lat, to_lon):
-    if np.random.random() < 0.2:
-        return 1.3, "Traffic Jam"
-    return 1.0, "Normal"
-
 # Hàm xác thực địa chỉ
 def validate_address(address):
     if np.random.random() < 0.8:
@@ -82,80 +69,135 @@ def send_appointment_notification(phone, eta, order_id):
     message = f"Đơn hàng {order_id}: Dự kiến giao lúc {eta} phút. Vui lòng có mặt!"
     return f"SMS sent to {phone}: {message}"
 
-# Hàm tối ưu lộ trình
-def optimize_route(distance_matrix, df_locations, num_vehicles=1, depot=0, speed_km_per_hour=20):
-    # Kiểm tra dữ liệu
-    if distance_matrix.shape[0] != distance_matrix.shape[1]:
-        raise ValueError("distance_matrix phải là ma trận vuông!")
-    if len(distance_matrix) != len(df_locations):
-        raise ValueError("Số lượng địa điểm không khớp!")
-    if np.any(distance_matrix < 0) or np.any(np.isnan(distance_matrix)):
-        raise ValueError("distance_matrix chứa giá trị âm hoặc NaN!")
-    if num_vehicles > len(distance_matrix) - 1:
-        raise ValueError("Số xe không được vượt quá số địa điểm trừ depot!")
-
-    manager = pywrapcp.RoutingIndexManager(len(distance_matrix), num_vehicles, depot)
-    routing = pywrapcp.RoutingModel(manager)
-
-    def distance_callback(from_index, to_index):
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        base_distance = distance_matrix[from_node][to_node]
-        if base_distance <= 0:
-            return 1  # Giá trị mặc định nếu khoảng cách không hợp lệ
-        traffic_multiplier, _ = get_traffic_status(
-            df_locations['lat'].iloc[from_node], df_locations['lon'].iloc[from_node],
-            df_locations['lat'].iloc[to_node], df_locations['lon'].iloc[to_node]
-        )
-        adjusted_distance = base_distance * traffic_multiplier
-        return max(1, int(adjusted_distance))  # Đảm bảo giá trị dương và nguyên
-
-    routing.SetArcCostEvaluatorOfAllVehicles(routing.RegisterTransitCallback(distance_callback))
-
-    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-    search_parameters.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
-    solution = routing.SolveWithParameters(search_parameters)
-
-    if solution is None:
-        raise ValueError("Không tìm thấy giải pháp tối ưu! Kiểm tra dữ liệu hoặc giảm số lượng xe.")
-
-    routes = []
-    route_details = []
-    total_distance = 0
-    for vehicle_id in range(num_vehicles):
-        index = routing.Start(vehicle_id)
-        route = []
-        route_distance = 0
-        route_times = []
-        cumulative_time = 0
-        while not routing.IsEnd(index):
-            node = manager.IndexToNode(index)
-            route.append(node)
-            next_index = solution.Value(routing.NextVar(index))
-            if next_index == index:
-                break
-            base_distance = distance_matrix[node][manager.IndexToNode(next_index)]
-            traffic_multiplier, _ = get_traffic_status(
-                df_locations['lat'].iloc[node], df_locations['lon'].iloc[node],
-                df_locations['lat'].iloc[manager.IndexToNode(next_index)], df_locations['lon'].iloc[manager.IndexToNode(next_index)]
-            )
-            adjusted_distance = base_distance * traffic_multiplier
-            route_distance += adjusted_distance
-            segment_time = (adjusted_distance / speed_km_per_hour) * 60  # Chuyển đổi sang phút
-            cumulative_time += segment_time
-            route_times.append(cumulative_time)
-            index = next_index
-        route.append(manager.IndexToNode(index))
-        routes.append(route)
-        total_distance += route_distance
-        route_details.append({
-            'vehicle': vehicle_id + 1,
-            'nodes': route,
-            'distance': route_distance,
-            'times': route_times
-        })
-
-    return routes, route_details, total_distance
+# Cache lời giải lộ trình dùng chung cho mọi phiên trong tiến trình
+@st.cache_resource
+def get_route_cache():
+    return RouteCache(max_entries=256, max_bytes=128 * 1024 * 1024, disk_dir=os.environ.get("ROUTE_CACHE_DIR"),
+                      max_disk_bytes=int(os.environ.get("ROUTE_CACHE_DISK_MB", 512)) * 1024 * 1024)
+
+# Kho sự kiện giao hàng (Parquet + tổng hợp tăng dần) dùng chung cho mọi phiên
+@st.cache_resource
+def get_event_store():
+    return lazy_import('delivery_events').DeliveryEventStore(os.environ.get("EVENT_STORE_DIR", "delivery_events"))
+
+# Dịch vụ định tuyến (routing_service.py): chạy riêng tại ROUTING_SERVICE_URL, hoặc trong chính tiến trình web khi
+# ROUTING_SERVICE_INPROCESS=1; mặc định (không đặt biến nào) giải ngay trong phiên
+@st.cache_resource
+def get_routing_client():
+    routing_service = lazy_import('routing_service')
+    url = os.environ.get("ROUTING_SERVICE_URL")
+    if not url and os.environ.get("ROUTING_SERVICE_INPROCESS", "").lower() in ("1", "true", "yes"):
+        workers = int(os.environ.get("ROUTING_WORKERS", routing_service.DEFAULT_WORKERS))
+        server = routing_service.start_in_background(num_workers=workers, cache=get_route_cache())
+        host, port = server.server_address[:2]
+        url = f"http://{host}:{port}"
+    return routing_service.RoutingServiceClient(url) if url else None
+
+# Lưu một kế hoạch giao hàng mới vào phiên và ghi ETA vào kho sự kiện
+def apply_route_plan(routes, route_details, total_distance, orders_data, df_locations, distance_matrix,
+                     distance_metric, solver_options, clustered=False):
+    st.session_state.routes = routes
+    st.session_state.route_details = route_details
+    st.session_state.total_distance = total_distance
+    st.session_state.orders_data = orders_data
+    st.session_state.df_locations = df_locations
+    st.session_state.distance_matrix = distance_matrix  # Lưu distance_matrix
+    st.session_state.distance_metric = distance_metric
+    st.session_state.solver_options = solver_options
+    st.session_state.clustered = clustered
+    get_event_store().record_route_etas(route_details, df_locations)
+
+# Hỏi trạng thái job đang chờ (chờ tối đa wait giây); xong thì áp dụng kế hoạch, chưa xong thì cho nút làm mới
+def poll_routing_job(wait=2.0):
+    pending = st.session_state.routing_job
+    try:
+        with span("routing_service.poll"):
+            job = get_routing_client().job(pending['id'], wait=wait)
+    except Exception as e:
+        st.session_state.routing_job = None
+        st.error(f"Lỗi khi tạo lộ trình: {str(e)}")
+        return
+    if job['status'] not in ('done', 'failed'):
+        st.info(f"Đang giải lộ trình trên dịch vụ định tuyến ({job['status']})...")
+        st.button("Làm mới trạng thái")
+        return
+    st.session_state.routing_job = None
+    routing_service = lazy_import('routing_service')
+    routing_service.observe_job(job)
+    try:
+        routes, route_details, total_distance = routing_service.job_result(job)
+    except ValueError as e:
+        st.error(f"Lỗi khi tạo lộ trình: {str(e)}")
+        return
+    plan_context = {key: value for key, value in pending.items() if key != 'id'}
+    apply_route_plan(routes, route_details, total_distance, **plan_context)
+    st.success("Lộ trình tối ưu đã tạo!")
+
+# Tái tối ưu tăng dần sau khi một đơn bị hẹn lại: bỏ đơn khỏi lộ trình hiện tại, giữ nguyên phần các xe đã giao
+# (các điểm Delivered liên tiếp từ đầu tuyến) và khởi động solver từ lộ trình cũ với thời gian ngắn
+def reschedule_order(order_id, time_limit_s=0.5):
+    routes = st.session_state.get('routes')
+    df_locations = st.session_state.df_locations
+    matches = np.flatnonzero(df_locations['name'].astype(str).to_numpy() == str(order_id))
+    if not routes or not len(matches):
+        return False
+    node = int(matches[0])
+    vehicle_ids = [v for v, route in enumerate(routes) if node in route[1:-1]]
+    if not vehicle_ids:
+        return False
+    names = df_locations['name'].astype(str).to_numpy()
+    visited = []
+    for route in routes:
+        count = 0
+        while count < len(route) - 2 and order_status(names[route[count + 1]]) == "Delivered":
+            count += 1
+        visited.append(count)
+
+    routing = lazy_import('routing')
+    options = dict(st.session_state.get('solver_options', {}))
+    options['time_limit_s'] = time_limit_s
+    distance_matrix = st.session_state.distance_matrix
+    if distance_matrix is None and not st.session_state.get('clustered'):
+        # Lời giải toàn bộ từ dịch vụ định tuyến: dựng ma trận một lần khi cần tái tối ưu, như khi giải tại chỗ
+        distance_matrix = build_distance_matrix(df_locations['lat'].to_numpy(), df_locations['lon'].to_numpy(),
+                                                metric=st.session_state.distance_metric)
+        st.session_state.distance_matrix = distance_matrix
+    if distance_matrix is not None:
+        routes, route_details, total_distance = routing.reoptimize_route(
+            distance_matrix, df_locations, routes, remove_nodes=[node], visited=visited, **options)
+    else:
+        # Chế độ chia cụm không giữ ma trận toàn bộ: chỉ tái tối ưu tuyến của xe chứa đơn này
+        vehicle_id = vehicle_ids[0]
+        nodes = routes[vehicle_id][:-1]
+        sub_locations = df_locations.iloc[nodes].reset_index(drop=True)
+        matrix = build_distance_matrix(sub_locations['lat'].to_numpy(), sub_locations['lon'].to_numpy(),
+                                       metric=st.session_state.distance_metric)
+        if options.get('time_windows') is not None:
+            options['time_windows'] = [options['time_windows'][i] for i in nodes]
+        local_routes, local_details, _ = routing.reoptimize_route(
+            matrix, sub_locations, [list(range(len(nodes))) + [0]], remove_nodes=[nodes.index(node)],
+            visited=[visited[vehicle_id]], **options)
+        routes = [list(route) for route in routes]
+        route_details = list(st.session_state.route_details)
+        routes[vehicle_id] = [nodes[i] for i in local_routes[0]]
+        route_details[vehicle_id] = dict(local_details[0], vehicle=vehicle_id + 1, nodes=routes[vehicle_id])
+        total_distance = sum(detail['distance'] for detail in route_details)
+
+    st.session_state.routes = routes
+    st.session_state.route_details = route_details
+    st.session_state.total_distance = total_distance
+    get_event_store().record_route_etas(route_details, df_locations)
+    return True
+
+# Tên metaheuristic cho ô chọn ở tab 1 (routing.METAHEURISTICS kiểm tra lại khi giải); giữ tĩnh ở đây để tab 1
+# không phải nạp routing/OR-Tools ở mỗi lần rerun
+METAHEURISTIC_NAMES = ('automatic', 'greedy_descent', 'guided_local_search', 'simulated_annealing', 'tabu_search')
+
+# Máy chủ /metrics cho Prometheus, chỉ khởi động một lần khi đặt METRICS_PORT
+@st.cache_resource
+def start_metrics_server():
+    port = os.environ.get("METRICS_PORT")
+    return instrumentation.serve_metrics(int(port)) if port else None
 
 # Load ABI
 try:
@@ -165,6 +207,232 @@ except FileNotFoundError:
     contract_abi = []
     st.warning("Không tìm thấy contract_abi.json. Vui lòng thêm file.")
 
+# Client blockchain dùng chung cho mọi phiên: pool kết nối, nonce cục bộ, cache giá gas
+@st.cache_resource
+def get_chain_client():
+    chain_client = lazy_import('chain_client')
+    return chain_client.ChainClient.from_settings(
+        st.secrets["INFURA_URL"], st.secrets["CONTRACT_ADDRESS"], contract_abi,
+        st.secrets["WALLET_ADDRESS"], st.secrets["PRIVATE_KEY"], chain_id=chain_client.SEPOLIA_CHAIN_ID
+    )
+
+# Chỉ mục cục bộ (SQLite) các sự kiện OrderUpdated, đồng bộ ở luồng nền; tab trạng thái và dashboard chỉ đọc file này
+@st.cache_resource
+def get_chain_indexer():
+    chain_indexer = lazy_import('chain_indexer')
+    indexer = chain_indexer.ChainIndexer.from_client(
+        get_chain_client(), path=os.environ.get("CHAIN_INDEX_DB", chain_indexer.DEFAULT_DB),
+        start_block=int(st.secrets.get("CONTRACT_DEPLOY_BLOCK", 0))
+    )
+    return indexer.start()
+
+# Trạng thái on-chain của các đơn từ chỉ mục; None khi chưa cấu hình blockchain
+def chain_statuses(order_ids):
+    try:
+        indexer = get_chain_indexer()
+    except Exception:
+        return None
+    with span("chain.index_read"):
+        return indexer.statuses(order_ids)
+
+# Các tab 3/4/5 là fragment: tương tác bên trong chỉ chạy lại tab đó, không dựng lại form nhập đơn, bản đồ
+# hay biểu đồ của các tab khác
+
+STATUSES = ["Pending", "In Transit", "Delivered", "Failed - Customer Absent"]
+STATUS_PAGE_SIZE = 25  # Số đơn mỗi trang ở tab trạng thái: chi phí mỗi lần tương tác không tăng theo số đơn
+
+# Trạng thái đơn lưu trong một dict riêng của phiên (widget của trang không hiển thị bị Streamlit xóa state)
+def order_status(order_id):
+    return st.session_state.setdefault('order_statuses', {}).get(order_id, "Pending")
+
+# Đổi trạng thái được ghi ngay vào kho sự kiện (dashboard), không phụ thuộc giao dịch blockchain
+def remember_status(order_id):
+    status = st.session_state[f"status_{order_id}"]
+    st.session_state.setdefault('order_statuses', {})[order_id] = status
+    get_event_store().record_status(order_id, status)
+
+@st.fragment
+def status_tab():
+    st.subheader("Cập Nhật Trạng Thái Giao Hàng")
+    if 'orders_data' in st.session_state and 'df_locations' in st.session_state:
+        orders = st.session_state.orders_data
+        df_locations = st.session_state.df_locations
+        # Chỉ mục tên -> dòng của df_locations dựng một lần thay vì lọc cả bảng cho từng đơn
+        location_indices = {name: index for index, name in zip(df_locations.index, df_locations['name'])}
+        num_pages = max(1, -(-len(orders) // STATUS_PAGE_SIZE))
+        page = st.number_input(f"Trang (1-{num_pages})", min_value=1, max_value=num_pages, value=1) if num_pages > 1 else 1
+        page_orders = orders[(page - 1) * STATUS_PAGE_SIZE:page * STATUS_PAGE_SIZE]
+        # Một truy vấn chỉ mục cho cả trang thay vì một lần gọi hợp đồng cho mỗi đơn
+        on_chain = chain_statuses([order['id'] for order in page_orders])
+        with span("render.status_tab"):
+            for order in page_orders:
+                order_id = order['id']
+                st.write(f"Đơn hàng {order_id}:")
+                if on_chain is not None:
+                    record = on_chain.get(str(order_id))
+                    st.caption(f"Trên blockchain: {record['status']} (block {record['block_number']})" if record
+                               else "Trên blockchain: chưa có cập nhật")
+                # Lấy index của địa điểm từ df_locations
+                location_index = location_indices.get(order_id)
+                # Sử dụng giá trị hiện tại đã lưu trong phiên nếu có, nếu không dùng "Pending"
+                current_status = order_status(order_id)
+                status = st.selectbox(f"Trạng thái {order_id}", STATUSES, key=f"status_{order_id}", index=STATUSES.index(current_status),
+                                      on_change=remember_status, args=(order_id,))
+                if st.button(f"Cập nhật vị trí và trạng thái {order_id} trên Blockchain", key=f"update_loc_{order_id}"):
+                    try:
+                        lat = order['lat'] if location_index is None else df_locations.loc[location_index, 'lat']
+                        lon = order['lon'] if location_index is None else df_locations.loc[location_index, 'lon']
+                        with span("chain.update_location"):
+                            tx_hash = get_chain_client().update_order_location_and_status(order_id, lat, lon, status)
+                        st.success(f"Cập nhật vị trí và trạng thái thành công! Hash: {tx_hash.hex()}")
+                        # Không gán lại st.session_state[f"status_{order_id}"] trực tiếp
+                        # Thay vào đó, cập nhật bằng cách reload hoặc để widget tự xử lý
+                    except Exception as e:
+                        st.error(f"Lỗi cập nhật: {str(e)}")
+
+        # Gửi hàng loạt: ký tại chỗ với nonce cục bộ và gửi theo lô trên một kết nối dùng chung
+        st.write("---")
+        selected_ids = st.multiselect("Chọn đơn hàng để cập nhật hàng loạt", [order['id'] for order in orders])
+        if st.button("Cập nhật tất cả đơn đã chọn trên Blockchain", disabled=not selected_ids):
+            updates = [{'id': order['id'], 'lat': order['lat'], 'lon': order['lon'],
+                        'status': order_status(order['id'])}
+                       for order in orders if order['id'] in selected_ids]
+            try:
+                with span("chain.submit_many"):
+                    results = get_chain_client().submit_many(updates)
+                failed = [(order_id, error) for order_id, _, error in results if error is not None]
+                st.success(f"Đã gửi {len(results) - len(failed)}/{len(results)} giao dịch.")
+                for order_id, error in failed:
+                    st.error(f"Lỗi cập nhật {order_id}: {str(error)}")
+            except Exception as e:
+                st.error(f"Lỗi cập nhật: {str(e)}")
+    else:
+        st.info("Vui lòng nhập đơn hàng ở tab trước.")
+
+
+@st.fragment
+def failure_tab():
+    st.subheader("Xử Lý Thất Bại (Từ Chối/Hẹn Giao)")
+    # Thông báo của lần xử lý trước khi cả trang được chạy lại để tab lộ trình/bản đồ nhận kế hoạch mới
+    for level, message in st.session_state.pop('failure_notices', []):
+        getattr(st, level)(message)
+    if 'orders_data' in st.session_state:
+        order_id = st.selectbox("Chọn đơn hàng thất bại", [order['id'] for order in st.session_state.orders_data])
+        address_input = st.text_input("Địa chỉ khách hàng", value=[o['address'] for o in st.session_state.orders_data if o['id'] == order_id][0])
+        phone_number = st.text_input("Số điện thoại", value="0123456789")
+        reschedule_time = st.date_input("Thời gian hẹn lại", value=datetime.now() + timedelta(days=1))
+        if st.button("Xác Thực Và Xử Lý"):
+            is_valid, status = validate_address(address_input)
+            if is_valid:
+                weather_status, weather_multiplier = get_weather()
+                eta_adjusted = 30 * weather_multiplier
+                message = send_appointment_notification(phone_number, eta_adjusted, order_id)
+                notices = [('success', f"Địa chỉ hợp lệ: {status}"), ('info', message),
+                           ('write', f"Hẹn giao lại vào: {reschedule_time}")]
+                get_event_store().record_status(order_id, "Failed - Rescheduled")
+                try:
+                    with span("reoptimize_route"):
+                        rescheduled = reschedule_order(order_id)
+                except Exception as e:
+                    rescheduled = False
+                    notices.append(('error', f"Lỗi tái tối ưu lộ trình: {str(e)}"))
+                if rescheduled:
+                    # Kế hoạch đã đổi: chạy lại cả trang để tab lộ trình và bản đồ cập nhật
+                    st.session_state.failure_notices = notices + [('info', "Lộ trình đã được tái tối ưu.")]
+                    st.rerun(scope="app")
+                for level, message in notices:
+                    getattr(st, level)(message)
+            else:
+                st.warning(f"Địa chỉ không hợp lệ: {status}")
+                try:
+                    get_event_store().record_status(order_id, "Failed - Rescheduled")
+                    with span("chain.update_status"):
+                        tx_hash = get_chain_client().update_order_status(order_id, "Failed - Rescheduled")
+                    st.success(f"Lý do thất bại lưu trên Blockchain. Hash: {tx_hash.hex()}")
+                except Exception as e:
+                    st.error(f"Lỗi lưu Blockchain: {str(e)}")
+    else:
+        st.info("Vui lòng nhập đơn hàng ở tab trước.")
+
+# Biểu đồ dashboard dựng lại chỉ khi kho sự kiện có sự kiện mới (event_count đổi); các lần khác dùng lại figure
+def dashboard_figures(store, kpis):
+    cached = st.session_state.get('dashboard_figures')
+    if cached is not None and cached[0] == store.event_count:
+        return cached[1]
+    px = lazy_import('plotly.express')
+    go = lazy_import('plotly.graph_objects')
+
+    # Biểu đồ tròn
+    counts = kpis['counts']
+    fig1 = px.pie(values=[counts['on_time'], counts['delayed'], counts['failed']],
+                  names=["Đúng Giờ", "Chậm", "Thất Bại"], title="Tỷ Lệ Giao Hàng")
+
+    # Biểu đồ đường: các cặp ETA / thực tế gần nhất
+    fig2 = None
+    eta_actual = store.eta_vs_actual()
+    if len(eta_actual):
+        fig2 = go.Figure(data=[
+            go.Scatter(x=eta_actual['order_id'], y=eta_actual['actual_min'], mode='markers+lines', name='Thời Gian Thực Tế'),
+            go.Scatter(x=eta_actual['order_id'], y=eta_actual['eta_min'], mode='lines', name='ETA Dự Kiến', line=dict(dash='dash'))
+        ])
+        fig2.update_layout(title="Thời Gian Giao Hàng So Với Dự Kiến", yaxis_title="Thời gian (phút)")
+
+    labels, delay_counts = store.delay_histogram()
+    figures = dict(pie=fig1, eta=fig2, daily=store.daily_frame(), vehicles=store.vehicle_frame(),
+                   delays=pd.Series(delay_counts, index=labels))
+    st.session_state.dashboard_figures = (store.event_count, figures)
+    return figures
+
+@st.fragment
+def dashboard_tab():
+    st.subheader("Báo Cáo Dashboard")
+    if 'orders_data' in st.session_state:
+        # Số liệu lấy từ tổng hợp tăng dần của kho sự kiện, không quét lại lịch sử
+        store = get_event_store()
+        st.button("Làm mới dashboard")
+        kpis = store.kpis()
+        if kpis['completed'] == 0:
+            st.info("Chưa có đơn nào hoàn tất. Cập nhật trạng thái ở tab 3/4 để có số liệu.")
+        else:
+            with span("render.dashboard"):
+                figures = dashboard_figures(store, kpis)
+                st.plotly_chart(figures['pie'])
+                if figures['eta'] is not None:
+                    st.plotly_chart(figures['eta'])
+
+                with st.expander("Chi tiết theo ngày / xe / độ trễ"):
+                    st.write("Thất bại và kết quả theo ngày")
+                    st.bar_chart(figures['daily'])
+                    st.write("Kết quả theo xe")
+                    st.dataframe(figures['vehicles'])
+                    st.write("Phân bố độ trễ (phút, thực tế - ETA)")
+                    st.bar_chart(figures['delays'])
+
+                counts = kpis['counts']
+                on_time_rate = kpis['on_time_rate']
+                st.write(f"Tổng đơn hoàn tất: {kpis['completed']} | Đúng giờ: {counts['on_time']} "
+                         f"({100 * on_time_rate if on_time_rate is not None else 0:.1f}%) | Chậm: {counts['delayed']} | "
+                         f"Thất bại: {counts['failed']} | Đang giao: {kpis['open_orders']}")
+
+        # Trạng thái on-chain của toàn bộ đơn trong phiên, đếm trực tiếp trên chỉ mục SQLite
+        try:
+            indexer = get_chain_indexer()
+        except Exception:
+            indexer = None
+        if indexer is not None:
+            with span("chain.index_read"):
+                chain_counts = indexer.status_counts([order['id'] for order in st.session_state.orders_data])
+                index_stats = indexer.stats()
+            st.write("Trạng thái trên blockchain")
+            if chain_counts:
+                st.bar_chart(pd.Series(chain_counts))
+            st.caption(f"Chỉ mục đến block {index_stats['checkpoint']} ({index_stats['events']} sự kiện)"
+                       + (f" | Lỗi đồng bộ: {index_stats['last_error']}" if index_stats['last_error'] else ""))
+    else:
+        st.info("Vui lòng nhập đơn hàng ở tab trước.")
+
+start_metrics_server()
+
 # Kiểm tra đăng nhập
 authenticated, name = login()
 
@@ -176,65 +444,165 @@ if authenticated:
     - Thời tiết: Điều chỉnh ETA +20% khi mưa.
     - Thất bại: Xác thực địa chỉ, hẹn giao lại.
     """)
+    with st.sidebar.expander("Thời gian nạp module"):
+        timings = import_timings()
+        if timings:
+            for module_name, seconds in sorted(timings.items(), key=lambda item: -item[1]):
+                st.write(f"{module_name}: {seconds * 1000:.0f} ms")
+        else:
+            st.write("Chưa nạp module nặng nào.")
+    with st.sidebar.expander("Debug: thời gian xử lý"):
+        # Đo theo công đoạn là cấu hình của cả tiến trình (INSTRUMENTATION=1), không bật/tắt theo từng phiên
+        stages = instrumentation.snapshot()
+        if not instrumentation.is_enabled():
+            st.write("Đang tắt. Đặt INSTRUMENTATION=1 khi khởi động để đo thời gian theo công đoạn.")
+        elif stages:
+            st.dataframe(pd.DataFrame(stages).set_index('stage')[['count', 'errors', 'last_s', 'p50_s', 'p95_s', 'max_s']])
+            st.download_button("Xuất Prometheus", instrumentation.prometheus_text(), file_name="metrics.prom")
+        else:
+            st.write("Chưa có lần đo nào.")
+    cache_stats = get_route_cache().stats()
+    st.sidebar.caption(f"Cache lộ trình: {cache_stats['hits']} hit / {cache_stats['misses']} miss "
+                       f"({cache_stats['entries']} mục, {cache_stats['bytes'] / 1024:.0f} KB)")
 
     # Tabs cho giao diện cá nhân hóa
     tab1, tab2, tab3, tab4, tab5 = st.tabs(["Nhập Đơn Hàng", "Tối Ưu Lộ Trình", "Cập Nhật Trạng Thái", "Xử Lý Thất Bại", "Báo Cáo Dashboard"])
 
     with tab1:
         st.subheader("Nhập Danh Sách Đơn Hàng")
-        num_orders = st.number_input("Số lượng đơn hàng", min_value=1, max_value=20, value=5)
+        input_mode = st.radio("Cách nhập đơn hàng", ["Nhập tay", "Tải file CSV/Parquet"], horizontal=True)
         orders_data = []
-        for i in range(num_orders):
-            st.write(f"Đơn hàng {i+1}:")
-            order_id = st.text_input(f"ID đơn hàng {i+1}", key=f"id_{i}", value=f"order_{i+1}")
-            address = st.text_input(f"Địa chỉ {i+1}", key=f"addr_{i}", value=f"10 Ngõ {i+1}, Quận 1, TP.HCM")
-            lat = st.number_input(f"Vĩ độ {i+1}", key=f"lat_{i}", value=10.776 + np.random.uniform(-0.01, 0.01))
-            lon = st.number_input(f"Kinh độ {i+1}", key=f"lon_{i}", value=106.700 + np.random.uniform(-0.01, 0.01))
-            orders_data.append({'id': order_id, 'address': address, 'lat': lat, 'lon': lon})
+        uploaded_locations = None
+        if input_mode == "Nhập tay":
+            num_orders = st.number_input("Số lượng đơn hàng", min_value=1, max_value=20, value=5)
+            for i in range(num_orders):
+                st.write(f"Đơn hàng {i+1}:")
+                order_id = st.text_input(f"ID đơn hàng {i+1}", key=f"id_{i}", value=f"order_{i+1}")
+                address = st.text_input(f"Địa chỉ {i+1}", key=f"addr_{i}", value=f"10 Ngõ {i+1}, Quận 1, TP.HCM")
+                lat = st.number_input(f"Vĩ độ {i+1}", key=f"lat_{i}", value=10.776 + np.random.uniform(-0.01, 0.01))
+                lon = st.number_input(f"Kinh độ {i+1}", key=f"lon_{i}", value=106.700 + np.random.uniform(-0.01, 0.01))
+                orders_data.append({'id': order_id, 'address': address, 'lat': lat, 'lon': lon})
+        else:
+            uploaded_file = st.file_uploader("File đơn hàng (cột: id, address, lat, lon)", type=["csv", "parquet"])
+            if uploaded_file is not None:
+                # Chỉ đọc và kiểm tra lại khi file thay đổi, không phải ở mỗi lần rerun
+                ingest_key = f"ingest_{uploaded_file.file_id}"
+                if ingest_key not in st.session_state:
+                    try:
+                        st.session_state[ingest_key] = load_orders(uploaded_file, filename=uploaded_file.name)
+                    except ValueError as e:
+                        st.error(f"Lỗi đọc file: {str(e)}")
+                if ingest_key in st.session_state:
+                    orders_data, uploaded_locations, ingest_errors, error_count = st.session_state[ingest_key]
+                    st.success(f"Đã nạp {len(orders_data)} đơn hàng hợp lệ.")
+                    if error_count:
+                        st.warning(f"{error_count} dòng bị loại do dữ liệu không hợp lệ.")
+                        st.dataframe(ingest_errors.head(500))
+            num_orders = len(orders_data)
+
+        # "road" có khi cấu hình ROAD_NETWORK_FILE (bản trích OSM cục bộ): khoảng cách theo đường thật, không gọi mạng
+        distance_metric = st.selectbox("Cách tính khoảng cách", available_metrics(), index=0)
+
+        with st.expander("Tùy chọn solver"):
+            num_vehicles = st.number_input("Số xe", min_value=1, max_value=max(1, num_orders), value=1)
+            use_capacity = st.checkbox("Giới hạn tải trọng xe (mỗi đơn = 1 đơn vị)")
+            vehicle_capacity = st.number_input("Tải trọng mỗi xe", min_value=1, value=max(1, num_orders), disabled=not use_capacity)
+            use_time_windows = st.checkbox("Khung giờ giao cho từng đơn")
+            delivery_deadline = st.number_input("Hạn giao chậm nhất (phút)", min_value=1, value=120, disabled=not use_time_windows)
+            speed_km_per_hour = st.number_input("Tốc độ xe (km/h)", min_value=1, value=20)
+            departure_time = st.time_input("Giờ xuất phát", value=datetime.now().time().replace(second=0, microsecond=0),
+                                           help="Hệ số giao thông và ETA được tra theo khung 15 phút từ giờ này")
+            metaheuristic = st.selectbox("Metaheuristic", ["Không dùng", *METAHEURISTIC_NAMES], index=0)
+            time_limit_s = st.number_input("Thời gian giải tối đa (giây)", min_value=0.0, value=0.0, step=0.5,
+                                           help="0 = không giới hạn (chỉ dùng lời giải đầu)")
+            num_restarts = st.number_input("Số lần khởi động lại song song", min_value=1, max_value=16, value=1,
+                                           help="Chọn lời giải tốt nhất trong N lần giải trên nhiều tiến trình; cần thời gian giải > 0")
+            use_clustering = st.checkbox("Chia cụm theo vùng trước khi giải (tập đơn rất lớn)",
+                                         help="Không dựng ma trận toàn bộ; mỗi cụm được giải song song trên một tiến trình")
+            max_stops_per_cluster = st.number_input("Số điểm tối đa mỗi cụm", min_value=2, value=200, disabled=not use_clustering)
+            cluster_method = st.selectbox("Cách chia cụm", ["sweep", "kmeans"], disabled=not use_clustering)
+            cross_cluster_improve = st.checkbox("Cải thiện xuyên cụm", disabled=not use_clustering)
 
         if st.button("Tạo Lộ Trình Tối Ưu"):
             if orders_data:
-                num_points = len(orders_data) + 1  # +1 cho depot
-                depot_lat, depot_lon = 10.776, 106.700
-                points = [(depot_lat, depot_lon)] + [(order['lat'], order['lon']) for order in orders_data]
-                # Tạo ma trận khoảng cách dựa trên tọa độ
-                distance_matrix = np.zeros((num_points, num_points))
-                for i in range(num_points):
-                    for j in range(num_points):
-                        if i != j:
-                            lat1, lon1 = points[i]
-                            lat2, lon2 = points[j]
-                            distance_matrix[i][j] = calculate_distance(lat1, lon1, lat2, lon2)
-                np.fill_diagonal(distance_matrix, 0)
-                # Đảm bảo tất cả các giá trị đều dương và có kết nối
-                for i in range(num_points):
-                    for j in range(num_points):
-                        if i != j and distance_matrix[i][j] == 0:
-                            distance_matrix[i][j] = 1.0
-
-                df_locations = pd.DataFrame({
-                    'name': ['Depot'] + [order['id'] for order in orders_data],
-                    'lat': [depot_lat] + [order['lat'] for order in orders_data],
-                    'lon': [depot_lon] + [order['lon'] for order in orders_data]
-                })
-
-                # Debug dữ liệu
-                st.write("Kích thước distance_matrix:", distance_matrix.shape)
-                st.write("Số lượng địa điểm:", len(df_locations))
-                st.write("Distance Matrix:", distance_matrix)
-
+                if uploaded_locations is not None:
+                    df_locations = uploaded_locations
+                else:
+                    depot_lat, depot_lon = 10.776, 106.700
+                    df_locations = pd.DataFrame({
+                        'name': ['Depot'] + [order['id'] for order in orders_data],
+                        'lat': [depot_lat] + [order['lat'] for order in orders_data],
+                        'lon': [depot_lon] + [order['lon'] for order in orders_data]
+                    })
+                time_windows = None
+                if use_time_windows:
+                    time_windows = [(0, int(delivery_deadline))] * len(df_locations)
+                solver_options = dict(
+                    speed_km_per_hour=speed_km_per_hour,
+                    vehicle_capacities=int(vehicle_capacity) if use_capacity else None,
+                    time_windows=time_windows,
+                    metaheuristic=None if metaheuristic == "Không dùng" else metaheuristic,
+                    time_limit_s=time_limit_s or None,
+                    departure=datetime.combine(datetime.now().date(), departure_time).isoformat(timespec='minutes')
+                )
+
+                routing_client = get_routing_client()
+                clustering = dict(max_stops_per_cluster=int(max_stops_per_cluster), vehicles_per_cluster=int(num_vehicles),
+                                  method=cluster_method, improve=cross_cluster_improve) if use_clustering else None
+                if use_clustering or routing_client is not None:
+                    # Chế độ chia cụm / dịch vụ định tuyến không dựng ma trận toàn bộ trong tiến trình UI
+                    distance_matrix = None
+                else:
+                    # Tạo ma trận khoảng cách dựa trên tọa độ (một lượt NumPy, tối thiểu 1.0, đường chéo 0)
+                    with span("distance_matrix"):
+                        distance_matrix = build_distance_matrix(df_locations['lat'].to_numpy(), df_locations['lon'].to_numpy(),
+                                                                metric=distance_metric)
+
+                    # Debug dữ liệu
+                    st.write("Kích thước distance_matrix:", distance_matrix.shape)
+                    st.write("Số lượng địa điểm:", len(df_locations))
+                    if len(distance_matrix) <= 50:
+                        st.write("Distance Matrix:", distance_matrix)
+
+                plan_context = dict(orders_data=orders_data, df_locations=df_locations, distance_matrix=distance_matrix,
+                                    distance_metric=distance_metric, solver_options=solver_options,
+                                    clustered=use_clustering)
                 try:
-                    routes, route_details, total_distance = optimize_route(distance_matrix, df_locations)
-                    st.session_state.routes = routes
-                    st.session_state.route_details = route_details
-                    st.session_state.total_distance = total_distance
-                    st.session_state.orders_data = orders_data
-                    st.session_state.df_locations = df_locations
-                    st.session_state.distance_matrix = distance_matrix  # Lưu distance_matrix
-                    st.success("Lộ trình tối ưu đã tạo!")
+                    if routing_client is not None:
+                        # Gửi job sang dịch vụ định tuyến; kết quả được hỏi lại ở dưới và ở các lần rerun sau
+                        fleet_options = {} if use_clustering else dict(num_vehicles=int(num_vehicles), depot=0,
+                                                                       num_restarts=int(num_restarts))
+                        payload = lazy_import('routing_service').build_job_payload(
+                            df_locations, distance_metric, clustering, **fleet_options, **solver_options)
+                        with span("routing_service.submit"):
+                            job = routing_client.submit(payload)
+                        st.session_state.routing_job = dict(plan_context, id=job['id'])
+                    else:
+                        with span("optimize_route"):
+                            if use_clustering:
+                                routes, route_details, total_distance = lazy_import('decomposition').optimize_route_clustered(
+                                    df_locations,
+                                    metric=distance_metric,
+                                    **clustering,
+                                    **solver_options
+                                )
+                            else:
+                                routes, route_details, total_distance = cached_optimize_route(
+                                    get_route_cache(), distance_matrix, df_locations,
+                                    num_vehicles=int(num_vehicles),
+                                    depot=0,
+                                    num_restarts=int(num_restarts),
+                                    **solver_options
+                                )
+                        apply_route_plan(routes, route_details, total_distance, **plan_context)
+                        st.success("Lộ trình tối ưu đã tạo!")
                 except Exception as e:
                     st.error(f"Lỗi khi tạo lộ trình: {str(e)}")
 
+        # Job đang chờ trên dịch vụ định tuyến: chỉ long-poll ngắn, UI không bị chặn trong suốt lời giải
+        if st.session_state.get('routing_job') is not None:
+            poll_routing_job()
+
     with tab2:
         st.subheader("Tối Ưu Lộ Trình")
         if 'routes' in st.session_state:
@@ -244,137 +612,46 @@ if authenticated:
             df_locations = st.session_state.df_locations
             distance_matrix = st.session_state.distance_matrix  # Lấy distance_matrix từ session_state
             st.write(f"Tổng khoảng cách: {total_distance:.1f} km")
+            if distance_matrix is None:
+                # Chế độ chia cụm / dịch vụ không giữ ma trận toàn bộ; tính mọi chặng của mọi xe trong một lần gọi
+                from_nodes = [node for detail in route_details for node in detail['nodes'][:-1]]
+                to_nodes = [node for detail in route_details for node in detail['nodes'][1:]]
+                all_legs = iter(leg_distances(df_locations['lat'], df_locations['lon'], from_nodes, to_nodes,
+                                              metric=st.session_state.distance_metric))
             for detail in route_details:
                 vehicle_id = detail['vehicle']
                 st.write(f"### Xe {vehicle_id}")
                 route_names = [df_locations['name'][i] for i in detail['nodes']]
                 st.write(f"Lộ trình: {' -> '.join(route_names)}")
+                if distance_matrix is None:
+                    route_legs = [next(all_legs) for _ in detail['nodes'][1:]]
                 for i, (node, time) in enumerate(zip(detail['nodes'][:-1], detail['times'])):
                     next_node = detail['nodes'][i + 1]
-                    distance = distance_matrix[node][next_node] if node != next_node else 0
+                    if distance_matrix is None:
+                        distance = route_legs[i]
+                    else:
+                        distance = distance_matrix[node][next_node] if node != next_node else 0
                     st.write(f"- Đến {df_locations['name'][next_node]}: {time:.1f} phút (Khoảng cách: {distance:.1f} km)")
                 st.write(f"Tổng thời gian xe {vehicle_id}: {sum(detail['times']):.1f} phút")
                 st.write(f"Tổng khoảng cách xe {vehicle_id}: {detail['distance']:.1f} km")
                 st.write("---")
 
-            # Bản đồ
-            m = folium.Map(location=[10.776, 106.700], zoom_start=13)
-            for i, loc in df_locations.iterrows():
-                folium.Marker(
-                    [loc['lat'], loc['lon']],
-                    popup=f"{loc['name']}<br>ETA: {sum([t for d in route_details for t in d['times'] if i in d['nodes']]):.1f} phút",
-                    icon=folium.Icon(color='red' if loc['name'] == 'Depot' else 'blue')
-                ).add_to(m)
-            for detail in route_details:
-                points = [[df_locations['lat'][i], df_locations['lon'][i]] for i in detail['nodes']]
-                color = 'blue' if detail['vehicle'] == 1 else 'red'
-                folium.PolyLine(points, color=color, weight=2.5, popup=f"Xe {detail['vehicle']}: {sum(detail['times']):.1f} phút").add_to(m)
-            folium_static(m)
+            # Bản đồ: HTML được dựng một lần cho mỗi bộ tuyến và dùng lại qua các lần rerun
+            route_map = lazy_import('route_map')
+            signature = route_map.route_signature(df_locations, route_details)
+            if st.session_state.get('route_map_signature') != signature:
+                with span("render.route_map"):
+                    st.session_state.route_map_html = route_map.render_route_map_html(df_locations, route_details)
+                st.session_state.route_map_signature = signature
+            components.html(st.session_state.route_map_html, height=500)
         else:
             st.info("Vui lòng nhập đơn hàng ở tab trước.")
 
     with tab3:
-        st.subheader("Cập Nhật Trạng Thái Giao Hàng")
-        if 'orders_data' in st.session_state and 'df_locations' in st.session_state:
-            orders = st.session_state.orders_data
-            df_locations = st.session_state.df_locations
-            for order in orders:
-                order_id = order['id']
-                st.write(f"Đơn hàng {order_id}:")
-                # Lấy index của địa điểm từ df_locations
-                location_index = df_locations[df_locations['name'] == order_id].index[0] if order_id in df_locations['name'].values else None
-                # Sử dụng giá trị hiện tại từ session_state nếu có, nếu không dùng "Pending"
-                current_status = st.session_state.get(f"status_{order_id}", "Pending")
-                status = st.selectbox(f"Trạng thái {order_id}", ["Pending", "In Transit", "Delivered", "Failed - Customer Absent"], key=f"status_{order_id}", index=["Pending", "In Transit", "Delivered", "Failed - Customer Absent"].index(current_status))
-                if st.button(f"Cập nhật vị trí và trạng thái {order_id} trên Blockchain", key=f"update_loc_{order_id}"):
-                    try:
-                        w3 = Web3(Web3.HTTPProvider(st.secrets["INFURA_URL"]))
-                        contract = w3.eth.contract(address=st.secrets["CONTRACT_ADDRESS"], abi=contract_abi)
-                        nonce = w3.eth.get_transaction_count(st.secrets["WALLET_ADDRESS"])
-                        lat = order['lat'] if location_index is None else df_locations.loc[location_index, 'lat']
-                        lon = order['lon'] if location_index is None else df_locations.loc[location_index, 'lon']
-                        # Chuyển đổi lat và lon thành uint256 (nhân với 10^8 để giữ độ chính xác)
-                        lat_uint = int(lat * 10**8)
-                        lon_uint = int(lon * 10**8)
-                        tx = contract.functions.updateOrderLocationAndStatus(order_id, lat_uint, lon_uint, status).build_transaction({
-                            'from': st.secrets["WALLET_ADDRESS"],
-                            'gas': 300000,
-                            'gasPrice': w3.eth.gas_price,
-                            'nonce': nonce,
-                            'chainId': 11155111
-                        })
-                        signed_tx = w3.eth.account.sign_transaction(tx, st.secrets["PRIVATE_KEY"])
-                        tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-                        st.success(f"Cập nhật vị trí và trạng thái thành công! Hash: {tx_hash.hex()}")
-                        # Không gán lại st.session_state[f"status_{order_id}"] trực tiếp
-                        # Thay vào đó, cập nhật bằng cách reload hoặc để widget tự xử lý
-                    except Exception as e:
-                        st.error(f"Lỗi cập nhật: {str(e)}")
-        else:
-            st.info("Vui lòng nhập đơn hàng ở tab trước.")
+        status_tab()
 
     with tab4:
-        st.subheader("Xử Lý Thất Bại (Từ Chối/Hẹn Giao)")
-        if 'orders_data' in st.session_state:
-            order_id = st.selectbox("Chọn đơn hàng thất bại", [order['id'] for order in st.session_state.orders_data])
-            address_input = st.text_input("Địa chỉ khách hàng", value=[o['address'] for o in st.session_state.orders_data if o['id'] == order_id][0])
-            phone_number = st.text_input("Số điện thoại", value="0123456789")
-            reschedule_time = st.date_input("Thời gian hẹn lại", value=datetime.now() + timedelta(days=1))
-            if st.button("Xác Thực Và Xử Lý"):
-                is_valid, status = validate_address(address_input)
-                if is_valid:
-                    st.success(f"Địa chỉ hợp lệ: {status}")
-                    weather_status, weather_multiplier = get_weather()
-                    eta_adjusted = 30 * weather_multiplier
-                    message = send_appointment_notification(phone_number, eta_adjusted, order_id)
-                    st.info(message)
-                    st.write(f"Hẹn giao lại vào: {reschedule_time}")
-                    # Tái tối ưu (giả lập)
-                    st.session_state.routes = None  # Đánh dấu tái tối ưu
-                    st.info("Lộ trình đã được tái tối ưu.")
-                else:
-                    st.warning(f"Địa chỉ không hợp lệ: {status}")
-                    try:
-                        w3 = Web3(Web3.HTTPProvider(st.secrets["INFURA_URL"]))
-                        contract = w3.eth.contract(address=st.secrets["CONTRACT_ADDRESS"], abi=contract_abi)
-                        nonce = w3.eth.get_transaction_count(st.secrets["WALLET_ADDRESS"])
-                        tx = contract.functions.updateOrderStatus(order_id, "Failed - Rescheduled").build_transaction({
-                            'from': st.secrets["WALLET_ADDRESS"],
-                            'gas': 200000,
-                            'gasPrice': w3.eth.gas_price,
-                            'nonce': nonce,
-                            'chainId': 11155111
-                        })
-                        signed_tx = w3.eth.account.sign_transaction(tx, st.secrets["PRIVATE_KEY"])
-                        tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-                        st.success(f"Lý do thất bại lưu trên Blockchain. Hash: {tx_hash.hex()}")
-                    except Exception as e:
-                        st.error(f"Lỗi lưu Blockchain: {str(e)}")
-        else:
-            st.info("Vui lòng nhập đơn hàng ở tab trước.")
+        failure_tab()
 
     with tab5:
-        st.subheader("Báo Cáo Dashboard")
-        if 'orders_data' in st.session_state:
-            orders = st.session_state.orders_data
-            # Giả lập dữ liệu báo cáo
-            status_data = np.random.choice(["Delivered on Time", "Delayed", "Failed"], len(orders), p=[0.6, 0.3, 0.1])
-            time_data = np.random.normal(25, 5, len(orders))
-            eta_data = np.full(len(orders), 30)
-
-            # Biểu đồ tròn
-            fig1 = px.pie(values=[np.sum(status_data == "Delivered on Time"), np.sum(status_data == "Delayed"), np.sum(status_data == "Failed")],
-                         names=["Đúng Giờ", "Chậm", "Thất Bại"], title="Tỷ Lệ Giao Hàng")
-            st.plotly_chart(fig1)
-
-            # Biểu đồ đường
-            fig2 = go.Figure(data=[
-                go.Scatter(x=[f"Đơn {i+1}" for i in range(len(time_data))], y=time_data, mode='markers+lines', name='Thời Gian Thực Tế'),
-                go.Scatter(x=[f"Đơn {i+1}" for i in range(len(eta_data))], y=eta_data, mode='lines', name='ETA Dự Kiến', line=dict(dash='dash'))
-            ])
-            fig2.update_layout(title="Thời Gian Giao Hàng So Với Dự Kiến", yaxis_title="Thời gian (phút)")
-            st.plotly_chart(fig2)
-
-            st.write(f"Tổng đơn hàng: {len(orders)} | Đúng giờ: {np.sum(time_data <= eta_data)} ({100*np.sum(time_data <= eta_data)/len(orders):.1f}%) | Chậm: {np.sum(time_data > eta_data)}")
-        else:
-            st.info("Vui lòng nhập đơn hàng ở tab trước.")
+        dashboard_tab()
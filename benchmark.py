@@ -0,0 +1,265 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+from simulation_data import generate_locations, generate_road_network, generate_time_series
+
+# Bộ benchmark tái lập được: dữ liệu sinh từ simulation_data với seed cố định, kết quả ghi ra JSON
+# và so với baseline đã lưu để phát hiện chậm đi / tốn bộ nhớ hơn / lộ trình tệ hơn trước khi deploy.
+#   python benchmark.py                                  # chạy và so với benchmarks/baseline.json nếu có
+#   python benchmark.py --save-baseline                  # chạy và ghi kết quả làm baseline mới
+#   python benchmark.py --suites routing --sizes 10 50   # chỉ chạy một phần
+
+DEFAULT_SIZES = [10, 50, 200, 1000, 5000]
+SUITES = ('distance_matrix', 'routing', 'graph_search', 'forecast')
+DEFAULT_OUTPUT = 'benchmark_results.json'
+DEFAULT_BASELINE = os.path.join('benchmarks', 'baseline.json')
+# Ngưỡng hồi quy (tỷ lệ so với baseline); thời gian dưới MIN_SECONDS coi là nhiễu đo
+TIME_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.20
+QUALITY_TOLERANCE = 0.02
+MIN_SECONDS = 0.005
+# Trên ngưỡng này bài toán được chia cụm (decomposition) thay vì dựng ma trận toàn bộ cho solver
+CLUSTER_ABOVE = 500
+ASTAR_PAIRS = 20
+# Giờ xuất phát cố định để hệ số của mô hình giao thông (nếu có train.csv) giống nhau giữa các lần chạy
+DEPARTURE = '2024-01-01T08:00'
+
+
+# Đo một lần gọi: thời gian (tốt nhất trong repeat lần) và bộ nhớ đỉnh (MB, qua tracemalloc ở lần đầu)
+def measure(fn, repeat=1):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    best = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best, peak / 1024 ** 2
+
+
+def _record(suite, name, size, seconds, peak_mb, **extra):
+    return dict(suite=suite, name=name, size=int(size), seconds=round(seconds, 6), peak_mb=round(peak_mb, 3), **extra)
+
+
+def bench_distance_matrix(sizes, seed, repeat):
+    from distance_engine import build_distance_matrix
+
+    results = []
+    for size in sizes:
+        df = generate_locations(size, seed)
+        lats, lons = df['lat'].to_numpy(), df['lon'].to_numpy()
+        for metric in ('euclidean', 'haversine'):
+            _, seconds, peak = measure(lambda: build_distance_matrix(lats, lons, metric=metric), repeat)
+            results.append(_record('distance_matrix', metric, size, seconds, peak))
+    return results
+
+
+# Chất lượng lộ trình: tổng quãng đường (nhỏ hơn là tốt hơn). Hệ số giao thông tra theo giờ DEPARTURE, hoặc
+# ngẫu nhiên từ np.random khi không có mô hình, nên đặt seed trước mỗi lần giải để mục tiêu so sánh được
+def bench_routing(sizes, seed, repeat, num_vehicles=4, time_limit_s=None):
+    from distance_engine import build_distance_matrix
+    from routing import optimize_route
+
+    results = []
+    for size in sizes:
+        df = generate_locations(size, seed)
+        vehicles = min(num_vehicles, size)
+        if size > CLUSTER_ABOVE:
+            from decomposition import optimize_route_clustered
+
+            def solve():
+                np.random.seed(seed)
+                return optimize_route_clustered(df, vehicles_per_cluster=1, seed=seed, time_limit_s=time_limit_s,
+                                                departure=DEPARTURE)
+            name = 'optimize_route_clustered'
+        else:
+            matrix = build_distance_matrix(df['lat'].to_numpy(), df['lon'].to_numpy())
+
+            def solve():
+                np.random.seed(seed)
+                return optimize_route(matrix, df, num_vehicles=vehicles, time_limit_s=time_limit_s,
+                                      departure=DEPARTURE)
+            name = 'optimize_route'
+        # Một lần giải mỗi kích thước: thời gian giải đủ lớn để nhiễu đo không đáng kể
+        (routes, _, total_distance), seconds, peak = measure(solve, 1)
+        results.append(_record('routing', name, size, seconds, peak, objective=round(float(total_distance), 3),
+                               vehicles=len(routes)))
+    return results
+
+
+# A* của networkx (không heuristic) so với GreenRouter (ALT) và tính chi phí tuyến theo lô trên đồ thị CSR
+def bench_graph_search(sizes, seed, repeat):
+    import networkx as nx
+    from green_routing import GreenRouter
+    from logistics_graph import LogisticsGraph
+
+    results = []
+    for size in sizes:
+        nodes, edges = generate_road_network(size, seed)
+        G = nx.Graph()
+        G.add_nodes_from(nodes)
+        G.add_edges_from(edges)
+        rng = np.random.default_rng(seed)
+        pairs = rng.integers(0, len(nodes), (ASTAR_PAIRS, 2)).tolist()
+
+        paths, seconds, peak = measure(lambda: [nx.astar_path(G, s, t, weight='distance') for s, t in pairs], repeat)
+        results.append(_record('graph_search', 'nx.astar_path', len(nodes), seconds / len(pairs), peak))
+
+        graph, seconds, peak = measure(lambda: LogisticsGraph.from_edges(edges, nodes), 1)
+        results.append(_record('graph_search', 'LogisticsGraph.from_edges', len(nodes), seconds, peak))
+        router, seconds, peak = measure(lambda: GreenRouter(graph, seed=seed), 1)
+        results.append(_record('graph_search', 'GreenRouter.build', len(nodes), seconds, peak))
+        green, seconds, peak = measure(
+            lambda: [router.shortest_path(s, t, objective='distance') for s, t in pairs], repeat)
+        # Quãng đường của ALT phải bằng A* (cả hai đều tối ưu); sai lệch được ghi vào objective để phát hiện lỗi
+        gap = max(abs(a - b) for a, b in zip(graph.path_costs(paths)[0], (dist for _, dist, _ in green)))
+        results.append(_record('graph_search', 'GreenRouter.shortest_path', len(nodes), seconds / len(pairs), peak,
+                               objective=round(float(gap), 6)))
+
+        _, seconds, peak = measure(lambda: [graph.path_cost(path) for path in paths], repeat)
+        results.append(_record('graph_search', 'path_cost', len(nodes), seconds / len(paths), peak))
+        _, seconds, peak = measure(lambda: graph.path_costs(paths), repeat)
+        results.append(_record('graph_search', 'path_costs', len(nodes), seconds, peak))
+    return results
+
+
+# Fit và dự báo Prophet trên chuỗi ngày giả lập; bỏ qua nếu môi trường chưa cài prophet
+def bench_forecast(sizes, seed, repeat, num_days=365):
+    try:
+        from forecasting import ForecastService
+        import prophet  # noqa: F401
+    except ImportError:
+        print("Bỏ qua forecast: chưa cài prophet", file=sys.stderr)
+        return []
+
+    df = generate_time_series(num_days, seed)
+    results = []
+    with tempfile.TemporaryDirectory() as model_dir:
+        # Thư mục model mới để lần đo là một lần fit thật (không dùng lại model đã lưu)
+        service = ForecastService(model_dir=model_dir)
+        _, seconds, peak = measure(lambda: service.fit(df), 1)
+        results.append(_record('forecast', 'prophet_fit', num_days, seconds, peak))
+        _, seconds, peak = measure(lambda: service.predict(horizons=(7, 30)), repeat)
+        results.append(_record('forecast', 'prophet_predict', num_days, seconds, peak))
+    return results
+
+
+BENCHMARKS = {
+    'distance_matrix': bench_distance_matrix,
+    'routing': bench_routing,
+    'graph_search': bench_graph_search,
+    'forecast': bench_forecast,
+}
+
+
+def run(suites=SUITES, sizes=DEFAULT_SIZES, seed=0, repeat=3):
+    results = []
+    for suite in suites:
+        results.extend(BENCHMARKS[suite](sizes, seed, repeat))
+    return {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'seed': seed,
+            'sizes': list(sizes),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+# So sánh với baseline theo khóa (suite, name, size). Trả về danh sách hồi quy (rỗng nếu đạt)
+def compare(current, baseline, time_tolerance=TIME_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE,
+            quality_tolerance=QUALITY_TOLERANCE):
+    reference = {(r['suite'], r['name'], r['size']): r for r in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        base = reference.get((result['suite'], result['name'], result['size']))
+        if base is None:
+            continue
+        checks = [
+            ('seconds', time_tolerance, max(base['seconds'], MIN_SECONDS)),
+            ('peak_mb', memory_tolerance, base['peak_mb']),
+        ]
+        if 'objective' in base and 'objective' in result:
+            checks.append(('objective', quality_tolerance, base['objective']))
+        for metric, tolerance, limit in checks:
+            if result[metric] > limit * (1 + tolerance) + (1e-9 if metric == 'objective' else 0):
+                regressions.append(dict(suite=result['suite'], name=result['name'], size=result['size'],
+                                        metric=metric, baseline=base[metric], current=result[metric]))
+    return regressions
+
+
+def print_table(current, baseline=None):
+    reference = {} if baseline is None else {(r['suite'], r['name'], r['size']): r for r in baseline['results']}
+    print(f"{'suite':<16}{'name':<28}{'size':>6}{'ms':>12}{'peak MB':>10}{'objective':>12}{'vs base':>9}")
+    for r in current['results']:
+        base = reference.get((r['suite'], r['name'], r['size']))
+        ratio = f"{r['seconds'] / base['seconds']:.2f}x" if base and base['seconds'] else ''
+        objective = f"{r['objective']:.2f}" if 'objective' in r else ''
+        print(f"{r['suite']:<16}{r['name']:<28}{r['size']:>6}{r['seconds'] * 1000:>12.2f}{r['peak_mb']:>10.2f}"
+              f"{objective:>12}{ratio:>9}")
+
+
+def _write_json(data, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark tái lập cho định tuyến, dự báo và tìm đường")
+    parser.add_argument('--suites', nargs='+', choices=SUITES, default=list(SUITES))
+    parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="Ghi kết quả lần chạy này làm baseline")
+    parser.add_argument('--time-tolerance', type=float, default=TIME_TOLERANCE)
+    parser.add_argument('--memory-tolerance', type=float, default=MEMORY_TOLERANCE)
+    parser.add_argument('--quality-tolerance', type=float, default=QUALITY_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    current = run(args.suites, args.sizes, args.seed, args.repeat)
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_table(current, baseline)
+
+    regressions = []
+    if baseline is not None:
+        regressions = compare(current, baseline, args.time_tolerance, args.memory_tolerance, args.quality_tolerance)
+        current['baseline'] = args.baseline
+    current['regressions'] = regressions
+    _write_json(current, args.output)
+    if args.save_baseline:
+        _write_json(current, args.baseline)
+        print(f"Đã lưu baseline: {args.baseline}")
+
+    for r in regressions:
+        print(f"HỒI QUY {r['suite']}/{r['name']} size={r['size']}: {r['metric']} {r['baseline']} -> {r['current']}",
+              file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+import heapq
+import threading
+import time
+
+import requests
+from hexbytes import HexBytes
+from requests.adapters import HTTPAdapter
+from web3 import Web3
+
+SEPOLIA_CHAIN_ID = 11155111
+COORD_SCALE = 10**8  # lat/lon được lưu dưới dạng uint256 (nhân 10^8 để giữ độ chính xác)
+
+
+# Chuyển tọa độ sang uint256 như hợp đồng yêu cầu
+def coord_to_uint(value):
+    return int(value * COORD_SCALE)
+
+
+# Cấp nonce tăng dần tại chỗ: chỉ hỏi node một lần, sau đó tự tăng dưới khóa.
+# Nonce được trả lại (ký lỗi) nằm trong heap và được cấp lại trước, nhỏ nhất trước, để lấp khoảng trống
+class NonceManager:
+    def __init__(self, fetch_nonce):
+        self._fetch_nonce = fetch_nonce
+        self._next_nonce = None
+        self._released = []
+        self._lock = threading.Lock()
+
+    def allocate(self):
+        with self._lock:
+            if self._released:
+                return heapq.heappop(self._released)
+            if self._next_nonce is None:
+                self._next_nonce = self._fetch_nonce()
+            nonce = self._next_nonce
+            self._next_nonce += 1
+            return nonce
+
+    # Gọi khi gửi giao dịch lỗi để lần sau đồng bộ lại với node (tránh lệch nonce)
+    def reset(self):
+        with self._lock:
+            self._next_nonce = None
+            self._released.clear()
+
+    # Trả lại nonce chưa dùng (ký lỗi). Luồng khác có thể đã cấp nonce lớn hơn, nên không lùi _next_nonce
+    # mà giữ nonce này để cấp lại; bộ đếm bị đặt lại (reset) thì nonce cũ không còn giá trị
+    def release(self, nonce):
+        with self._lock:
+            if self._next_nonce is not None and nonce < self._next_nonce and nonce not in self._released:
+                heapq.heappush(self._released, nonce)
+
+
+# Client blockchain dùng chung: phiên HTTP có pool kết nối, contract cache sẵn,
+# nonce cấp tại chỗ, giá gas cache theo TTL và gửi hàng loạt theo lô
+class ChainClient:
+    def __init__(self, w3, contract_address, abi, wallet_address, private_key, chain_id=SEPOLIA_CHAIN_ID,
+                 gas_price_ttl=30, batch_size=50, rpc_url=None, session=None, timeout=10):
+        self.w3 = w3
+        self.contract = w3.eth.contract(address=Web3.to_checksum_address(contract_address), abi=abi)
+        self.wallet_address = Web3.to_checksum_address(wallet_address)
+        self._private_key = private_key
+        self.chain_id = chain_id
+        self.gas_price_ttl = gas_price_ttl
+        self.batch_size = batch_size
+        # Khi có rpc_url + session, submit_many gửi theo lô JSON-RPC trên cùng pool kết nối
+        self.rpc_url = rpc_url
+        self.session = session
+        self.timeout = timeout
+        self.nonces = NonceManager(lambda: w3.eth.get_transaction_count(self.wallet_address, 'pending'))
+        self._gas_price = None
+        self._gas_price_at = 0.0
+        self._gas_lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, rpc_url, contract_address, abi, wallet_address, private_key, chain_id=SEPOLIA_CHAIN_ID,
+                      pool_size=20, timeout=10, **kwargs):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        w3 = Web3(Web3.HTTPProvider(rpc_url, session=session, request_kwargs={'timeout': timeout}))
+        return cls(w3, contract_address, abi, wallet_address, private_key, chain_id=chain_id,
+                   rpc_url=rpc_url, session=session, timeout=timeout, **kwargs)
+
+    # Backend Ethereum chạy trong tiến trình (eth-tester) để kiểm thử không cần mạng. Không có contract_address thì
+    # gửi tới một tài khoản thường (giao dịch thành công nhưng không phát sự kiện)
+    @classmethod
+    def for_tester(cls, abi, contract_address=None, funding_wei=10**21, **kwargs):
+        try:
+            from web3.providers.eth_tester import EthereumTesterProvider
+        except ImportError as e:
+            raise ImportError("Cần cài eth-tester[py-evm] để dùng backend kiểm thử") from e
+        w3 = Web3(EthereumTesterProvider())
+        account = w3.eth.account.create()
+        w3.eth.send_transaction({'from': w3.eth.accounts[0], 'to': account.address, 'value': funding_wei})
+        if contract_address is None:
+            contract_address = w3.eth.accounts[1]
+        return cls(w3, contract_address, abi, account.address, account.key, chain_id=w3.eth.chain_id, **kwargs)
+
+    def gas_price(self):
+        with self._gas_lock:
+            now = time.monotonic()
+            if self._gas_price is None or now - self._gas_price_at > self.gas_price_ttl:
+                self._gas_price = self.w3.eth.gas_price
+                self._gas_price_at = now
+            return self._gas_price
+
+    # Ký tại chỗ với nonce cục bộ (không tốn round trip nào tới node)
+    def _sign(self, contract_function, gas):
+        gas_price = self.gas_price()
+        nonce = self.nonces.allocate()
+        try:
+            tx = contract_function.build_transaction({
+                'from': self.wallet_address,
+                'gas': gas,
+                'gasPrice': gas_price,
+                'nonce': nonce,
+                'chainId': self.chain_id
+            })
+            return self.w3.eth.account.sign_transaction(tx, self._private_key).raw_transaction
+        except Exception:
+            self.nonces.release(nonce)
+            raise
+
+    # Gửi giao dịch đã ký; nếu node từ chối thì đặt lại bộ cấp nonce
+    def _send(self, raw_transaction):
+        try:
+            return self.w3.eth.send_raw_transaction(raw_transaction)
+        except Exception:
+            self.nonces.reset()
+            raise
+
+    def _location_and_status_call(self, order_id, lat, lon, status):
+        return self.contract.functions.updateOrderLocationAndStatus(order_id, coord_to_uint(lat),
+                                                                    coord_to_uint(lon), status)
+
+    def update_order_location_and_status(self, order_id, lat, lon, status, gas=300000):
+        return self._send(self._sign(self._location_and_status_call(order_id, lat, lon, status), gas))
+
+    def update_order_status(self, order_id, status, gas=200000):
+        return self._send(self._sign(self.contract.functions.updateOrderStatus(order_id, status), gas))
+
+    # Gửi một lô giao dịch đã ký trong một lệnh JSON-RPC batch qua phiên HTTP dùng chung
+    def _send_batch(self, raw_transactions):
+        payload = [{'jsonrpc': '2.0', 'id': i, 'method': 'eth_sendRawTransaction',
+                    'params': [Web3.to_hex(raw_transaction)]}
+                   for i, raw_transaction in enumerate(raw_transactions)]
+        response = self.session.post(self.rpc_url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        by_id = {item.get('id'): item for item in response.json()}
+        results = []
+        for i in range(len(raw_transactions)):
+            item = by_id.get(i, {'error': {'message': 'Không có phản hồi cho giao dịch'}})
+            if 'error' in item:
+                results.append((None, RuntimeError(item['error'].get('message', str(item['error'])))))
+            else:
+                results.append((HexBytes(item['result']), None))
+        return results
+
+    # Gửi nhiều cập nhật: kiểm tra tham số từng đơn trước (đơn lỗi nhận lỗi riêng, không tốn nonce), ký các đơn hợp lệ
+    # theo thứ tự nonce rồi gửi theo lô JSON-RPC (node nhận đúng thứ tự nonce). Khi một lô/giao dịch lỗi thì dừng gửi
+    # phần còn lại (nonce phía sau sẽ bị kẹt sau khoảng trống) và đồng bộ lại nonce với node.
+    # Provider không phải HTTP (vd. eth-tester) được gửi lần lượt. Trả về (order_id, tx_hash, lỗi) theo thứ tự đầu vào
+    def submit_many(self, updates, gas=300000):
+        results = [None] * len(updates)
+        signed = []  # (vị trí trong updates, giao dịch đã ký)
+        for i, u in enumerate(updates):
+            try:
+                call = self._location_and_status_call(u['id'], u['lat'], u['lon'], u['status'])
+                signed.append((i, self._sign(call, gas)))
+            except Exception as e:
+                results[i] = (None, e)
+
+        failed = False
+        if self.rpc_url is not None:
+            for start in range(0, len(signed), self.batch_size):
+                chunk = signed[start:start + self.batch_size]
+                if failed:
+                    sent = [(None, RuntimeError("Không gửi vì lô trước bị lỗi"))] * len(chunk)
+                else:
+                    try:
+                        sent = self._send_batch([raw_transaction for _, raw_transaction in chunk])
+                    except (requests.RequestException, ValueError) as e:
+                        sent = [(None, e)] * len(chunk)
+                    failed = any(error is not None for _, error in sent)
+                for (i, _), result in zip(chunk, sent):
+                    results[i] = result
+        else:
+            for i, raw_transaction in signed:
+                if failed:
+                    results[i] = (None, RuntimeError("Không gửi vì giao dịch trước bị lỗi"))
+                    continue
+                try:
+                    results[i] = (self.w3.eth.send_raw_transaction(raw_transaction), None)
+                except Exception as e:
+                    results[i] = (None, e)
+                    failed = True
+        if failed:
+            self.nonces.reset()
+        return [(update['id'], tx_hash, error) for update, (tx_hash, error) in zip(updates, results)]
@@ -0,0 +1,250 @@
+import sqlite3
+import threading
+import time
+
+from eth_utils import event_abi_to_log_topic
+from web3.exceptions import BlockNotFound
+
+from chain_client import COORD_SCALE
+
+# Chỉ mục cục bộ các sự kiện OrderUpdated của hợp đồng: kéo log theo từng dải block (eth_getLogs), ghi vào SQLite
+# cùng checkpoint trong một transaction cho mỗi dải, nên dừng giữa chừng thì lần sau chạy tiếp từ checkpoint.
+# Đọc trạng thái hiện tại của hàng nghìn đơn chỉ là truy vấn khóa chính trên file cục bộ, không gọi RPC
+EVENT_NAME = 'OrderUpdated'
+DEFAULT_DB = 'chain_index.sqlite'
+DEFAULT_BATCH_BLOCKS = 2000  # Dải block mỗi lần eth_getLogs (tự chia đôi khi node từ chối vì quá nhiều kết quả)
+CONFIRMATIONS = 12           # Chỉ lập chỉ mục các block đã có đủ số xác nhận này
+REORG_WINDOW = 256           # Số hash block gần nhất giữ lại để tìm điểm rẽ nhánh khi có reorg
+SYNC_INTERVAL_S = 15
+SQLITE_MAX_VARS = 900  # Số tham số tối đa mỗi truy vấn IN (...)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    block_number INTEGER NOT NULL, log_index INTEGER NOT NULL, block_hash TEXT NOT NULL, tx_hash TEXT NOT NULL,
+    order_id TEXT NOT NULL, lat REAL, lon REAL, status TEXT NOT NULL,
+    PRIMARY KEY (block_number, log_index)
+);
+CREATE INDEX IF NOT EXISTS events_order ON events (order_id, block_number, log_index);
+CREATE TABLE IF NOT EXISTS order_status (
+    order_id TEXT PRIMARY KEY, status TEXT NOT NULL, lat REAL, lon REAL,
+    block_number INTEGER NOT NULL, log_index INTEGER NOT NULL, tx_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blocks (number INTEGER PRIMARY KEY, hash TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS checkpoint (contract TEXT PRIMARY KEY, block_number INTEGER NOT NULL);
+"""
+
+# Trạng thái mới nhất theo thứ tự (block, log_index); sự kiện cũ hơn không ghi đè
+_UPSERT_STATUS = """
+INSERT INTO order_status (order_id, status, lat, lon, block_number, log_index, tx_hash) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (order_id) DO UPDATE SET status = excluded.status, lat = excluded.lat, lon = excluded.lon,
+    block_number = excluded.block_number, log_index = excluded.log_index, tx_hash = excluded.tx_hash
+WHERE (excluded.block_number, excluded.log_index) > (order_status.block_number, order_status.log_index)
+"""
+
+_STATUS_COLUMNS = ('order_id', 'status', 'lat', 'lon', 'block_number', 'log_index', 'tx_hash')
+
+
+def _chunks(values, size=SQLITE_MAX_VARS):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _hex(value):
+    return value.hex() if isinstance(value, (bytes, bytearray)) else str(value)
+
+
+class ChainIndexer:
+    def __init__(self, contract, path=DEFAULT_DB, start_block=0, confirmations=CONFIRMATIONS,
+                 batch_blocks=DEFAULT_BATCH_BLOCKS):
+        self.contract = contract
+        self.w3 = contract.w3
+        self.address = contract.address
+        self.path = path
+        self.start_block = int(start_block)
+        self.confirmations = int(confirmations)
+        self.batch_blocks = int(batch_blocks)
+        self.event = getattr(contract.events, EVENT_NAME)()
+        event_abi = next(item for item in contract.abi if item.get('type') == 'event' and item['name'] == EVENT_NAME)
+        self.topic = '0x' + event_abi_to_log_topic(event_abi).hex()
+        self.last_error = None
+        self.last_sync = None
+        self._lock = threading.Lock()       # Bảo vệ kết nối SQLite
+        self._sync_lock = threading.Lock()  # Chỉ một lần đồng bộ tại một thời điểm (RPC nằm ngoài _lock)
+        self._stop = threading.Event()
+        self._thread = None
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    # Dùng client blockchain sẵn có (cùng pool kết nối HTTP)
+    @classmethod
+    def from_client(cls, client, **kwargs):
+        return cls(client.contract, **kwargs)
+
+    def close(self):
+        self.stop()
+        with self._lock:
+            self._conn.close()
+
+    # Block cuối cùng đã lập chỉ mục xong
+    def checkpoint(self):
+        with self._lock:
+            row = self._conn.execute('SELECT block_number FROM checkpoint WHERE contract = ?',
+                                     (self.address,)).fetchone()
+        return row[0] if row else self.start_block - 1
+
+    # Hash của block trên chuỗi hiện tại; None khi block không còn (chuỗi sau reorg ngắn hơn), coi như hash lệch
+    def _block_hash(self, number):
+        try:
+            return _hex(self.w3.eth.get_block(number)['hash'])
+        except BlockNotFound:
+            return None
+
+    # Phát hiện reorg: hash của checkpoint khớp chuỗi hiện tại thì mọi block trước đó cũng khớp. Không khớp thì lùi
+    # qua các hash đã lưu đến block chung gần nhất rồi xóa mọi thứ phía trên; ngoài cửa sổ thì lập chỉ mục lại từ đầu
+    def _handle_reorg(self):
+        with self._lock:
+            stored = self._conn.execute('SELECT number, hash FROM blocks ORDER BY number DESC').fetchall()
+        for number, block_hash in stored:
+            if self._block_hash(number) == block_hash:
+                if number != stored[0][0]:
+                    self._rollback(number)
+                return
+        if stored:
+            self._rollback(self.start_block - 1)
+
+    # Xóa các sự kiện sau fork_block và dựng lại trạng thái của những đơn bị ảnh hưởng từ sự kiện còn lại
+    def _rollback(self, fork_block):
+        with self._lock, self._conn:
+            self._conn.execute('CREATE TEMP TABLE IF NOT EXISTS affected (order_id TEXT PRIMARY KEY)')
+            self._conn.execute('DELETE FROM affected')
+            self._conn.execute('INSERT INTO affected SELECT DISTINCT order_id FROM events WHERE block_number > ?',
+                               (fork_block,))
+            self._conn.execute('DELETE FROM events WHERE block_number > ?', (fork_block,))
+            self._conn.execute('DELETE FROM blocks WHERE number > ?', (fork_block,))
+            self._conn.execute('DELETE FROM order_status WHERE order_id IN (SELECT order_id FROM affected)')
+            self._conn.execute("""
+                INSERT INTO order_status (order_id, status, lat, lon, block_number, log_index, tx_hash)
+                SELECT order_id, status, lat, lon, block_number, log_index, tx_hash FROM (
+                    SELECT *, ROW_NUMBER() OVER (PARTITION BY order_id ORDER BY block_number DESC, log_index DESC) AS rn
+                    FROM events WHERE order_id IN (SELECT order_id FROM affected)
+                ) WHERE rn = 1
+            """)
+            self._conn.execute('INSERT OR REPLACE INTO checkpoint (contract, block_number) VALUES (?, ?)',
+                               (self.address, fork_block))
+
+    def _fetch_logs(self, start, end):
+        return self.w3.eth.get_logs({'address': self.address, 'topics': [self.topic],
+                                     'fromBlock': start, 'toBlock': end})
+
+    # Ghi các sự kiện của một dải block, hash block cuối dải và checkpoint trong cùng một transaction
+    def _apply(self, logs, end, end_hash):
+        rows = []
+        for log in logs:
+            args = self.event.process_log(log)['args']
+            rows.append((log['blockNumber'], log['logIndex'], _hex(log['blockHash']), _hex(log['transactionHash']),
+                         args['order_id'], args['lat'] / COORD_SCALE, args['lon'] / COORD_SCALE, args['status']))
+        with self._lock, self._conn:
+            self._conn.executemany('INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            self._conn.executemany(_UPSERT_STATUS, [(r[4], r[7], r[5], r[6], r[0], r[1], r[3]) for r in rows])
+            self._conn.executemany('INSERT OR REPLACE INTO blocks VALUES (?, ?)',
+                                   {(r[0], r[2]) for r in rows} | {(end, end_hash)})
+            self._conn.execute('DELETE FROM blocks WHERE number <= ?', (end - REORG_WINDOW,))
+            self._conn.execute('INSERT OR REPLACE INTO checkpoint (contract, block_number) VALUES (?, ?)',
+                               (self.address, end))
+        return len(rows)
+
+    # Đồng bộ đến block head - confirmations. Trả về số sự kiện mới đã lập chỉ mục
+    def sync(self, max_batches=None):
+        with self._sync_lock:
+            head = self.w3.eth.block_number - self.confirmations
+            self._handle_reorg()
+            start = self.checkpoint() + 1
+            batch = self.batch_blocks
+            indexed = batches = 0
+            while start <= head and (max_batches is None or batches < max_batches):
+                end = min(start + batch - 1, head)
+                try:
+                    logs = self._fetch_logs(start, end)
+                except Exception:
+                    # Node giới hạn số log mỗi truy vấn: chia đôi dải rồi thử lại, giữ kích thước đó đến hết lần đồng bộ
+                    if batch == 1:
+                        raise
+                    batch = max(1, batch // 2)
+                    continue
+                indexed += self._apply(logs, end, self._block_hash(end))
+                batches += 1
+                start = end + 1
+            self.last_sync = time.time()
+            return indexed
+
+    # Đồng bộ định kỳ ở luồng nền; lỗi (mất mạng, RPC lỗi) được giữ trong last_error và thử lại ở chu kỳ sau
+    def start(self, interval_s=SYNC_INTERVAL_S):
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    self.sync()
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = e
+                self._stop.wait(interval_s)
+        self._thread = threading.Thread(target=loop, name='chain-indexer', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # Trạng thái on-chain hiện tại của các đơn: order_id -> dict (đơn chưa có sự kiện thì không có trong kết quả)
+    def statuses(self, order_ids):
+        result = {}
+        with self._lock:
+            for chunk in _chunks(dict.fromkeys(str(order_id) for order_id in order_ids)):
+                query = f"SELECT * FROM order_status WHERE order_id IN ({','.join('?' * len(chunk))})"
+                for row in self._conn.execute(query, chunk):
+                    result[row[0]] = dict(zip(_STATUS_COLUMNS, row))
+        return result
+
+    def status(self, order_id):
+        return self.statuses([order_id]).get(str(order_id))
+
+    # Lịch sử sự kiện của một đơn theo thứ tự trên chuỗi
+    def history(self, order_id):
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT block_number, log_index, tx_hash, lat, lon, status FROM events WHERE order_id = ? '
+                'ORDER BY block_number, log_index', (str(order_id),)).fetchall()
+        return [dict(zip(('block_number', 'log_index', 'tx_hash', 'lat', 'lon', 'status'), row)) for row in rows]
+
+    # Số đơn theo trạng thái on-chain (chỉ trong order_ids nếu có)
+    def status_counts(self, order_ids=None):
+        counts = {}
+        with self._lock:
+            if order_ids is None:
+                groups = [self._conn.execute('SELECT status, COUNT(*) FROM order_status GROUP BY status').fetchall()]
+            else:
+                groups = [self._conn.execute(
+                    f"SELECT status, COUNT(*) FROM order_status WHERE order_id IN ({','.join('?' * len(chunk))}) "
+                    f"GROUP BY status", chunk).fetchall()
+                    for chunk in _chunks(dict.fromkeys(str(order_id) for order_id in order_ids))]
+        for rows in groups:
+            for status, count in rows:
+                counts[status] = counts.get(status, 0) + count
+        return counts
+
+    def stats(self):
+        checkpoint = self.checkpoint()
+        with self._lock:
+            events = self._conn.execute('SELECT COUNT(*) FROM events').fetchone()[0]
+            orders = self._conn.execute('SELECT COUNT(*) FROM order_status').fetchone()[0]
+        return {'checkpoint': checkpoint, 'events': events, 'orders': orders, 'last_sync': self.last_sync,
+                'last_error': None if self.last_error is None else str(self.last_error)}
@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+
+# Hợp đồng giả cho backend kiểm thử: mọi lời gọi phát một log OrderUpdated với dữ liệu là calldata bỏ 4 byte selector.
+# Tham số của updateOrderLocationAndStatus (string, uint256, uint256, string) mã hóa ABI giống hệt dữ liệu sự kiện,
+# nên log giải mã được như của hợp đồng thật (chỉ dùng với hàm này)
+def deploy_event_emitter(w3, abi, sender, event_name='OrderUpdated'):
+    from eth_utils import event_abi_to_log_topic
+
+    event_abi = next(item for item in abi if item.get('type') == 'event' and item['name'] == event_name)
+    # CALLDATASIZE-4 byte từ offset 4 vào memory[0:], rồi LOG1(0, size, topic)
+    runtime = bytes.fromhex('3660049003806004600037' + '7f') + event_abi_to_log_topic(event_abi) + \
+        bytes.fromhex('906000a100')
+    # Mã khởi tạo: chép runtime vào memory rồi RETURN
+    init = bytes([0x60, len(runtime), 0x80, 0x60, 0x0b, 0x60, 0x00, 0x39, 0x60, 0x00, 0xf3]) + runtime
+    tx_hash = w3.eth.send_transaction({'from': sender, 'data': init})
+    return w3.eth.wait_for_transaction_receipt(tx_hash)['contractAddress']
+
+
+# ChainClient trên eth-tester, trỏ tới hợp đồng giả phát sự kiện để thử cả phần gửi lẫn phần đọc log
+@pytest.fixture
+def client():
+    pytest.importorskip('eth_tester')
+    from chain_client import ChainClient
+
+    with open('contract_abi.json', 'r') as f:
+        abi = json.load(f)
+    client = ChainClient.for_tester(abi)
+    address = deploy_event_emitter(client.w3, abi, client.w3.eth.accounts[0])
+    client.contract = client.w3.eth.contract(address=address, abi=abi)
+    return client
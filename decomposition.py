@@ -0,0 +1,204 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.cluster.vq import kmeans2
+
+from distance_engine import LegCosts, build_distance_matrix, leg_distances
+
+
+# Tọa độ phẳng xấp xỉ (kinh độ co theo vĩ độ) để chia cụm theo địa lý
+def _planar_coords(df_locations):
+    lat = df_locations['lat'].to_numpy(dtype=np.float64)
+    lon = df_locations['lon'].to_numpy(dtype=np.float64)
+    return np.column_stack([lat, lon * np.cos(np.radians(lat.mean()))])
+
+
+# Chia các điểm giao (trừ depot) thành cụm theo góc quét quanh depot hoặc k-means
+def partition_stops(df_locations, num_clusters, depot=0, method='sweep', seed=0):
+    coords = _planar_coords(df_locations)
+    stops = np.flatnonzero(np.arange(len(df_locations)) != depot)
+    num_clusters = max(1, min(int(num_clusters), len(stops)))
+    if method == 'sweep':
+        offsets = coords[stops] - coords[depot]
+        angles = np.arctan2(offsets[:, 0], offsets[:, 1])
+        clusters = np.array_split(stops[np.argsort(angles, kind='stable')], num_clusters)
+    elif method == 'kmeans':
+        _, labels = kmeans2(coords[stops], num_clusters, seed=seed, minit='++')
+        clusters = [stops[labels == label] for label in range(num_clusters)]
+    else:
+        raise ValueError(f"method không hợp lệ: {method}. Chọn 'sweep' hoặc 'kmeans'")
+    return [cluster for cluster in clusters if len(cluster)]
+
+
+# Giải một cụm (depot + các điểm của cụm) trong tiến trình con, trả về lộ trình theo chỉ số toàn cục
+def _solve_cluster(df_cluster, global_nodes, metric, num_vehicles, solver_kwargs):
+    from routing import optimize_route
+
+    distance_matrix = build_distance_matrix(df_cluster['lat'].to_numpy(), df_cluster['lon'].to_numpy(), metric=metric)
+    routes, route_details, _ = optimize_route(distance_matrix, df_cluster, num_vehicles=num_vehicles, depot=0,
+                                              **solver_kwargs)
+    global_nodes = np.asarray(global_nodes)
+    for detail in route_details:
+        detail['nodes'] = [int(global_nodes[node]) for node in detail['nodes']]
+    return [detail['nodes'] for detail in route_details], route_details
+
+
+# Cải thiện xuyên ranh giới cụm: chuyển từng điểm sang lộ trình của cụm lân cận nếu giảm tổng quãng đường.
+# Tâm lộ trình giữ dưới dạng tổng tọa độ + số điểm, cập nhật khi chuyển điểm; chi phí chặng lấy từ LegCosts
+# (với 'road': một bảng Dijkstra cho lộ trình đang xét và các lộ trình lân cận, không snap/ghi cache mỗi lần gọi)
+def improve_across_clusters(routes, df_locations, metric='euclidean', vehicle_capacities=None, demands=None,
+                            neighbor_routes=2, max_passes=2):
+    lat = df_locations['lat'].to_numpy(dtype=np.float64)
+    lon = df_locations['lon'].to_numpy(dtype=np.float64)
+    if demands is None:
+        demands = df_locations['demand'].to_numpy() if 'demand' in df_locations.columns else np.ones(len(lat))
+    demands = np.asarray(demands)
+    routes = [list(route) for route in routes]
+    loads = [demands[route[1:-1]].sum() for route in routes]
+    sums = np.array([[lat[route[1:-1]].sum(), lon[route[1:-1]].sum()] for route in routes]).reshape(-1, 2)
+    counts = np.array([len(route) - 2 for route in routes], dtype=np.int64)
+    legs = LegCosts(lat, lon, metric=metric)
+    moves = 0
+
+    for _ in range(max_passes):
+        moved_in_pass = False
+        for r, route in enumerate(routes):
+            if len(route) < 3:
+                continue
+            # Chỉ xét các lộ trình có tâm gần điểm nhất (thường là cụm láng giềng); ứng viên chọn theo tâm lúc
+            # bắt đầu xét lộ trình r để bảng chi phí chặng dựng một lần cho cả lộ trình
+            with np.errstate(invalid='ignore', divide='ignore'):
+                centroids = sums / counts[:, None]
+            centroids[(counts == 0) | (np.arange(len(routes)) == r)] = np.inf
+            stops = np.asarray(route[1:-1])
+            gaps = np.hypot(centroids[None, :, 0] - lat[stops, None], centroids[None, :, 1] - lon[stops, None])
+            candidates = np.argsort(gaps, axis=1, kind='stable')[:, :neighbor_routes]
+            nearby = {int(q) for q in np.unique(candidates) if np.isfinite(centroids[q, 0])}
+            legs.prepare(np.concatenate([route] + [routes[q] for q in nearby]))
+            candidates = dict(zip(stops.tolist(), candidates))
+
+            k = 1
+            while k < len(route) - 1:
+                node, prev_node, next_node = route[k], route[k - 1], route[k + 1]
+                removal_gain = legs([prev_node, node], [node, next_node]).sum() - legs([prev_node], [next_node])[0]
+
+                best = None
+                for q in candidates[node]:
+                    if q not in nearby:
+                        continue
+                    if vehicle_capacities is not None and loads[q] + demands[node] > vehicle_capacities:
+                        continue
+                    # Chi phí chèn vào mọi vị trí của lộ trình đích trong một lượt vector
+                    target = np.asarray(routes[q])
+                    insertion = (legs(target[:-1], np.full(len(target) - 1, node))
+                                 + legs(np.full(len(target) - 1, node), target[1:])
+                                 - legs(target[:-1], target[1:]))
+                    position = int(np.argmin(insertion))
+                    if insertion[position] < removal_gain - 1e-9 and (best is None or insertion[position] < best[0]):
+                        best = (insertion[position], q, position + 1)
+
+                if best is None:
+                    k += 1
+                    continue
+                _, q, position = best
+                routes[q].insert(position, route.pop(k))
+                loads[q] += demands[node]
+                loads[r] -= demands[node]
+                sums[q] += (lat[node], lon[node])
+                sums[r] -= (lat[node], lon[node])
+                counts[q] += 1
+                counts[r] -= 1
+                moves += 1
+                moved_in_pass = True
+        if not moved_in_pass:
+            break
+    return routes, moves
+
+
+# Dựng lại route_details sau khi cải thiện, cùng cách tính với optimize_route: khoảng cách đã nhân hệ số giao
+# thông, ETA theo mô hình giao thông nếu có. Mọi chặng của mọi lộ trình tính trong một lần gọi leg_distances
+def _recompute_details(routes, df_locations, metric, speed_km_per_hour, departure=None):
+    from routing import get_leg_traffic_multipliers
+    from traffic import get_traffic_model
+
+    lat = df_locations['lat'].to_numpy(dtype=np.float64)
+    lon = df_locations['lon'].to_numpy(dtype=np.float64)
+    from_nodes = np.concatenate([route[:-1] for route in routes]).astype(np.intp)
+    to_nodes = np.concatenate([route[1:] for route in routes]).astype(np.intp)
+    raw_legs = leg_distances(lat, lon, from_nodes, to_nodes, metric=metric)
+    adjusted_legs = raw_legs * get_leg_traffic_multipliers(lat, lon, from_nodes, to_nodes, departure)
+    splits = np.cumsum([len(route) - 1 for route in routes])[:-1]
+
+    model = get_traffic_model()
+    if model is not None:
+        route_times = model.route_etas(routes, None, lat, lon, speed_km_per_hour, departure, leg_km=raw_legs)
+    else:
+        route_times = [np.cumsum(legs / speed_km_per_hour * 60) for legs in np.split(adjusted_legs, splits)]
+
+    route_details = []
+    total_distance = 0
+    for vehicle_id, (route, legs, times) in enumerate(zip(routes, np.split(adjusted_legs, splits), route_times)):
+        route_details.append({
+            'vehicle': vehicle_id + 1,
+            'nodes': route,
+            'distance': float(legs.sum()),
+            'times': [float(t) for t in times]
+        })
+        total_distance += float(legs.sum())
+    return route_details, total_distance
+
+
+# Hàm tối ưu lộ trình cho tập đơn rất lớn: chia cụm trước, giải từng cụm song song, rồi ghép kết quả
+def optimize_route_clustered(df_locations, depot=0, num_clusters=None, max_stops_per_cluster=200,
+                             vehicles_per_cluster=1, method='sweep', metric='euclidean', max_workers=None,
+                             improve=False, vehicle_capacities=None, speed_km_per_hour=20, seed=0, **solver_kwargs):
+    df_locations = df_locations.reset_index(drop=True)
+    if len(df_locations) < 2:
+        raise ValueError("Cần ít nhất một điểm giao ngoài depot!")
+    if improve and (solver_kwargs.get('time_windows') is not None or 'tw_start' in df_locations.columns):
+        raise ValueError("Bước cải thiện xuyên cụm chưa hỗ trợ khung giờ giao!")
+    if vehicle_capacities is not None and not np.isscalar(vehicle_capacities):
+        raise ValueError("Chế độ chia cụm cần vehicle_capacities là một số (tải trọng mỗi xe)!")
+    if num_clusters is None:
+        num_clusters = math.ceil((len(df_locations) - 1) / max_stops_per_cluster)
+    clusters = partition_stops(df_locations, num_clusters, depot=depot, method=method, seed=seed)
+
+    solver_kwargs = dict(solver_kwargs, speed_km_per_hour=speed_km_per_hour, vehicle_capacities=vehicle_capacities)
+    jobs = []
+    for cluster in clusters:
+        global_nodes = np.concatenate([[depot], cluster])
+        df_cluster = df_locations.iloc[global_nodes].reset_index(drop=True)
+        cluster_kwargs = dict(solver_kwargs)
+        # Tham số theo từng địa điểm phải được cắt theo cụm
+        for per_node in ('time_windows', 'demands'):
+            if cluster_kwargs.get(per_node) is not None:
+                cluster_kwargs[per_node] = [cluster_kwargs[per_node][node] for node in global_nodes]
+        jobs.append((df_cluster, global_nodes, metric, min(vehicles_per_cluster, len(cluster)), cluster_kwargs))
+
+    max_workers = max_workers or min(len(jobs), os.cpu_count() or 1)
+    if max_workers == 1 or len(jobs) == 1:
+        results = [_solve_cluster(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_solve_cluster, *zip(*jobs)))
+
+    routes = [route for cluster_routes, _ in results for route in cluster_routes]
+    if improve:
+        routes, _ = improve_across_clusters(routes, df_locations, metric=metric, vehicle_capacities=vehicle_capacities,
+                                            demands=solver_kwargs.get('demands'))
+        # Khi đã chuyển điểm giữa các cụm, toàn bộ lộ trình được tính lại (cùng ý nghĩa với nhánh không cải thiện)
+        route_details, total_distance = _recompute_details(routes, df_locations, metric, speed_km_per_hour,
+                                                           solver_kwargs.get('departure'))
+        return routes, route_details, total_distance
+
+    route_details = []
+    total_distance = 0
+    for _, cluster_details in results:
+        for detail in cluster_details:
+            detail['vehicle'] = len(route_details) + 1
+            route_details.append(detail)
+            total_distance += detail['distance']
+    return routes, route_details, total_distance
+
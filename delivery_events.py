@@ -0,0 +1,388 @@
+import atexit
+import glob
+import json
+import os
+import re
+import threading
+import time
+import weakref
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+EVENT_COLUMNS = ['event_time', 'order_id', 'vehicle', 'event_type', 'status', 'eta_min', 'actual_min']
+OUTCOMES = ('on_time', 'delayed', 'failed')
+DELAY_BINS = np.arange(-60, 125, 5)  # Biên histogram độ trễ (phút), hai đầu gom vào bin ngoài cùng
+RECENT_POINTS = 500  # Số cặp ETA/thực tế gần nhất giữ cho biểu đồ
+ROLLUP_FILE = 'rollups.json'
+OPEN_ORDERS_FILE = 'open_orders.jsonl'  # Nhật ký thay đổi của open_orders (chỉ nối thêm, thỉnh thoảng ghi gọn lại)
+TIMEZONE = 'Asia/Ho_Chi_Minh'  # Múi giờ dùng để gom số liệu theo ngày
+FLUSH_EVERY = 256        # Số sự kiện chờ tối đa trước khi ghi một file Parquet
+FLUSH_INTERVAL_S = 5.0   # Sự kiện chờ lâu nhất bấy nhiêu giây thì được ghi
+# Gộp theo tầng: đủ COMPACT_FANOUT file cùng tầng thì gộp thành một file tầng trên; file tầng MAX_TIER không gộp nữa,
+# nên mỗi sự kiện bị ghi lại tối đa MAX_TIER lần và không lần gộp nào đọc lại toàn bộ lịch sử
+COMPACT_FANOUT = 8
+MAX_TIER = 3
+JOURNAL_SLACK = 1024  # Ghi gọn nhật ký open_orders khi số dòng vượt 2 x số đơn đang mở + ngưỡng này
+
+
+def _empty_counts():
+    return {outcome: 0 for outcome in OUTCOMES}
+
+
+# Phân loại kết quả giao từ trạng thái và thời gian; None nếu chưa phải trạng thái kết thúc
+def classify(status, eta_min, actual_min, tolerance_min=0.0):
+    if status.startswith('Failed'):
+        return 'failed'
+    if status != 'Delivered':
+        return None
+    if eta_min is None or actual_min is None or np.isnan(eta_min) or np.isnan(actual_min):
+        return 'on_time'  # Không có ETA để so sánh: coi như đúng giờ
+    return 'on_time' if actual_min <= eta_min + tolerance_min else 'delayed'
+
+
+# Tầng gộp của một file Parquet theo tên (file cũ không có tầng coi là tầng 0)
+def _tier(name):
+    match = re.match(r'part-t(\d+)-', name)
+    return int(match.group(1)) if match else 0
+
+
+_open_stores = weakref.WeakSet()
+
+
+# Sự kiện còn chờ khi tiến trình thoát vẫn được ghi: một hàm atexit duy nhất cho mọi kho đang mở
+@atexit.register
+def _flush_open_stores():
+    for store in list(_open_stores):
+        store.flush()
+
+
+# Kho sự kiện giao hàng dạng cột: sự kiện được cộng ngay vào các tổng hợp trong bộ nhớ (tỷ lệ đúng giờ, phân bố
+# độ trễ, thất bại theo ngày/xe) và được ghi theo lô: mỗi lần flush một file Parquet mới (chỉ nối thêm), một JSON
+# tổng hợp cỡ nhỏ và các dòng thay đổi của open_orders. Dashboard chỉ đọc tổng hợp, và chi phí mỗi lần ghi
+# không phụ thuộc độ dài lịch sử
+class DeliveryEventStore:
+    def __init__(self, root='delivery_events', tolerance_min=0.0, flush_every=FLUSH_EVERY,
+                 flush_interval_s=FLUSH_INTERVAL_S):
+        self.root = root
+        self.tolerance_min = tolerance_min
+        self.flush_every = flush_every
+        self.flush_interval_s = flush_interval_s
+        self._pending = []
+        self._timer = None
+        self._lock = threading.RLock()
+        os.makedirs(root, exist_ok=True)
+        self._reset_rollups()
+        self._load_rollups()
+        self._load_open_orders()
+        self._recover_compaction()
+        self._catch_up()
+        _open_stores.add(self)
+
+    def _reset_rollups(self):
+        self.totals = _empty_counts()
+        self.per_day = {}
+        self.per_vehicle = {}
+        self.delay_counts = np.zeros(len(DELAY_BINS) + 1, dtype=np.int64)
+        self.open_orders = {}  # order_id -> {'eta_min', 'dispatch_time', 'vehicle'} của lần ETA gần nhất
+        self.recent = deque(maxlen=RECENT_POINTS)  # (order_id, eta_min, actual_min)
+        self.indexed_files = []
+        self.event_count = 0
+        self.flush_seq = 0  # Số thứ tự lần ghi gần nhất đã lưu vào rollups.json
+        self.compaction = None  # Lần gộp đang dở: {'target', 'sources'}
+        self._dirty_orders = set()  # Đơn có open_orders thay đổi chưa ghi nhật ký
+        self._journal_lines = 0
+
+    def _rollup_path(self):
+        return os.path.join(self.root, ROLLUP_FILE)
+
+    def _journal_path(self):
+        return os.path.join(self.root, OPEN_ORDERS_FILE)
+
+    def _load_rollups(self):
+        if not os.path.exists(self._rollup_path()):
+            return
+        with open(self._rollup_path()) as f:
+            state = json.load(f)
+        self.totals = state['totals']
+        self.per_day = state['per_day']
+        self.per_vehicle = state['per_vehicle']
+        self.delay_counts = np.array(state['delay_counts'], dtype=np.int64)
+        self.recent = deque((tuple(point) for point in state['recent']), maxlen=RECENT_POINTS)
+        self.indexed_files = state['indexed_files']
+        self.event_count = state['event_count']
+        self.flush_seq = state.get('flush_seq', 0)
+        self.compaction = state.get('compaction')
+        if 'open_orders' in state:
+            # Định dạng cũ giữ open_orders trong rollups.json: chuyển sang nhật ký ở lần ghi sau
+            self.open_orders = state['open_orders']
+            self._dirty_orders = set(self.open_orders)
+
+    # Phát lại nhật ký open_orders; bỏ các dòng của lần ghi chưa kịp lưu rollups (file Parquet của lần đó,
+    # nếu đã ghi, được _catch_up cộng lại)
+    def _load_open_orders(self):
+        if not os.path.exists(self._journal_path()):
+            return
+        with open(self._journal_path()) as f:
+            for line in f:
+                try:
+                    seq, order_id, value = json.loads(line)
+                except ValueError:
+                    continue  # Dòng ghi dở khi tiến trình dừng
+                self._journal_lines += 1
+                if seq > self.flush_seq:
+                    continue
+                if value is None:
+                    self.open_orders.pop(order_id, None)
+                else:
+                    self.open_orders[order_id] = value
+
+    def _save_rollups(self):
+        state = {
+            'totals': self.totals, 'per_day': self.per_day, 'per_vehicle': self.per_vehicle,
+            'delay_counts': self.delay_counts.tolist(), 'recent': list(self.recent),
+            'indexed_files': self.indexed_files, 'event_count': self.event_count, 'flush_seq': self.flush_seq,
+            'compaction': self.compaction,
+        }
+        tmp_path = self._rollup_path() + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self._rollup_path())
+
+    def _part_files(self):
+        return sorted(glob.glob(os.path.join(self.root, 'part-*.parquet')))
+
+    # Lưu một lần ghi: nối nhật ký open_orders (chỉ các đơn thay đổi) rồi thay rollups.json (nhỏ, không chứa
+    # open_orders). rollups.json là điểm xác nhận: dòng nhật ký có seq lớn hơn flush_seq đã lưu bị bỏ khi mở lại
+    def _persist(self, new_files=()):
+        seq = self.flush_seq + 1
+        if self._dirty_orders:
+            with open(self._journal_path(), 'a') as f:
+                for order_id in self._dirty_orders:
+                    f.write(json.dumps([seq, order_id, self.open_orders.get(order_id)]) + '\n')
+            self._journal_lines += len(self._dirty_orders)
+            self._dirty_orders = set()
+        self.indexed_files.extend(new_files)
+        self.flush_seq = seq
+        self._save_rollups()
+        if self._journal_lines > 2 * len(self.open_orders) + JOURNAL_SLACK:
+            self._rewrite_journal()
+
+    # Ghi gọn nhật ký thành một dòng cho mỗi đơn đang mở (chi phí chia đều cho các lần ghi trước đó)
+    def _rewrite_journal(self):
+        tmp_path = self._journal_path() + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for order_id, value in self.open_orders.items():
+                f.write(json.dumps([self.flush_seq, order_id, value]) + '\n')
+        os.replace(tmp_path, self._journal_path())
+        self._journal_lines = len(self.open_orders)
+
+    # Hoàn tất lần gộp bị dừng giữa chừng: file đích đã có thì xóa các file nguồn còn sót (dữ liệu đã nằm trong
+    # file đích), chưa có thì bỏ file đích khỏi danh sách và giữ các file nguồn
+    def _recover_compaction(self):
+        for path in glob.glob(os.path.join(self.root, '.tmp-*.parquet')):
+            os.remove(path)
+        if self.compaction is None:
+            return
+        sources = set(self.compaction['sources'])
+        if os.path.exists(os.path.join(self.root, self.compaction['target'])):
+            for name in sources:
+                if os.path.exists(os.path.join(self.root, name)):
+                    os.remove(os.path.join(self.root, name))
+            self.indexed_files = [name for name in self.indexed_files if name not in sources]
+        else:
+            self.indexed_files = [name for name in self.indexed_files if name != self.compaction['target']]
+        self.compaction = None
+        self._save_rollups()
+
+    # File Parquet chưa có trong tổng hợp (vd. tiến trình dừng giữa lúc ghi) được cộng dồn khi mở kho
+    def _catch_up(self):
+        import pyarrow.parquet as pq
+
+        indexed = set(self.indexed_files)
+        missing = [path for path in self._part_files() if os.path.basename(path) not in indexed]
+        for path in missing:
+            self._apply(pq.read_table(path).to_pandas())
+        if missing:
+            self._persist([os.path.basename(path) for path in missing])
+
+    # Cập nhật tổng hợp chỉ với các sự kiện mới. Vòng lặp chỉ ghép sự kiện trạng thái với ETA đang mở
+    # (phụ thuộc thứ tự); phần đếm theo ngày/xe/độ trễ được gom bằng phép toán mảng
+    def _apply(self, events):
+        self.event_count += len(events)
+        completed = []  # (vị trí sự kiện, kết quả, ETA, thực tế, xe)
+        columns = [events[column].tolist() for column in EVENT_COLUMNS]
+        for position, (event_time, order_id, vehicle, event_type, status, eta_min, actual_min) in \
+                enumerate(zip(*columns)):
+            if event_type == 'eta':
+                self.open_orders[order_id] = {'eta_min': eta_min, 'dispatch_time': event_time, 'vehicle': vehicle}
+                self._dirty_orders.add(order_id)
+                continue
+            route = self.open_orders.get(order_id, {})
+            if np.isnan(eta_min):
+                eta_min = route.get('eta_min', np.nan)
+            if np.isnan(actual_min) and 'dispatch_time' in route:
+                actual_min = (event_time - route['dispatch_time']) / 60.0
+            outcome = classify(status, eta_min, actual_min, self.tolerance_min)
+            if outcome is None:
+                continue
+            completed.append((position, outcome, eta_min, actual_min, vehicle if vehicle >= 0 else route.get('vehicle', -1)))
+            if self.open_orders.pop(order_id, None) is not None:
+                self._dirty_orders.add(order_id)
+        if not completed:
+            return
+
+        positions, outcomes, etas, actuals, vehicles = map(np.array, zip(*completed))
+        # Định dạng chuỗi ngày chỉ cho các ngày khác nhau (strftime trên từng sự kiện rất chậm)
+        local_days = pd.to_datetime(events['event_time'].to_numpy()[positions], unit='s', utc=True) \
+            .tz_convert(TIMEZONE).tz_localize(None).normalize().to_numpy()
+        unique_days, day_index = np.unique(local_days, return_inverse=True)
+        days = pd.DatetimeIndex(unique_days).strftime('%Y-%m-%d').to_numpy()[day_index.ravel()]
+        for outcome, count in zip(*np.unique(outcomes, return_counts=True)):
+            self.totals[outcome] += int(count)
+        for (day, outcome), count in pd.Series(1, index=[days, outcomes]).groupby(level=[0, 1]).sum().items():
+            self.per_day.setdefault(day, _empty_counts())[outcome] += int(count)
+        for (vehicle, outcome), count in pd.Series(1, index=[vehicles.astype(str), outcomes]).groupby(level=[0, 1]) \
+                .sum().items():
+            self.per_vehicle.setdefault(vehicle, _empty_counts())[outcome] += int(count)
+
+        etas = etas.astype(np.float64)
+        actuals = actuals.astype(np.float64)
+        timed = (outcomes != 'failed') & ~np.isnan(etas) & ~np.isnan(actuals)
+        delays = actuals[timed] - etas[timed]
+        self.delay_counts += np.bincount(np.searchsorted(DELAY_BINS, delays, side='right'),
+                                         minlength=len(self.delay_counts))
+        order_ids = events['order_id'].to_numpy()[positions[timed]]
+        self.recent.extend(zip(order_ids[-RECENT_POINTS:].tolist(), etas[timed][-RECENT_POINTS:].tolist(),
+                               actuals[timed][-RECENT_POINTS:].tolist()))
+
+    # Sự kiện được cộng ngay vào tổng hợp (dashboard thấy ngay), còn việc ghi đĩa được gom theo lô:
+    # khi đủ flush_every sự kiện hoặc sau flush_interval_s giây kể từ sự kiện chờ đầu tiên
+    def append(self, events):
+        rows = [{
+            'event_time': float(event.get('event_time', time.time())),
+            'order_id': str(event['order_id']),
+            'vehicle': int(event.get('vehicle', -1)),
+            'event_type': event.get('event_type', 'status'),
+            'status': event.get('status', ''),
+            'eta_min': float(event.get('eta_min', np.nan)),
+            'actual_min': float(event.get('actual_min', np.nan)),
+        } for event in events]
+        if not rows:
+            return
+        with self._lock:
+            self._apply(pd.DataFrame(rows, columns=EVENT_COLUMNS))
+            self._pending.extend(rows)
+            if len(self._pending) >= self.flush_every:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval_s, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    # Ghi các sự kiện đang chờ (đã có trong tổng hợp) thành một file Parquet tầng 0, lưu tổng hợp rồi gộp tầng
+    def flush(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+            events = pd.DataFrame(self._pending, columns=EVENT_COLUMNS)
+            self._pending = []
+            name = f"part-t0-{time.time_ns():020d}.parquet"
+            pq.write_table(pa.Table.from_pandas(events, preserve_index=False), os.path.join(self.root, name))
+            self._persist([name])
+            self.compact()
+
+    # Gộp theo tầng: mỗi tầng có từ COMPACT_FANOUT file trở lên được gộp thành một file tầng trên.
+    # Thứ tự an toàn khi dừng giữa chừng: ghi lần gộp (đích + nguồn) vào rollups, ghi file đích (tạm rồi đổi tên),
+    # xóa file nguồn, cuối cùng bỏ nguồn khỏi danh sách; _recover_compaction hoàn tất nếu bị dừng ở giữa
+    def compact(self):
+        import pyarrow.parquet as pq
+
+        with self._lock:
+            for tier in range(MAX_TIER):
+                names = [os.path.basename(path) for path in self._part_files()]
+                sources = [name for name in names if _tier(name) == tier]
+                if len(sources) < COMPACT_FANOUT:
+                    continue
+                target = f"part-t{tier + 1}-{time.time_ns():020d}.parquet"
+                self.compaction = {'target': target, 'sources': sources}
+                self.indexed_files.append(target)
+                self._save_rollups()
+                tmp_path = os.path.join(self.root, '.tmp-' + target)
+                pq.write_table(pq.read_table([os.path.join(self.root, name) for name in sources]), tmp_path)
+                os.replace(tmp_path, os.path.join(self.root, target))
+                self._recover_compaction()
+
+    # ETA dự kiến của mọi đơn trên các tuyến vừa tối ưu (times[k] là thời điểm đến nodes[k + 1])
+    def record_route_etas(self, route_details, df_locations, depot=0, dispatch_time=None):
+        dispatch_time = time.time() if dispatch_time is None else dispatch_time
+        names = df_locations['name'].astype(str).to_numpy()
+        events = [
+            {'event_time': dispatch_time, 'order_id': names[node], 'vehicle': detail['vehicle'], 'event_type': 'eta',
+             'status': 'Planned', 'eta_min': eta}
+            for detail in route_details
+            for node, eta in zip(detail['nodes'][1:], detail['times'])
+            if node != depot
+        ]
+        self.append(events)
+
+    def record_status(self, order_id, status, vehicle=-1, actual_min=None, event_time=None):
+        event = {'order_id': order_id, 'status': status, 'vehicle': vehicle, 'event_type': 'status'}
+        if actual_min is not None:
+            event['actual_min'] = actual_min
+        if event_time is not None:
+            event['event_time'] = event_time
+        self.append([event])
+
+    # Nhiều thay đổi trạng thái cùng lúc (vd. sau khi gửi hàng loạt lên blockchain), ghi trong một lần flush
+    def record_statuses(self, statuses):
+        self.append([{'order_id': order_id, 'status': status, 'event_type': 'status'} for order_id, status in statuses])
+
+    # Các chỉ số tổng hợp cho dashboard (chỉ đọc từ bộ nhớ)
+    def kpis(self):
+        with self._lock:
+            completed = sum(self.totals.values())
+            delivered = self.totals['on_time'] + self.totals['delayed']
+            return {
+                'counts': dict(self.totals),
+                'completed': completed,
+                'on_time_rate': self.totals['on_time'] / delivered if delivered else None,
+                'open_orders': len(self.open_orders),
+                'events': self.event_count,
+            }
+
+    def daily_frame(self):
+        with self._lock:
+            return pd.DataFrame.from_dict(self.per_day, orient='index', columns=list(OUTCOMES)).sort_index()
+
+    def vehicle_frame(self):
+        with self._lock:
+            return pd.DataFrame.from_dict(self.per_vehicle, orient='index', columns=list(OUTCOMES)).sort_index()
+
+    # Histogram độ trễ (thực tế - ETA): (nhãn bin, số lượng)
+    def delay_histogram(self):
+        with self._lock:
+            labels = [f"< {DELAY_BINS[0]}"] + [f"{low}..{high}" for low, high in zip(DELAY_BINS[:-1], DELAY_BINS[1:])] \
+                + [f">= {DELAY_BINS[-1]}"]
+            return labels, self.delay_counts.copy()
+
+    def eta_vs_actual(self):
+        with self._lock:
+            return pd.DataFrame(list(self.recent), columns=['order_id', 'eta_min', 'actual_min'])
+
+    # Đọc lại sự kiện gốc (phân tích ngoài dashboard); có thể chọn cột và lọc kiểu pyarrow
+    def scan(self, columns=None, filters=None):
+        import pyarrow.parquet as pq
+
+        self.flush()
+        files = self._part_files()
+        if not files:
+            return pd.DataFrame(columns=columns or EVENT_COLUMNS)
+        return pq.read_table(files, columns=columns, filters=filters).to_pandas()
@@ -0,0 +1,170 @@
+import os
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+MIN_DISTANCE = 1.0  # Mọi cạnh khác đường chéo >= 1.0 (khoảng cách dương cho solver)
+
+# Số phần tử tối đa của một khối trung gian khi tính theo từng phần (~32 MB với float64)
+DEFAULT_BLOCK_ELEMENTS = 4_000_000
+
+
+# Khoảng cách Euclidean trên độ (x100); các tham số broadcast với nhau theo quy tắc NumPy
+def _euclidean(lat1, lon1, lat2, lon2):
+    dlat = lat1 - lat2
+    dlon = lon1 - lon2
+    return np.sqrt(dlat * dlat + dlon * dlon) * 100
+
+
+# Khoảng cách haversine (km); nhận tọa độ đã đổi sang radian
+def _haversine(lat1, lon1, lat2, lon2):
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+METRICS = {
+    'euclidean': _euclidean,
+    'haversine': _haversine,
+}
+# Khoảng cách theo mạng đường từ bản trích OSM cục bộ (road_network.py), nạp từ ROAD_NETWORK_FILE khi cần lần đầu
+ROAD_METRIC = 'road'
+_road_network = None
+
+
+def register_road_network(network):
+    global _road_network
+    _road_network = network
+
+
+def get_road_network():
+    global _road_network
+    if _road_network is None:
+        path = os.environ.get('ROAD_NETWORK_FILE')
+        if not path:
+            raise ValueError("Chưa cấu hình mạng đường: đặt ROAD_NETWORK_FILE hoặc gọi register_road_network()")
+        from road_network import DEFAULT_CACHE_DIR, RoadNetwork
+        _road_network = RoadNetwork.load(path, cache_dir=os.environ.get('ROAD_CACHE_DIR', DEFAULT_CACHE_DIR))
+    return _road_network
+
+
+def available_metrics():
+    road = _road_network is not None or bool(os.environ.get('ROAD_NETWORK_FILE'))
+    return list(METRICS) + ([ROAD_METRIC] if road else [])
+
+
+def _prepare_coords(lats, lons, metric):
+    if metric not in METRICS:
+        raise ValueError(f"metric không hợp lệ: {metric}. Chọn một trong {sorted(METRICS)}")
+    lat = np.asarray(lats, dtype=np.float64)
+    lon = np.asarray(lons, dtype=np.float64)
+    if metric == 'haversine':
+        return np.radians(lat), np.radians(lon)
+    return lat, lon
+
+
+# Ghi một khối hàng [start, stop) vào ma trận kết quả, áp dụng ngưỡng tối thiểu và đường chéo 0
+def _fill_rows(out, start, stop, lat, lon, metric_fn, min_distance):
+    block = metric_fn(lat[start:stop, None], lon[start:stop, None], lat[None, :], lon[None, :])
+    np.maximum(block, min_distance, out=block)
+    rows = np.arange(stop - start)
+    block[rows, rows + start] = 0
+    if np.issubdtype(out.dtype, np.integer):
+        np.rint(block, out=block)
+    out[start:stop] = block
+
+
+# Hàm tạo ma trận khoảng cách cho toàn bộ điểm trong một lượt NumPy
+def build_distance_matrix(lats, lons, metric='euclidean', dtype=np.float64, chunk_size=None,
+                          out=None, min_distance=MIN_DISTANCE):
+    lat, lon = _prepare_coords(lats, lons, 'euclidean' if metric == ROAD_METRIC else metric)
+    if lat.ndim != 1 or lat.shape != lon.shape:
+        raise ValueError("lats và lons phải là mảng một chiều cùng độ dài!")
+    if np.any(np.isnan(lat)) or np.any(np.isnan(lon)):
+        raise ValueError("Tọa độ chứa giá trị NaN!")
+
+    n = len(lat)
+    dtype = np.dtype(dtype)
+    if out is None:
+        out = np.empty((n, n), dtype=dtype)
+    elif out.shape != (n, n):
+        raise ValueError("out phải có kích thước (n, n)!")
+
+    if metric == ROAD_METRIC:
+        table = get_road_network().distance_matrix(lat, lon, min_distance)
+        out[:] = np.rint(table) if np.issubdtype(dtype, np.integer) else table
+        return out
+
+    # Mặc định chia khối theo số hàng để bộ nhớ tạm không vượt DEFAULT_BLOCK_ELEMENTS
+    if chunk_size is None:
+        chunk_size = max(1, DEFAULT_BLOCK_ELEMENTS // max(n, 1))
+    metric_fn = METRICS[metric]
+    for start in range(0, n, chunk_size):
+        _fill_rows(out, start, min(start + chunk_size, n), lat, lon, metric_fn, min_distance)
+    return out
+
+
+# Tạo ma trận trên đĩa (np.memmap) cho 10k-20k điểm mà không giữ toàn bộ trong RAM
+def build_distance_matrix_memmap(lats, lons, path, metric='euclidean', dtype=np.float32, chunk_size=None):
+    n = len(lats)
+    out = np.lib.format.open_memmap(path, mode='w+', dtype=np.dtype(dtype), shape=(n, n))
+    build_distance_matrix(lats, lons, metric=metric, dtype=dtype, chunk_size=chunk_size, out=out)
+    out.flush()
+    return out
+
+
+# Khoảng cách theo từng cặp nút (from_nodes[i] -> to_nodes[i]), cùng ngưỡng tối thiểu và 0 khi trùng nút
+def leg_distances(lats, lons, from_nodes, to_nodes, metric='euclidean', min_distance=MIN_DISTANCE):
+    if metric == ROAD_METRIC:
+        return get_road_network().leg_distances(lats, lons, from_nodes, to_nodes, min_distance)
+    lat, lon = _prepare_coords(lats, lons, metric)
+    from_nodes = np.asarray(from_nodes, dtype=np.intp)
+    to_nodes = np.asarray(to_nodes, dtype=np.intp)
+    legs = METRICS[metric](lat[from_nodes], lon[from_nodes], lat[to_nodes], lon[to_nodes])
+    legs = np.maximum(legs, min_distance)
+    legs[from_nodes == to_nodes] = 0
+    return legs
+
+
+# Tính nhiều lần chặng lẻ trên cùng một tập điểm (vd. tìm kiếm cục bộ): chuẩn bị tọa độ một lần thay vì mỗi lần gọi.
+# Với 'road', các điểm được gắn vào mạng đường một lần; prepare(points) dựng bảng đường ngắn nhất trên nút của
+# những điểm sắp dùng (không ghi cache đĩa), các lần gọi sau chỉ tra bảng. Kết quả giống leg_distances
+class LegCosts:
+    def __init__(self, lats, lons, metric='euclidean', min_distance=MIN_DISTANCE):
+        self.metric = metric
+        self.min_distance = min_distance
+        if metric == ROAD_METRIC:
+            self.network = get_road_network()
+            self.snapped, self.access = self.network.snap(lats, lons)
+            self._table_nodes = np.array([], dtype=np.int64)
+            self._table = np.empty((0, 0))
+        else:
+            self.lat, self.lon = _prepare_coords(lats, lons, metric)
+
+    def prepare(self, points):
+        if self.metric != ROAD_METRIC:
+            return
+        nodes = np.unique(self.snapped[np.asarray(points, dtype=np.intp)])
+        if len(nodes) == len(self._table_nodes) and np.array_equal(nodes, self._table_nodes):
+            return
+        self._table_nodes = nodes
+        self._table = self.network.node_table(nodes)
+
+    def __call__(self, from_nodes, to_nodes):
+        from_nodes = np.asarray(from_nodes, dtype=np.intp)
+        to_nodes = np.asarray(to_nodes, dtype=np.intp)
+        if self.metric == ROAD_METRIC:
+            rows = np.searchsorted(self._table_nodes, self.snapped[from_nodes])
+            cols = np.searchsorted(self._table_nodes, self.snapped[to_nodes])
+            if (rows >= len(self._table_nodes)).any() or (cols >= len(self._table_nodes)).any() or \
+                    (self._table_nodes[rows] != self.snapped[from_nodes]).any() or \
+                    (self._table_nodes[cols] != self.snapped[to_nodes]).any():
+                raise ValueError("Chặng nằm ngoài tập điểm đã prepare()")
+            legs = self._table[rows, cols] + self.access[from_nodes] + self.access[to_nodes]
+        else:
+            legs = METRICS[self.metric](self.lat[from_nodes], self.lon[from_nodes], self.lat[to_nodes],
+                                        self.lon[to_nodes])
+        legs = np.maximum(legs, self.min_distance)
+        legs[from_nodes == to_nodes] = 0
+        return legs
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+ALL_SEGMENT = ('all',)  # Khóa phân đoạn khi không chia theo cột nào
+
+
+# Tắt log CmdStanPy (cả trong tiến trình con)
+def _quiet_stan():
+    logging.getLogger('cmdstanpy').setLevel(logging.WARNING)
+    logging.getLogger('prophet').setLevel(logging.WARNING)
+
+
+# Huấn luyện một phân đoạn trong tiến trình con; trả về mô hình dạng JSON để truyền giữa tiến trình
+def _fit_segment(series, prophet_kwargs):
+    _quiet_stan()
+    from prophet import Prophet
+    from prophet.serialize import model_to_json
+
+    model = Prophet(**prophet_kwargs)
+    model.fit(series)
+    return model_to_json(model)
+
+
+# Dấu vân tay dữ liệu + cấu hình: mô hình trên đĩa được dùng lại khi dấu vân tay không đổi
+def _fingerprint(series, prophet_kwargs):
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(series[['ds', 'y']], index=False).to_numpy().tobytes())
+    digest.update(json.dumps(prophet_kwargs, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+# Dịch vụ dự báo: một mô hình Prophet cho mỗi phân đoạn (depot, quận, thời tiết...),
+# huấn luyện song song, lưu xuống đĩa và dự báo nhiều horizon trong một lần gọi
+class ForecastService:
+    def __init__(self, model_dir='models', date_col='date', target_col='delivery_time', segment_cols=None,
+                 agg='mean', prophet_kwargs=None, max_workers=None):
+        self.model_dir = model_dir
+        self.date_col = date_col
+        self.target_col = target_col
+        self.segment_cols = list(segment_cols or [])
+        self.agg = agg  # 'sum' cho số lượng đơn/sales, 'mean' cho thời gian giao
+        self.prophet_kwargs = prophet_kwargs or {'daily_seasonality': True, 'yearly_seasonality': True}
+        self.max_workers = max_workers
+        self.models = {}
+        self.refitted = []  # Các phân đoạn phải huấn luyện lại ở lần fit gần nhất
+        os.makedirs(model_dir, exist_ok=True)
+
+    # Gom dữ liệu thành chuỗi ngày (ds, y) cho từng phân đoạn
+    def segment_series(self, df):
+        missing = [column for column in [self.date_col, self.target_col] + self.segment_cols if column not in df.columns]
+        if missing:
+            raise ValueError(f"Dữ liệu thiếu cột: {', '.join(missing)}")
+        df = df.assign(**{self.date_col: pd.to_datetime(df[self.date_col])})
+        keys = self.segment_cols + [self.date_col]
+        daily = df.groupby(keys)[self.target_col].agg(self.agg).reset_index()
+        daily = daily.rename(columns={self.date_col: 'ds', self.target_col: 'y'})
+        if not self.segment_cols:
+            return {ALL_SEGMENT: daily[['ds', 'y']]}
+        return {
+            (key if isinstance(key, tuple) else (key,)): group[['ds', 'y']].reset_index(drop=True)
+            for key, group in daily.groupby(self.segment_cols)
+        }
+
+    # Tên file gồm cả cột mục tiêu, cách gom và các cột phân đoạn: cùng model_dir, mô hình delivery_time/mean
+    # không ghi đè (hay bị nạp nhầm thành) mô hình sales/sum của cùng phân đoạn
+    def _paths(self, segment):
+        key = [self.target_col, str(self.agg), self.segment_cols, [str(part) for part in segment]]
+        name = hashlib.sha1(json.dumps(key).encode()).hexdigest()[:16]
+        return os.path.join(self.model_dir, f"{name}.json"), os.path.join(self.model_dir, f"{name}.meta.json")
+
+    def _load_if_current(self, segment, fingerprint):
+        model_path, meta_path = self._paths(segment)
+        if not (os.path.exists(model_path) and os.path.exists(meta_path)):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get('fingerprint') != fingerprint:
+            return None
+        from prophet.serialize import model_from_json
+        with open(model_path) as f:
+            return model_from_json(f.read())
+
+    def _save(self, segment, fingerprint, model_json):
+        model_path, meta_path = self._paths(segment)
+        with open(model_path, 'w') as f:
+            f.write(model_json)
+        with open(meta_path, 'w') as f:
+            json.dump({'segment': [str(part) for part in segment], 'fingerprint': fingerprint,
+                       'target': self.target_col, 'agg': str(self.agg), 'segment_cols': self.segment_cols}, f)
+
+    # Huấn luyện (hoặc nạp lại từ đĩa) mô hình cho mọi phân đoạn; chỉ phân đoạn có dữ liệu mới mới phải fit lại
+    def fit(self, df):
+        _quiet_stan()
+        from prophet.serialize import model_from_json
+
+        series_by_segment = self.segment_series(df)
+        to_fit = {}
+        self.models = {}
+        for segment, series in series_by_segment.items():
+            fingerprint = _fingerprint(series, self.prophet_kwargs)
+            model = self._load_if_current(segment, fingerprint)
+            if model is None:
+                to_fit[segment] = (series, fingerprint)
+            else:
+                self.models[segment] = model
+
+        if len(to_fit) == 1 or self.max_workers == 1:
+            fitted = {segment: _fit_segment(series, self.prophet_kwargs) for segment, (series, _) in to_fit.items()}
+        elif to_fit:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {segment: executor.submit(_fit_segment, series, self.prophet_kwargs)
+                           for segment, (series, _) in to_fit.items()}
+                fitted = {segment: future.result() for segment, future in futures.items()}
+        else:
+            fitted = {}
+
+        for segment, model_json in fitted.items():
+            self._save(segment, to_fit[segment][1], model_json)
+            self.models[segment] = model_from_json(model_json)
+        self.refitted = list(fitted)
+        return self
+
+    # Dự báo nhiều horizon trong một lần: mỗi phân đoạn chỉ gọi predict một lần với horizon lớn nhất,
+    # sau đó cắt theo từng horizon. Trả về {horizon: DataFrame}
+    def predict(self, horizons=(7, 30), freq='D'):
+        if not self.models:
+            raise ValueError("Chưa có mô hình nào. Gọi fit() trước.")
+        horizons = sorted(set(int(h) for h in horizons))
+        max_horizon = horizons[-1]
+        frames = []
+        for segment, model in self.models.items():
+            future = model.make_future_dataframe(periods=max_horizon, freq=freq, include_history=False)
+            forecast = model.predict(future)[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
+            forecast.insert(0, 'step', range(1, len(forecast) + 1))
+            for column, value in zip(self.segment_cols or ['segment'], segment):
+                forecast.insert(0, column, value)
+            frames.append(forecast)
+        combined = pd.concat(frames, ignore_index=True)
+        return {h: combined[combined['step'] <= h].reset_index(drop=True) for h in horizons}
+
+    # Dự báo đầy đủ (gồm cả lịch sử) cho một phân đoạn, dùng để vẽ biểu đồ
+    def forecast_with_history(self, segment=ALL_SEGMENT, periods=30):
+        model = self.models[segment]
+        future = model.make_future_dataframe(periods=periods)
+        return model, model.predict(future)
@@ -0,0 +1,195 @@
+import heapq
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from logistics_graph import LogisticsGraph
+
+OBJECTIVES = ('distance', 'emissions')
+DEFAULT_LANDMARKS = 8
+
+
+# Chọn landmark theo kiểu "xa nhất": mỗi landmark mới là đỉnh xa nhất (hữu hạn) so với các landmark đã chọn
+def select_landmarks(graph, num_landmarks, seed=0):
+    n = graph.shape[0]
+    num_landmarks = min(num_landmarks, n)
+    rng = np.random.default_rng(seed)
+    landmarks = [int(rng.integers(n))]
+    nearest = dijkstra(graph, directed=False, indices=landmarks[0])
+    while len(landmarks) < num_landmarks:
+        # Đỉnh không tới được (khác thành phần liên thông) được ưu tiên để mỗi thành phần có landmark riêng
+        candidate = np.where(np.isinf(nearest), np.finfo(np.float64).max, nearest)
+        candidate[landmarks] = -1.0
+        node = int(np.argmax(candidate))
+        if candidate[node] <= 0:
+            break
+        landmarks.append(node)
+        nearest = np.minimum(nearest, dijkstra(graph, directed=False, indices=node))
+    return np.array(landmarks, dtype=np.intp)
+
+
+# Bộ định tuyến xanh trên mạng G (cạnh có distance + emissions_factor):
+# - A* với cận dưới ALT (landmark + bất đẳng thức tam giác), chấp nhận được cho cả hai mục tiêu
+# - Tìm tập Pareto quãng đường / phát thải (bi-objective A*, kiểu BOA*)
+class GreenRouter:
+    def __init__(self, G, distance_attr='distance', factor_attr='emissions_factor', num_landmarks=DEFAULT_LANDMARKS,
+                 seed=0):
+        # Danh sách kề dạng CSR; trọng số phát thải (distance x factor) tính sẵn một lần thay vì lambda mỗi cạnh
+        if isinstance(G, LogisticsGraph):
+            self.graph = G
+        else:
+            self.graph = LogisticsGraph.from_networkx(G, distance_attr, factor_attr)
+        self.nodes = self.graph.nodes
+        self.index = self.graph.index
+        self.directed = self.graph.directed
+        n = len(self.nodes)
+        self.indptr = np.asarray(self.graph.indptr)
+        self.indices = np.asarray(self.graph.indices)
+        self.weights = {'distance': np.asarray(self.graph.distance), 'emissions': np.asarray(self.graph.emissions)}
+        self._adjacency = (self.indptr.tolist(), self.indices.tolist(),
+                           self.weights['distance'].tolist(), self.weights['emissions'].tolist())
+
+        # Bảng landmark: khoảng cách từ mỗi landmark tới mọi đỉnh theo từng mục tiêu, tính trước một lần
+        self.landmarks = np.array([], dtype=np.intp)
+        self.landmark_tables = {}
+        if n:
+            graphs = {objective: self._sparse(weight) for objective, weight in self.weights.items()}
+            self.landmarks = select_landmarks(graphs['distance'], num_landmarks, seed)
+            self.landmark_tables = {
+                objective: np.atleast_2d(dijkstra(graph, directed=self.directed, indices=self.landmarks))
+                for objective, graph in graphs.items()
+            }
+            if self.directed:
+                # Đồ thị có hướng cần thêm khoảng cách từ mọi đỉnh tới landmark (đồ thị ngược)
+                self.reverse_tables = {
+                    objective: np.atleast_2d(dijkstra(graph.T.tocsr(), directed=True, indices=self.landmarks))
+                    for objective, graph in graphs.items()
+                }
+
+    def _sparse(self, weight):
+        n = len(self.nodes)
+        rows = np.repeat(np.arange(n), np.diff(self.indptr))
+        # Cạnh song song: giữ cạnh nhỏ nhất (csr_matrix cộng dồn các phần tử trùng)
+        order = np.lexsort((weight, self.indices, rows))
+        rows, cols, weight = rows[order], self.indices[order], weight[order]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+        # Trọng số 0 bị csgraph coi là "không có cạnh"; thay bằng số rất nhỏ
+        weight = np.maximum(weight[first], np.finfo(np.float64).tiny)
+        return csr_matrix((weight, (rows[first], cols[first])), shape=(n, n))
+
+    # Cận dưới ALT cho mọi đỉnh tới target (vector hóa trên toàn bộ đỉnh), theo thứ tự self.nodes
+    def heuristic(self, target, objective='emissions'):
+        return self._heuristic(self.index[target], objective)
+
+    def _heuristic(self, t, objective):
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Mục tiêu không hợp lệ: {objective} (chọn {', '.join(OBJECTIVES)})")
+        table = self.landmark_tables[objective]
+        if self.directed:
+            # d(v,t) >= d(L,t) - d(L,v) và d(v,t) >= d(v,L) - d(t,L)
+            reverse = self.reverse_tables[objective]
+            with np.errstate(invalid='ignore'):
+                forward = table[:, [t]] - table
+                backward = reverse - reverse[:, [t]]
+            bounds = np.concatenate([forward, backward])
+        else:
+            with np.errstate(invalid='ignore'):
+                bounds = np.abs(table[:, [t]] - table)
+        bounds = np.where(np.isfinite(bounds), bounds, 0.0)
+        return np.maximum(bounds.max(axis=0), 0.0) if len(bounds) else np.zeros(len(self.nodes))
+
+    def _path(self, parents, node):
+        path = []
+        while node != -1:
+            path.append(self.nodes[node])
+            node = parents[node]
+        return path[::-1]
+
+    # Đường ngắn nhất theo một mục tiêu bằng A* + ALT. Trả về (đường đi, quãng đường, phát thải)
+    def shortest_path(self, source, target, objective='emissions'):
+        s, t = self.index[source], self.index[target]
+        h = self._heuristic(t, objective).tolist()
+        indptr, indices, distances, emissions = self._adjacency
+        weights = emissions if objective == 'emissions' else distances
+
+        n = len(self.nodes)
+        best = [float('inf')] * n
+        parents = [-1] * n
+        parent_edges = [-1] * n
+        closed = [False] * n
+        best[s] = 0.0
+        heap = [(h[s], 0.0, s)]
+        while heap:
+            _, g, u = heapq.heappop(heap)
+            if closed[u]:
+                continue
+            if u == t:
+                total_distance = total_emissions = 0.0
+                node = t
+                while parents[node] != -1:
+                    total_distance += distances[parent_edges[node]]
+                    total_emissions += emissions[parent_edges[node]]
+                    node = parents[node]
+                return self._path(parents, t), total_distance, total_emissions
+            closed[u] = True
+            for k in range(indptr[u], indptr[u + 1]):
+                v = indices[k]
+                cost = g + weights[k]
+                if cost < best[v]:
+                    best[v] = cost
+                    parents[v] = u
+                    parent_edges[v] = k
+                    heapq.heappush(heap, (cost + h[v], cost, v))
+        raise ValueError(f"Không có đường đi từ {source} tới {target}")
+
+    # Tập Pareto (quãng đường, phát thải) từ source tới target. Nhãn được lấy ra theo thứ tự từ điển
+    # (f_distance, f_emissions) nên mỗi đỉnh chỉ cần nhớ phát thải nhỏ nhất đã đóng (BOA*).
+    # Trả về danh sách {'path', 'distance', 'emissions'} theo quãng đường tăng dần
+    def pareto_paths(self, source, target, max_solutions=None):
+        s, t = self.index[source], self.index[target]
+        h_distance = self._heuristic(t, 'distance').tolist()
+        h_emissions = self._heuristic(t, 'emissions').tolist()
+        indptr, indices, distances, emissions = self._adjacency
+
+        n = len(self.nodes)
+        min_emissions = [float('inf')] * n  # Phát thải nhỏ nhất của nhãn đã đóng tại mỗi đỉnh
+        label_nodes = [s]
+        label_parents = [-1]
+        heap = [(h_distance[s], h_emissions[s], 0.0, 0.0, 0)]
+        solutions = []
+        while heap:
+            _, f_emissions, g_distance, g_emissions, label = heapq.heappop(heap)
+            u = label_nodes[label]
+            if g_emissions >= min_emissions[u] or f_emissions >= min_emissions[t]:
+                continue
+            min_emissions[u] = g_emissions
+            if u == t:
+                solutions.append((g_distance, g_emissions, label))
+                if max_solutions is not None and len(solutions) >= max_solutions:
+                    break
+                continue
+            for k in range(indptr[u], indptr[u + 1]):
+                v = indices[k]
+                new_emissions = g_emissions + emissions[k]
+                if new_emissions >= min_emissions[v] or new_emissions + h_emissions[v] >= min_emissions[t]:
+                    continue
+                new_distance = g_distance + distances[k]
+                label_nodes.append(v)
+                label_parents.append(label)
+                heapq.heappush(heap, (new_distance + h_distance[v], new_emissions + h_emissions[v],
+                                      new_distance, new_emissions, len(label_nodes) - 1))
+
+        results = []
+        for distance, emission, label in solutions:
+            path = []
+            while label != -1:
+                path.append(self.nodes[label_nodes[label]])
+                label = label_parents[label]
+            results.append({'path': path[::-1], 'distance': distance, 'emissions': emission})
+        return results
+
+    # Tổng quãng đường và phát thải của một đường đi (theo tên đỉnh)
+    def path_cost(self, path):
+        return self.graph.path_cost(path)
@@ -0,0 +1,219 @@
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Đo thời gian theo từng công đoạn (dựng ma trận, giải OR-Tools, dựng tuyến, vẽ bản đồ, thời tiết, RPC blockchain...).
+# Khi tắt, span() trả về một context rỗng dùng chung và timed() gọi thẳng hàm gốc, nên chi phí gần như bằng 0.
+# Bật bằng biến môi trường INSTRUMENTATION=1 hoặc enable() (vd. từ panel debug ở sidebar)
+
+# Cận trên các bucket (giây) của histogram kiểu Prometheus
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+WINDOW = 512  # Số lần đo gần nhất giữ lại để tính phân vị cuộn (p50/p95/p99)
+METRIC_NAME = 'delivery_stage_seconds'
+
+_enabled = os.environ.get('INSTRUMENTATION', '').lower() in ('1', 'true', 'yes')
+_stages = {}
+_lock = threading.Lock()
+_NOOP = nullcontext()
+_local = threading.local()  # Bộ gom thời gian của collect() theo luồng
+
+
+# Thống kê của một công đoạn: histogram tích lũy (không bao giờ xóa, dùng cho Prometheus)
+# và bộ đệm vòng WINDOW lần đo gần nhất (cho phân vị cuộn trong panel debug)
+class StageStats:
+    def __init__(self, name, window=WINDOW):
+        self.name = name
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)  # Bucket cuối là +Inf
+        self._recent = [0.0] * window
+        self._head = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, error=False):
+        with self._lock:
+            self.count += 1
+            self.errors += bool(error)
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            self.last = seconds
+            self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+            self._recent[self._head % len(self._recent)] = seconds
+            self._head += 1
+
+    def recent(self):
+        with self._lock:
+            return sorted(self._recent[:min(self._head, len(self._recent))])
+
+    def snapshot(self):
+        recent = self.recent()
+
+        def quantile(q):
+            return recent[min(len(recent) - 1, int(q * len(recent)))] if recent else None
+        return {
+            'stage': self.name, 'count': self.count, 'errors': self.errors, 'total_s': self.total,
+            'mean_s': self.total / self.count if self.count else None, 'last_s': self.last, 'max_s': self.max,
+            'p50_s': quantile(0.5), 'p95_s': quantile(0.95), 'p99_s': quantile(0.99),
+        }
+
+
+def enable(flag=True):
+    global _enabled
+    _enabled = bool(flag)
+
+
+def disable():
+    enable(False)
+
+
+def is_enabled():
+    return _enabled
+
+
+def stage(name):
+    stats = _stages.get(name)
+    if stats is None:
+        with _lock:
+            stats = _stages.setdefault(name, StageStats(name))
+    return stats
+
+
+@contextmanager
+def _timed_span(name):
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        if _enabled:
+            stage(name).observe(seconds, error)
+        collector = getattr(_local, 'collector', None)
+        if collector is not None:
+            collector[name] = collector.get(name, 0.0) + seconds
+
+
+def _active():
+    return _enabled or getattr(_local, 'collector', None) is not None
+
+
+# Context manager đo một công đoạn: with span('routing.solve'): ...
+def span(name):
+    return _timed_span(name) if _active() else _NOOP
+
+
+# Decorator đo mỗi lần gọi hàm; tên công đoạn mặc định là module.tên_hàm
+def timed(name=None):
+    def decorator(fn):
+        stage_name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _active():
+                return fn(*args, **kwargs)
+            with _timed_span(stage_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Gom thời gian các công đoạn chạy trong khối with (cùng luồng) vào một dict tên -> tổng giây, kể cả khi đo đang
+# tắt; dùng trong tiến trình con để gửi số liệu về tiến trình chính, nơi chúng được ghi lại bằng observe()
+@contextmanager
+def collect():
+    timings = {}
+    previous = getattr(_local, 'collector', None)
+    _local.collector = timings
+    try:
+        yield timings
+    finally:
+        _local.collector = previous
+
+
+# Ghi một lần đo từ bên ngoài (vd. thời gian đã đo sẵn trong tiến trình con)
+def observe(name, seconds, error=False):
+    if _enabled:
+        stage(name).observe(seconds, error)
+
+
+def snapshot():
+    with _lock:
+        stages = list(_stages.values())
+    return [stats.snapshot() for stats in sorted(stages, key=lambda stats: -stats.total)]
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Định dạng text exposition của Prometheus: một histogram METRIC_NAME với nhãn stage
+def prometheus_text():
+    with _lock:
+        stages = sorted(_stages.values(), key=lambda stats: stats.name)
+    lines = [f"# HELP {METRIC_NAME} Thời gian xử lý theo công đoạn (giây)", f"# TYPE {METRIC_NAME} histogram"]
+    errors = [f"# HELP {METRIC_NAME}_errors_total Số lần công đoạn kết thúc bằng ngoại lệ",
+              f"# TYPE {METRIC_NAME}_errors_total counter"]
+    for stats in stages:
+        with stats._lock:
+            buckets, count, total, error_count = list(stats.buckets), stats.count, stats.total, stats.errors
+        label = f'stage="{_escape(stats.name)}"'
+        cumulative = 0
+        for bound, value in zip(BUCKETS + (float('inf'),), buckets):
+            cumulative += value
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{METRIC_NAME}_bucket{{{label},le="{le}"}} {cumulative}')
+        lines.append(f'{METRIC_NAME}_sum{{{label}}} {total}')
+        lines.append(f'{METRIC_NAME}_count{{{label}}} {count}')
+        errors.append(f'{METRIC_NAME}_errors_total{{{label}}} {error_count}')
+    return '\n'.join(lines + errors) + '\n'
+
+
+# Nối một dòng JSON cho mỗi công đoạn (kèm thời điểm) vào file, để gom bằng log shipper
+def export_jsonl(path):
+    timestamp = time.time()
+    with open(path, 'a', encoding='utf-8') as f:
+        for row in snapshot():
+            f.write(json.dumps(dict(row, timestamp=timestamp), ensure_ascii=False) + '\n')
+    return path
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] == '/metrics':
+            body, content_type = prometheus_text().encode(), 'text/plain; version=0.0.4; charset=utf-8'
+        elif self.path.split('?')[0] == '/metrics.json':
+            body, content_type = json.dumps(snapshot()).encode(), 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Máy chủ HTTP nền phục vụ /metrics (Prometheus) và /metrics.json cho công cụ scrape
+def serve_metrics(port, host='0.0.0.0'):
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+
+# Cột của bảng chính sách tồn kho (một dòng cho mỗi cặp SKU x kho) và giá trị mặc định
+POLICY_DEFAULTS = {
+    'on_hand': 0.0,          # Tồn kho hiện có
+    'on_order': 0.0,         # Hàng đang về
+    'lead_time_days': 7,     # Thời gian chờ hàng (ngày)
+    'ordering_cost': 100.0,  # Chi phí mỗi lần đặt hàng
+    'holding_cost': 0.5,     # Chi phí lưu kho mỗi đơn vị trong kỳ EOQ
+    'service_level': 0.95,   # Mức phục vụ mục tiêu cho tồn kho an toàn
+}
+DEFAULT_CHUNK_SIZE = 100_000
+ALERT_DAYS = 7
+EOQ_PERIOD_DAYS = 30  # EOQ dùng nhu cầu 30 ngày như order_forecasting.py ban đầu
+
+
+# Chuyển bảng dự báo dạng dài (khóa..., step, yhat) thành ma trận (số dòng, số ngày) khớp thứ tự bảng chính sách
+def forecast_matrix(forecast_df, policy, keys, value_col='yhat'):
+    wide = forecast_df.pivot_table(index=keys, columns='step', values=value_col, aggfunc='sum')
+    index = pd.MultiIndex.from_frame(policy[keys]) if len(keys) > 1 else pd.Index(policy[keys[0]])
+    wide = wide.reindex(index)
+    if wide.isna().to_numpy().any():
+        raise ValueError("Thiếu dự báo cho một số dòng trong bảng chính sách")
+    return wide.to_numpy(dtype=np.float64)
+
+
+# Độ lệch chuẩn nhu cầu ngày suy ra từ khoảng dự báo 80% của Prophet (yhat_lower/yhat_upper)
+def std_from_interval(lower, upper, interval_width=0.8):
+    from scipy.special import ndtri
+
+    return (np.asarray(upper) - np.asarray(lower)) / (2 * ndtri(0.5 + interval_width / 2))
+
+
+def _column(policy, name, n):
+    if name in policy:
+        return policy[name].to_numpy(dtype=np.float64)
+    return np.full(n, POLICY_DEFAULTS[name], dtype=np.float64)
+
+
+# Tính toàn bộ chính sách cho một khối dòng bằng phép toán mảng.
+# demand: (n, H) nhu cầu dự báo theo ngày; demand_std: (n,) hoặc (n, H) độ lệch chuẩn theo ngày
+def compute_policy(demand, policy, demand_std=None, alert_days=ALERT_DAYS, eoq_period_days=EOQ_PERIOD_DAYS):
+    from scipy.special import ndtri
+
+    demand = np.clip(np.asarray(demand, dtype=np.float64), 0.0, None)
+    n, horizon = demand.shape
+    if len(policy) != n:
+        raise ValueError(f"Bảng chính sách có {len(policy)} dòng nhưng dự báo có {n} dòng")
+    if horizon < max(alert_days, eoq_period_days):
+        raise ValueError(f"Dự báo cần ít nhất {max(alert_days, eoq_period_days)} ngày, hiện có {horizon}")
+
+    on_hand = _column(policy, 'on_hand', n)
+    on_order = _column(policy, 'on_order', n)
+    lead_time = np.clip(_column(policy, 'lead_time_days', n), 0, horizon)
+    ordering_cost = _column(policy, 'ordering_cost', n)
+    holding_cost = _column(policy, 'holding_cost', n)
+    service_level = np.clip(_column(policy, 'service_level', n), 0.5, 0.9999)
+
+    # Tổng tích lũy cho phép lấy nhu cầu trong thời gian chờ (lẻ ngày thì nội suy) mà không cần vòng lặp
+    cumulative = np.concatenate([np.zeros((n, 1)), np.cumsum(demand, axis=1)], axis=1)
+    rows = np.arange(n)
+    whole_days = np.floor(lead_time).astype(np.intp)
+    fraction = lead_time - whole_days
+    next_day = np.minimum(whole_days + 1, horizon)
+    lead_time_demand = cumulative[rows, whole_days] + fraction * (cumulative[rows, next_day] - cumulative[rows, whole_days])
+
+    if demand_std is None:
+        daily_std = demand.std(axis=1)  # Không có khoảng dự báo: dùng biến động của chính chuỗi dự báo
+    else:
+        daily_std = np.asarray(demand_std, dtype=np.float64)
+        if daily_std.ndim == 2:
+            daily_std = np.sqrt(np.mean(daily_std ** 2, axis=1))
+    safety_stock = ndtri(service_level) * daily_std * np.sqrt(lead_time)
+    reorder_point = lead_time_demand + safety_stock
+
+    period_demand = cumulative[:, eoq_period_days]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        eoq = np.sqrt(2 * period_demand * ordering_cost / holding_cost)
+    eoq = np.where(holding_cost > 0, eoq, np.nan)
+
+    position = on_hand + on_order
+    reorder = position <= reorder_point
+    order_qty = np.where(reorder, np.ceil(np.maximum(np.nan_to_num(eoq), reorder_point - position)), 0.0)
+
+    alert_demand = cumulative[:, alert_days]
+    shortfall = np.maximum(alert_demand - on_hand, 0.0)
+    return {
+        'lead_time_demand': lead_time_demand,
+        'safety_stock': safety_stock,
+        'reorder_point': reorder_point,
+        'eoq': eoq,
+        'inventory_position': position,
+        'reorder': reorder,
+        'order_qty': order_qty,
+        f'demand_{alert_days}d': alert_demand,
+        f'shortfall_{alert_days}d': shortfall,
+        'alert': shortfall > 0,
+    }
+
+
+# Chạy chính sách theo từng khối dòng và trả về DataFrame kết quả cho mỗi khối (giới hạn bộ nhớ trung gian)
+def plan_inventory_chunks(demand, policy, demand_std=None, chunk_size=DEFAULT_CHUNK_SIZE, **kwargs):
+    demand = np.asarray(demand)
+    policy = policy.reset_index(drop=True)
+    key_cols = [column for column in policy.columns if column not in POLICY_DEFAULTS]
+    std = None if demand_std is None else np.asarray(demand_std)
+    for start in range(0, len(policy), chunk_size):
+        stop = min(start + chunk_size, len(policy))
+        result = compute_policy(demand[start:stop], policy.iloc[start:stop],
+                                None if std is None else std[start:stop], **kwargs)
+        frame = policy.iloc[start:stop][key_cols].reset_index(drop=True)
+        yield frame.assign(**result)
+
+
+def plan_inventory(demand, policy, demand_std=None, chunk_size=DEFAULT_CHUNK_SIZE, **kwargs):
+    chunks = list(plan_inventory_chunks(demand, policy, demand_std, chunk_size, **kwargs))
+    if not chunks:
+        return pd.DataFrame()
+    return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1,90 @@
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+# Các module nặng mà app.py chỉ nạp khi tab cần đến (kèm thư viện bên dưới để so sánh)
+HEAVY_MODULES = [
+    'routing',
+    'decomposition',
+    'routing_service',
+    'chain_client',
+    'chain_indexer',
+    'weather_provider',
+    'ortools.constraint_solver.pywrapcp',
+    'scipy.cluster.vq',
+    'folium',
+    'route_map',
+    'road_network',
+    'delivery_events',
+    'web3',
+    'plotly.express',
+    'plotly.graph_objects',
+    'prophet',
+]
+# Các module app.py nạp ngay khi khởi động (trước khi form đăng nhập hiển thị)
+STARTUP_MODULES = ['streamlit', 'pandas', 'numpy', 'distance_engine', 'route_cache', 'instrumentation']
+
+_timings = {}  # tên module -> số giây nạp lần đầu trong tiến trình
+_lock = threading.Lock()
+
+
+# Nạp module khi cần lần đầu và ghi lại thời gian; các lần sau lấy từ sys.modules
+def lazy_import(name):
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    with _lock:
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        _timings.setdefault(name, time.perf_counter() - start)
+    return module
+
+
+def import_timings():
+    with _lock:
+        return dict(_timings)
+
+
+# Đo thời gian nạp "lạnh" của từng module trong một tiến trình Python mới
+def measure_cold_import(names):
+    code = f"import time; t = time.perf_counter(); {'; '.join(f'import {name}' for name in names)}; " \
+           "print(time.perf_counter() - t)"
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def startup_report(modules=None):
+    modules = modules or HEAVY_MODULES
+    report = {'startup': measure_cold_import(STARTUP_MODULES), 'modules': {}}
+    for name in modules:
+        try:
+            report['modules'][name] = measure_cold_import([name])
+        except subprocess.CalledProcessError:
+            report['modules'][name] = None  # Module chưa được cài
+    return report
+
+
+# Báo cáo thời gian khởi động: python lazy_imports.py [--budget 2.0] [--json]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Đo thời gian nạp module của app.py")
+    parser.add_argument('--budget', type=float, default=None,
+                        help="Ngưỡng (giây) cho phần nạp lúc khởi động; vượt ngưỡng thì trả mã lỗi 1")
+    parser.add_argument('--json', action='store_true', help="In kết quả dạng JSON")
+    args = parser.parse_args()
+
+    report = startup_report()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"Khởi động ({', '.join(STARTUP_MODULES)}): {report['startup']:.2f}s")
+        for name, seconds in report['modules'].items():
+            print(f"  {name:<40} {'chưa cài' if seconds is None else f'{seconds:.2f}s'}")
+    if args.budget is not None and report['startup'] > args.budget:
+        print(f"Vượt ngưỡng khởi động {args.budget:.2f}s", file=sys.stderr)
+        sys.exit(1)
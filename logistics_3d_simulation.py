@@ -2,6 +2,10 @@ import plotly.graph_objects as go
 import networkx as nx
 import numpy as np
 import random
+from green_routing import GreenRouter
+from logistics_graph import LogisticsGraph
+from network_renderer import render_network, write_compact_html
+from telemetry import collect_simulated
 
 # Tạo đồ thị logistics
 G = nx.Graph()
@@ -37,83 +41,38 @@ coords = {
 
 # IoT: Nhiên liệu (L/100km) để xác định kích thước nút
 num_trucks = 50
-iot_fuel = np.random.normal(30, 5, num_trucks)
-iot_fuel_opt = iot_fuel * (1 - 0.15)  # Giảm 15% sau tối ưu
-node_sizes = {loc: np.mean(iot_fuel_opt) / 2 for loc in locations}
+telemetry_after = collect_simulated(num_trucks, fuel_factor=1 - 0.15)  # Giảm 15% sau tối ưu
+node_sizes = {loc: telemetry_after.mean('fuel') / 2 for loc in locations}
 
-# Hàm tính chi phí tuyến
-def path_cost(path):
-    total_distance = 0
-    total_emissions = 0
-    for i in range(len(path) - 1):
-        edge_data = G.get_edge_data(path[i], path[i+1])
-        total_distance += edge_data['distance']
-        total_emissions += edge_data['distance'] * edge_data['emissions_factor']
-    return total_distance, total_emissions
+# Đồ thị CSR gọn (đỉnh số nguyên, quãng đường/phát thải trong mảng NumPy) để tính chi phí tuyến theo lô
+graph = LogisticsGraph.from_edges(edges, locations)
 
 # Tuyến truyền thống và tối ưu
 traditional_path = ['Hanoi', 'Hai Phong', 'Da Nang', 'HCMC', 'Cai Mep Port']
-trad_distance, trad_emissions = path_cost(traditional_path)
 
-def emissions_heuristic(u, v):
-    return 0
-optimized_path = nx.astar_path(G, 'Hanoi', 'Cai Mep Port', heuristic=emissions_heuristic,
-                              weight=lambda u, v, d: d['distance'] * d['emissions_factor'])
-opt_distance, opt_emissions = path_cost(optimized_path)
-
-# Dữ liệu cho biểu đồ 3D
-x_nodes = [coords[loc][0] for loc in locations]
-y_nodes = [coords[loc][1] for loc in locations]
-z_nodes = [coords[loc][2] for loc in locations]
-node_text = [f"{loc}<br>Fuel: {node_sizes[loc]:.2f} L/100km" for loc in locations]
-
-# Cạnh truyền thống
-x_trad, y_trad, z_trad = [], [], []
-for i in range(len(traditional_path) - 1):
-    x_trad.extend([coords[traditional_path[i]][0], coords[traditional_path[i+1]][0], None])
-    y_trad.extend([coords[traditional_path[i]][1], coords[traditional_path[i+1]][1], None])
-    z_trad.extend([coords[traditional_path[i]][2], coords[traditional_path[i+1]][2], None])
-
-# Cạnh tối ưu
-x_opt, y_opt, z_opt = [], [], []
-for i in range(len(optimized_path) - 1):
-    x_opt.extend([coords[optimized_path[i]][0], coords[optimized_path[i+1]][0], None])
-    y_opt.extend([coords[optimized_path[i]][1], coords[optimized_path[i+1]][1], None])
-    z_opt.extend([coords[optimized_path[i]][2], coords[optimized_path[i+1]][2], None])
-
-# Reverse Logistics
-x_reverse = [coords['HCMC'][0], coords['Hanoi'][0]]
-y_reverse = [coords['HCMC'][1], coords['Hanoi'][1]]
-z_reverse = [coords['HCMC'][2], coords['Hanoi'][2]]
-
-# Vẽ biểu đồ 3D
-fig = go.Figure()
-
-# Vẽ nút
-fig.add_trace(go.Scatter3d(
-    x=x_nodes, y=y_nodes, z=z_nodes, mode='markers+text',
-    marker=dict(size=[node_sizes[loc] for loc in locations], color='lightblue', opacity=0.8),
-    text=node_text, textposition='top center', name='Locations'
-))
-
-# Vẽ cạnh truyền thống
-fig.add_trace(go.Scatter3d(
-    x=x_trad, y=y_trad, z=z_trad, mode='lines',
-    line=dict(color='red', width=3), name='Traditional Route'
-))
-
-# Vẽ cạnh tối ưu
-fig.add_trace(go.Scatter3d(
-    x=x_opt, y=y_opt, z=z_opt, mode='lines',
-    line=dict(color='green', width=3), name='Optimized Route'
-))
-
-# Vẽ reverse logistics
-fig.add_trace(go.Scatter3d(
-    x=x_reverse, y=y_reverse, z=z_reverse, mode='lines+markers',
-    line=dict(color='purple', width=2, dash='dash'),
-    marker=dict(size=5, symbol='circle'), name='Reverse Logistics'
-))
+router = GreenRouter(graph)
+optimized_path, _, _ = router.shortest_path('Hanoi', 'Cai Mep Port', objective='emissions')
+(trad_distance, opt_distance), (trad_emissions, opt_emissions) = graph.path_costs([traditional_path, optimized_path])
+
+# Dữ liệu cho biểu đồ 3D: tọa độ theo thứ tự đỉnh của đồ thị CSR, mọi đoạn thẳng dựng bằng NumPy
+node_coords = np.array([coords[loc] for loc in graph.nodes], dtype=np.float64)
+node_text = [f"{loc}<br>Fuel: {node_sizes[loc]:.2f} L/100km" for loc in graph.nodes]
+sources, targets, distances, edge_emissions = graph.edge_arrays()
+
+def path_ids(path):
+    return [graph.index[loc] for loc in path]
+
+# Vẽ mạng lưới, tuyến truyền thống, tuyến tối ưu và reverse logistics
+fig = render_network(
+    node_coords, sources, targets, names=graph.nodes, node_text=node_text,
+    node_sizes=[node_sizes[loc] for loc in graph.nodes], importance=edge_emissions,
+    routes=[
+        {'path': path_ids(traditional_path), 'name': 'Traditional Route', 'color': 'red'},
+        {'path': path_ids(optimized_path), 'name': 'Optimized Route', 'color': 'green'},
+        {'path': path_ids(['HCMC', 'Hanoi']), 'name': 'Reverse Logistics', 'color': 'purple', 'width': 2,
+         'dash': 'dash', 'mode': 'lines+markers', 'marker': dict(size=5, symbol='circle')},
+    ],
+)
 
 # Thêm chú thích văn bản trong không gian 3D
 fig.add_trace(go.Scatter3d(
@@ -143,5 +102,5 @@ print(f"Savings: Distance {(trad_distance - opt_distance) / trad_distance * 100:
       f"Emissions {(trad_emissions - opt_emissions) / trad_emissions * 100:.2f}%")
 
 # Lưu biểu đồ dưới dạng HTML
-fig.write_html("logistics_3d_simulation.html")
+write_compact_html(fig, "logistics_3d_simulation.html")
 fig.show()
\ No newline at end of file
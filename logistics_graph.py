@@ -0,0 +1,145 @@
+import json
+import os
+
+import numpy as np
+
+ARRAY_NAMES = ('indptr', 'indices', 'distance', 'emissions')
+
+
+# Đồ thị logistics gọn: đỉnh đánh số nguyên, danh sách kề CSR, quãng đường và phát thải trong mảng NumPy.
+# Trong mỗi dòng, cạnh được sắp theo (đỉnh đích, quãng đường) nên tra cạnh (u, v) là tìm kiếm nhị phân
+# trong dòng u (vector hóa cho mọi cặp cùng lúc); cạnh song song thì lấy cạnh ngắn nhất
+class LogisticsGraph:
+    def __init__(self, nodes, indptr, indices, distance, emissions, directed=False):
+        self.nodes = list(nodes)
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        self.indptr = indptr
+        self.indices = indices
+        self.distance = distance
+        self.emissions = emissions
+        self.directed = directed
+        self._max_degree = int(np.diff(indptr).max()) if len(indptr) > 1 else 0
+
+    @property
+    def num_nodes(self):
+        return len(self.nodes)
+
+    @property
+    def num_edges(self):
+        return len(self.indices)
+
+    @classmethod
+    def from_arrays(cls, nodes, sources, targets, distance, emissions_factor=None, directed=False):
+        n = len(nodes)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        distance = np.asarray(distance, dtype=np.float64)
+        factor = np.zeros_like(distance) if emissions_factor is None else np.asarray(emissions_factor, np.float64)
+        emissions = distance * factor
+        if not directed:
+            sources, targets = np.concatenate([sources, targets]), np.concatenate([targets, sources])
+            distance = np.concatenate([distance, distance])
+            emissions = np.concatenate([emissions, emissions])
+        order = np.lexsort((distance, targets, sources))
+        indptr = np.searchsorted(sources[order], np.arange(n + 1)).astype(np.int64)
+        index_dtype = np.int32 if n < 2**31 else np.int64
+        return cls(nodes, indptr, targets[order].astype(index_dtype), distance[order], emissions[order], directed)
+
+    # Dựng từ danh sách cạnh dạng [(u, v, {'distance': ..., 'emissions_factor': ...}), ...] như trong simulation.py
+    @classmethod
+    def from_edges(cls, edges, nodes=None, directed=False, distance_attr='distance', factor_attr='emissions_factor'):
+        if nodes is None:
+            nodes = list(dict.fromkeys(node for u, v, _ in edges for node in (u, v)))
+        index = {node: i for i, node in enumerate(nodes)}
+        sources = [index[u] for u, _, _ in edges]
+        targets = [index[v] for _, v, _ in edges]
+        distance = [data[distance_attr] for _, _, data in edges]
+        factor = [data.get(factor_attr, 0.0) for _, _, data in edges]
+        return cls.from_arrays(nodes, sources, targets, distance, factor, directed)
+
+    @classmethod
+    def from_networkx(cls, G, distance_attr='distance', factor_attr='emissions_factor'):
+        return cls.from_edges(list(G.edges(data=True)), list(G.nodes()), G.is_directed(), distance_attr, factor_attr)
+
+    # Danh sách cạnh (nguồn, đích, quãng đường, phát thải); đồ thị vô hướng chỉ trả mỗi cạnh một lần
+    def edge_arrays(self):
+        sources = np.repeat(np.arange(self.num_nodes, dtype=np.int64), np.diff(self.indptr))
+        targets = np.asarray(self.indices, dtype=np.int64)
+        mask = slice(None) if self.directed else sources <= targets
+        return sources[mask], targets[mask], np.asarray(self.distance)[mask], np.asarray(self.emissions)[mask]
+
+    # Mã hóa danh sách đường đi (theo tên đỉnh) thành (mảng chỉ số đỉnh phẳng, offsets) kiểu CSR
+    def encode_paths(self, paths):
+        lengths = np.fromiter((len(path) for path in paths), dtype=np.int64, count=len(paths))
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        index = self.index
+        flat = np.fromiter((index[node] for path in paths for node in path), dtype=np.int64, count=int(offsets[-1]))
+        return flat, offsets
+
+    # Chỉ số cạnh cho các cặp (u, v) số nguyên; -1 nếu không có cạnh.
+    # Tìm kiếm nhị phân đồng thời trên mọi cặp: số vòng lặp = log2(bậc lớn nhất), không cần bảng khóa phụ
+    def edge_ids(self, u, v):
+        u = np.asarray(u, dtype=np.int64)
+        v = np.asarray(v, dtype=np.int64)
+        if not self.num_edges:
+            return np.full(len(u), -1, dtype=np.int64)
+        lo = np.asarray(self.indptr[u], dtype=np.int64)
+        hi = np.asarray(self.indptr[u + 1], dtype=np.int64)
+        row_end = hi
+        last = self.num_edges - 1
+        for _ in range(self._max_degree.bit_length()):
+            mid = np.minimum((lo + hi) // 2, last)
+            less = (lo < hi) & (self.indices[mid] < v)
+            lo = np.where(less, mid + 1, lo)
+            hi = np.where(less, hi, mid)
+        found = (lo < row_end) & (self.indices[np.minimum(lo, last)] == v)
+        return np.where(found, lo, -1)
+
+    # Tính tổng quãng đường và phát thải cho nhiều đường đi cùng lúc. paths là danh sách đường đi (tên đỉnh)
+    # hoặc (flat, offsets) chỉ số đỉnh đã mã hóa. Đường đi có cạnh không tồn tại: raise (mặc định) hoặc trả NaN
+    def path_costs(self, paths, missing='raise'):
+        flat, offsets = paths if isinstance(paths, tuple) else self.encode_paths(paths)
+        flat = np.asarray(flat, dtype=np.int64)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        num_paths = len(offsets) - 1
+        # Cặp (flat[i], flat[i+1]) là một cạnh trừ khi i là đỉnh cuối của một đường đi
+        is_hop = np.ones(max(len(flat) - 1, 0), dtype=bool)
+        ends = offsets[1:-1] - 1
+        is_hop[ends[(ends >= 0) & (ends < len(is_hop))]] = False
+        hop_positions = np.flatnonzero(is_hop)
+        path_of_hop = np.repeat(np.arange(num_paths), np.maximum(np.diff(offsets) - 1, 0))
+
+        edges = self.edge_ids(flat[hop_positions], flat[hop_positions + 1])
+        invalid = edges < 0
+        if invalid.any() and missing == 'raise':
+            hop = hop_positions[np.argmax(invalid)]
+            u, v = self.nodes[flat[hop]], self.nodes[flat[hop + 1]]
+            raise ValueError(f"Không có cạnh {u} -> {v} (đường đi thứ {path_of_hop[np.argmax(invalid)]})")
+        safe = np.where(invalid, 0, edges)
+        distance = np.bincount(path_of_hop, weights=np.where(invalid, 0.0, self.distance[safe]), minlength=num_paths)
+        emissions = np.bincount(path_of_hop, weights=np.where(invalid, 0.0, self.emissions[safe]), minlength=num_paths)
+        if invalid.any():
+            bad = np.unique(path_of_hop[invalid])
+            distance[bad] = np.nan
+            emissions[bad] = np.nan
+        return distance, emissions
+
+    def path_cost(self, path):
+        distance, emissions = self.path_costs([path])
+        return float(distance[0]), float(emissions[0])
+
+    # Lưu thành thư mục các file .npy (nạp lại bằng memory-map, không cần đọc hết vào RAM)
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(path, f"{name}.npy"), np.asarray(getattr(self, name)))
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'nodes': self.nodes, 'directed': self.directed}, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        nodes = [tuple(node) if isinstance(node, list) else node for node in meta['nodes']]
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in ARRAY_NAMES}
+        return cls(nodes, directed=meta['directed'], **arrays)
@@ -0,0 +1,140 @@
+import numpy as np
+
+DEFAULT_DTYPE = np.float32  # plotly >= 6 mã hóa mảng NumPy thành base64 nhị phân trong HTML/JSON
+DEFAULT_MAX_LABELS = 50
+DEFAULT_MAX_HOVER = 5000
+
+
+# Dựng mảng đoạn thẳng cho mọi cạnh trong một lần: mỗi cạnh là [đầu, cuối, NaN] (NaN ngắt nét như None)
+def edge_segments(coords, sources, targets, dtype=DEFAULT_DTYPE):
+    coords = np.asarray(coords, dtype=dtype)
+    sources = np.asarray(sources, dtype=np.intp)
+    targets = np.asarray(targets, dtype=np.intp)
+    segments = np.full((len(sources), 3, coords.shape[1]), np.nan, dtype=dtype)
+    segments[:, 0] = coords[sources]
+    segments[:, 1] = coords[targets]
+    flat = segments.reshape(-1, coords.shape[1])
+    return tuple(flat[:, axis] for axis in range(coords.shape[1]))
+
+
+# Đoạn thẳng cho một tuyến (danh sách chỉ số đỉnh liên tiếp)
+def path_segments(coords, path, dtype=DEFAULT_DTYPE):
+    path = np.asarray(path, dtype=np.intp)
+    return edge_segments(coords, path[:-1], path[1:], dtype)
+
+
+# Gom các đỉnh ở xa thành ô lưới (level-of-detail). keep: mặt nạ các đỉnh giữ nguyên (gần tâm nhìn, nằm trên
+# tuyến...). Trả về (tọa độ đỉnh mới, nhãn đỉnh cũ -> đỉnh mới, trọng số đỉnh mới, số đỉnh gốc trong mỗi đỉnh mới)
+def aggregate_nodes(coords, cell_size, weights=None, keep=None):
+    coords = np.asarray(coords, dtype=np.float64)
+    n = len(coords)
+    weights = np.ones(n) if weights is None else np.asarray(weights, dtype=np.float64)
+    keep = np.zeros(n, dtype=bool) if keep is None else np.asarray(keep, dtype=bool)
+    cell_size = np.broadcast_to(np.asarray(cell_size, dtype=np.float64), (coords.shape[1],))
+
+    cells = np.floor(coords / np.where(cell_size > 0, cell_size, np.inf)).astype(np.int64)
+    # Đỉnh được giữ có khóa riêng (chỉ số âm) để không bị gộp với ai
+    keys = np.column_stack([np.where(keep, -1 - np.arange(n), 0), np.where(keep[:, None], 0, cells)])
+    _, labels = np.unique(keys, axis=0, return_inverse=True)
+    labels = labels.ravel()
+    num_groups = labels.max() + 1 if n else 0
+
+    counts = np.bincount(labels, minlength=num_groups)
+    group_weights = np.bincount(labels, weights=weights, minlength=num_groups)
+    # Tâm theo trọng số (đỉnh trọng số 0 vẫn được tính như trọng số 1 nếu cả ô đều bằng 0)
+    safe = np.where(group_weights[labels] > 0, weights, 1.0)
+    denominator = np.bincount(labels, weights=safe, minlength=num_groups)
+    centroids = np.column_stack([
+        np.bincount(labels, weights=coords[:, axis] * safe, minlength=num_groups) / denominator
+        for axis in range(coords.shape[1])
+    ])
+    return centroids, labels, group_weights, counts
+
+
+# Ánh xạ cạnh sang đỉnh đã gộp: bỏ cạnh nội bộ trong một ô, gộp cạnh trùng (cộng dồn độ quan trọng)
+def aggregate_edges(labels, sources, targets, importance=None, directed=False):
+    u = np.asarray(labels)[np.asarray(sources, dtype=np.intp)]
+    v = np.asarray(labels)[np.asarray(targets, dtype=np.intp)]
+    importance = np.ones(len(u)) if importance is None else np.asarray(importance, dtype=np.float64)
+    if not directed:
+        u, v = np.minimum(u, v), np.maximum(u, v)
+    external = u != v
+    pairs, inverse = np.unique(np.column_stack([u[external], v[external]]), axis=0, return_inverse=True)
+    merged = np.bincount(inverse.ravel(), weights=importance[external], minlength=len(pairs))
+    return pairs[:, 0], pairs[:, 1], merged
+
+
+# Giữ tối đa max_edges cạnh quan trọng nhất (tỷ lệ theo mức zoom: zoom 1 = max_edges, zoom 2 = gấp đôi...)
+def decimate_edges(sources, targets, importance, max_edges=None, zoom=1.0):
+    sources = np.asarray(sources)
+    targets = np.asarray(targets)
+    if max_edges is None:
+        return sources, targets, np.asarray(importance)
+    limit = int(max_edges * max(zoom, 0.0))
+    if len(sources) <= limit:
+        return sources, targets, np.asarray(importance)
+    top = np.argpartition(-np.asarray(importance), limit - 1)[:limit] if limit else np.array([], dtype=np.intp)
+    top = np.sort(top)
+    return sources[top], targets[top], np.asarray(importance)[top]
+
+
+# Dựng figure 3D cho mạng lưới: đỉnh, cạnh nền (có LOD) và các tuyến nổi bật.
+# routes: danh sách dict {'path': [chỉ số đỉnh], 'name', 'color', 'width', 'dash', 'mode', 'marker'} vẽ trên tọa độ gốc
+def render_network(coords, sources=None, targets=None, names=None, node_sizes=None, node_text=None, importance=None,
+                   routes=(), cell_size=None, keep=None, max_edges=None, zoom=1.0, max_labels=DEFAULT_MAX_LABELS,
+                   max_hover=DEFAULT_MAX_HOVER, node_color='lightblue', edge_color='lightgray', dtype=DEFAULT_DTYPE):
+    import plotly.graph_objects as go
+
+    coords = np.asarray(coords, dtype=np.float64)
+    n = len(coords)
+    sizes = np.full(n, 6.0) if node_sizes is None else np.asarray(node_sizes, dtype=np.float64)
+    names = list(names) if names is not None else [str(i) for i in range(n)]
+    texts = list(node_text) if node_text is not None else names
+    sources = np.array([], dtype=np.intp) if sources is None else np.asarray(sources, dtype=np.intp)
+    targets = np.array([], dtype=np.intp) if targets is None else np.asarray(targets, dtype=np.intp)
+    importance = np.ones(len(sources)) if importance is None else np.asarray(importance, dtype=np.float64)
+
+    if cell_size is not None:
+        node_coords, labels, weights, counts = aggregate_nodes(coords, cell_size, sizes, keep)
+        sources, targets, importance = aggregate_edges(labels, sources, targets, importance)
+        # Đỉnh gộp: kích thước theo tổng trọng số (căn bậc hai để không lấn át), nhãn là số đỉnh gốc
+        node_sizes_out = np.where(counts > 1, np.sqrt(weights), weights)
+        first = np.full(len(counts), -1)
+        first[labels[::-1]] = np.arange(n)[::-1]
+        node_texts = [texts[first[g]] if counts[g] == 1 else f"{counts[g]} điểm" for g in range(len(counts))]
+    else:
+        node_coords, node_sizes_out, node_texts = coords, sizes, texts
+    sources, targets, importance = decimate_edges(sources, targets, importance, max_edges, zoom)
+
+    fig = go.Figure()
+    x, y, z = (node_coords[:, axis].astype(dtype) for axis in range(3))
+    marker = dict(size=node_sizes_out.astype(dtype), color=node_color, opacity=0.8)
+    # Chỉ gắn nhãn chữ cho max_labels đỉnh lớn nhất; hover cho mọi đỉnh khi số đỉnh không quá max_hover
+    labelled = np.argsort(-node_sizes_out, kind='stable')[:max_labels]
+    hover = dict(hovertext=node_texts, hoverinfo='text') if len(node_coords) <= max_hover else dict(hoverinfo='skip')
+    if len(labelled) == len(node_coords):
+        fig.add_trace(go.Scatter3d(x=x, y=y, z=z, mode='markers+text', marker=marker, text=node_texts,
+                                   textposition='top center', name='Locations', **hover))
+    else:
+        fig.add_trace(go.Scatter3d(x=x, y=y, z=z, mode='markers', marker=marker, name='Locations', **hover))
+        fig.add_trace(go.Scatter3d(x=x[labelled], y=y[labelled], z=z[labelled], mode='text',
+                                   text=[node_texts[i] for i in labelled], textposition='top center',
+                                   hoverinfo='skip', showlegend=False, name='Labels'))
+    if len(sources):
+        x, y, z = edge_segments(node_coords, sources, targets, dtype)
+        fig.add_trace(go.Scatter3d(x=x, y=y, z=z, mode='lines', line=dict(color=edge_color, width=1),
+                                   hoverinfo='skip', name='Network'))
+    for route in routes:
+        x, y, z = path_segments(coords, route['path'], dtype)
+        fig.add_trace(go.Scatter3d(
+            x=x, y=y, z=z, mode=route.get('mode', 'lines'),
+            line=dict(color=route.get('color', 'green'), width=route.get('width', 3), dash=route.get('dash')),
+            marker=route.get('marker'), name=route.get('name')
+        ))
+    return fig
+
+
+# Ghi HTML gọn: mảng dữ liệu đã ở dạng nhị phân base64, plotly.js nạp từ CDN thay vì nhúng ~4MB vào file
+def write_compact_html(fig, path, include_plotlyjs='cdn'):
+    fig.write_html(path, include_plotlyjs=include_plotlyjs, full_html=True)
+    return path
@@ -1,32 +1,31 @@
 import pandas as pd
-from prophet import Prophet
 import matplotlib.pyplot as plt
-import math
+from forecasting import ForecastService
 
-df = pd.read_csv('train.csv')  # Thay đường dẫn nếu cần
-df['date'] = pd.to_datetime(df['date'])
-df = df.groupby('date')['sales'].sum().reset_index()
-df = df.rename(columns={'date': 'ds', 'sales': 'y'})
-
-model = Prophet(daily_seasonality=True, yearly_seasonality=True)
-model.fit(df)
+# Cột mục tiêu cấu hình được; train.csv (từ simulation_data.py) có delivery_time, không có sales
+TARGET_COL = 'delivery_time'
+TARGET_AGG = 'mean'  # Thời gian giao lấy trung bình theo ngày; đổi thành 'sum' khi TARGET_COL là số lượng (sales, số đơn)
+SEGMENT_COLS = []  # Ví dụ ['weather'] để huấn luyện một mô hình cho mỗi chế độ thời tiết
 
-future = model.make_future_dataframe(periods=30)
-forecast = model.predict(future)
+df = pd.read_csv('train.csv')  # Thay đường dẫn nếu cần
 
-fig = model.plot(forecast)
-plt.title('Dự báo nhu cầu đơn hàng')
-plt.show()
+# Mô hình được lưu trong models/ và chỉ huấn luyện lại khi dữ liệu thay đổi
+service = ForecastService(model_dir='models', target_col=TARGET_COL, segment_cols=SEGMENT_COLS, agg=TARGET_AGG)
+service.fit(df)
+forecasts = service.predict(horizons=[7, 30])
 
-current_inventory = 1000
-forecast_next_7_days = forecast['yhat'].tail(7).sum()
-if forecast_next_7_days > current_inventory:
-    print(f"Cảnh báo: Tồn kho thấp! Dự báo sales 7 ngày: {forecast_next_7_days:.2f}. Cần tái đặt hàng.")
-else:
-    print("Tồn kho ổn định.")
+if not SEGMENT_COLS:
+    model, forecast = service.forecast_with_history(periods=30)
+    fig = model.plot(forecast)
+    plt.title('Dự báo nhu cầu đơn hàng')
+    plt.show()
 
-holding_cost = 0.5
-ordering_cost = 100
-demand = forecast['yhat'].tail(30).sum()
-optimal_qty = math.sqrt(2 * demand * ordering_cost / holding_cost)
-print(f"Số lượng đặt hàng tối ưu (EOQ): {optimal_qty:.2f}")
\ No newline at end of file
+# Tóm tắt dự báo theo horizon. Không áp chính sách tồn kho (EOQ, điểm tái đặt hàng) ở đây: thời gian giao
+# (phút) không phải số lượng; dùng inventory_policy với dự báo nhu cầu (agg='sum' trên cột số lượng/số đơn)
+keys = SEGMENT_COLS or ['segment']
+for horizon, forecast in forecasts.items():
+    summary = forecast.groupby(keys)[['yhat', 'yhat_lower', 'yhat_upper']].mean()
+    for key, row in summary.iterrows():
+        label = ', '.join(str(part) for part in (key if isinstance(key, tuple) else (key,)))
+        print(f"[{label}] {TARGET_COL} trung bình {horizon} ngày tới: {row.yhat:.2f} "
+              f"(khoảng {row.yhat_lower:.2f} - {row.yhat_upper:.2f})")
@@ -0,0 +1,104 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+REQUIRED_COLUMNS = ['id', 'address', 'lat', 'lon']
+DEPOT = {'name': 'Depot', 'lat': 10.776, 'lon': 106.700}
+DEFAULT_CHUNK_SIZE = 50_000
+DUPLICATE_ERROR = 'Trùng ID đơn hàng'
+
+
+# Đọc file đơn hàng theo từng khối để giới hạn bộ nhớ; hỗ trợ CSV và Parquet (pyarrow)
+def read_order_chunks(source, filename=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    name = (filename or getattr(source, 'name', None) or str(source)).lower()
+    if name.endswith('.parquet') or name.endswith('.pq'):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(source)
+        missing = [column for column in REQUIRED_COLUMNS if column not in parquet_file.schema_arrow.names]
+        if missing:
+            raise ValueError(f"File thiếu cột bắt buộc: {', '.join(missing)}")
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=REQUIRED_COLUMNS):
+            yield batch.to_pandas()
+    elif name.endswith('.csv') or name.endswith('.txt'):
+        reader = pd.read_csv(source, chunksize=chunk_size, dtype={'id': str, 'address': str},
+                             usecols=lambda column: column in REQUIRED_COLUMNS)
+        for chunk in reader:
+            missing = [column for column in REQUIRED_COLUMNS if column not in chunk.columns]
+            if missing:
+                raise ValueError(f"File thiếu cột bắt buộc: {', '.join(missing)}")
+            yield chunk
+    else:
+        raise ValueError(f"Định dạng file không hỗ trợ: {os.path.basename(name)} (chỉ nhận .csv hoặc .parquet)")
+
+
+# Kiểm tra một khối bằng phép toán trên cột; trả về (đơn hợp lệ, bảng lỗi)
+# seen_ids là pd.Index mọi ID (hợp lệ hay không) đã gặp ở các khối trước; trùng lặp trong khối và xuyên khối cùng
+# một quy tắc: lần xuất hiện đầu tiên giữ lại, các lần sau là trùng
+def validate_orders(chunk, seen_ids=None, row_offset=0):
+    ids = chunk['id'].astype('string').str.strip()
+    addresses = chunk['address'].astype('string').str.strip()
+    lat = pd.to_numeric(chunk['lat'], errors='coerce')
+    lon = pd.to_numeric(chunk['lon'], errors='coerce')
+
+    checks = {
+        'Thiếu ID đơn hàng': ids.isna() | (ids == ''),
+        'Thiếu địa chỉ': addresses.isna() | (addresses == ''),
+        'Vĩ độ không hợp lệ': lat.isna() | (lat < -90) | (lat > 90),
+        'Kinh độ không hợp lệ': lon.isna() | (lon < -180) | (lon > 180),
+    }
+    duplicated = ids.duplicated(keep='first')
+    if seen_ids is not None and len(seen_ids):
+        duplicated |= ids.isin(seen_ids)
+    checks[DUPLICATE_ERROR] = duplicated & ~checks['Thiếu ID đơn hàng']
+
+    reasons = np.array(list(checks))
+    failed = np.column_stack([mask.fillna(True).to_numpy(dtype=bool) for mask in checks.values()])
+    invalid = failed.any(axis=1)
+
+    valid = pd.DataFrame({
+        'id': ids[~invalid].astype(str),
+        'address': addresses[~invalid].astype(str),
+        'lat': lat[~invalid].astype(np.float64),
+        'lon': lon[~invalid].astype(np.float64),
+    })
+    errors = pd.DataFrame({
+        'row': np.flatnonzero(invalid) + row_offset + 1,
+        'id': ids[invalid].astype(object),
+        'error': ['; '.join(reasons[row]) for row in failed[invalid]],
+    })
+    return valid.reset_index(drop=True), errors.reset_index(drop=True)
+
+
+# Nạp toàn bộ file: đọc theo khối, kiểm tra, và dựng sẵn orders_data / df_locations cho solver
+def load_orders(source, filename=None, chunk_size=DEFAULT_CHUNK_SIZE, depot=DEPOT, max_errors=10_000):
+    valid_parts = []
+    error_parts = []
+    error_count = 0
+    seen_ids = pd.Index([], dtype=object)
+    row_offset = 0
+    for chunk in read_order_chunks(source, filename, chunk_size):
+        valid, errors = validate_orders(chunk, seen_ids, row_offset)
+        row_offset += len(chunk)
+        # ID mới của khối: mọi dòng không bị đánh dấu trùng (hợp lệ hay lỗi vì lý do khác) là lần gặp đầu tiên
+        duplicate = errors['error'].astype(str).str.contains(DUPLICATE_ERROR, regex=False)
+        first_seen = errors['id'][errors['id'].notna() & ~duplicate]
+        seen_ids = seen_ids.append(pd.Index(np.concatenate([valid['id'].to_numpy(dtype=object),
+                                                            first_seen.to_numpy(dtype=object)])))
+        valid_parts.append(valid)
+        error_count += len(errors)
+        # Chỉ giữ tối đa max_errors dòng lỗi để bộ nhớ không tăng theo kích thước file
+        kept = sum(len(part) for part in error_parts)
+        if kept < max_errors:
+            error_parts.append(errors.head(max_errors - kept))
+
+    orders = pd.concat(valid_parts, ignore_index=True) if valid_parts else pd.DataFrame(columns=REQUIRED_COLUMNS)
+    errors = pd.concat(error_parts, ignore_index=True) if error_parts else pd.DataFrame(columns=['row', 'id', 'error'])
+    df_locations = pd.DataFrame({
+        'name': np.concatenate([[depot['name']], orders['id'].to_numpy(dtype=object)]),
+        'lat': np.concatenate([[depot['lat']], orders['lat'].to_numpy()]),
+        'lon': np.concatenate([[depot['lon']], orders['lon'].to_numpy()]),
+    })
+    orders_data = orders.to_dict('records')
+    return orders_data, df_locations, errors, error_count
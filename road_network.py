@@ -0,0 +1,315 @@
+import bz2
+import gzip
+import hashlib
+import json
+import os
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+ARRAY_NAMES = ('node_ids', 'lat', 'lon', 'indptr', 'indices', 'distance', 'time')
+# Tốc độ mặc định (km/h) theo loại đường khi way không có maxspeed; loại không có ở đây không cho ô tô/xe máy đi
+HIGHWAY_SPEEDS = {
+    'motorway': 80, 'trunk': 60, 'primary': 40, 'secondary': 35, 'tertiary': 30, 'unclassified': 25,
+    'residential': 20, 'living_street': 10, 'service': 15, 'road': 20,
+    'motorway_link': 50, 'trunk_link': 40, 'primary_link': 30, 'secondary_link': 30, 'tertiary_link': 25,
+}
+ACCESS_SPEED_KMH = 15.0  # Tốc độ đoạn nối từ vị trí đơn hàng đến nút đường gần nhất
+DEFAULT_BLOCK_ELEMENTS = 4_000_000  # Số phần tử tối đa của khối kết quả Dijkstra trung gian (~32 MB)
+DEFAULT_CACHE_DIR = 'road_cache'
+
+
+def _open_extract(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def _way_speed(tags):
+    maxspeed = tags.get('maxspeed', '')
+    digits = ''.join(ch for ch in maxspeed.split(';')[0] if ch.isdigit() or ch == '.')
+    if digits:
+        speed = float(digits) * (1.609 if 'mph' in maxspeed else 1.0)
+        if speed > 0:
+            return speed
+    return HIGHWAY_SPEEDS[tags['highway']]
+
+
+# 1 = một chiều xuôi, -1 = một chiều ngược, 0 = hai chiều
+def _way_direction(tags):
+    oneway = tags.get('oneway', '')
+    if oneway in ('yes', 'true', '1'):
+        return 1
+    if oneway == '-1':
+        return -1
+    if oneway == 'no':
+        return 0
+    if tags.get('junction') in ('roundabout', 'circular') or tags['highway'] in ('motorway', 'motorway_link'):
+        return 1
+    return 0
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(value) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+# Đọc nút và các way có highway từ file OSM XML (.osm, .osm.gz, .osm.bz2) theo luồng, không dựng cây XML
+def parse_osm(path):
+    node_ids, lats, lons = [], [], []
+    way_refs, way_speeds, way_directions = [], [], []
+    refs, tags = [], {}
+    for _, elem in ET.iterparse(_open_extract(path), events=('end',)):
+        tag = elem.tag
+        if tag == 'node':
+            node_ids.append(int(elem.get('id')))
+            lats.append(float(elem.get('lat')))
+            lons.append(float(elem.get('lon')))
+            # Tag của nút (vd. access=private trên cổng chắn) không được lẫn sang way kế tiếp
+            refs, tags = [], {}
+            elem.clear()
+        elif tag == 'nd':
+            refs.append(int(elem.get('ref')))
+        elif tag == 'tag':
+            tags[elem.get('k')] = elem.get('v')
+        elif tag == 'way':
+            if tags.get('highway') in HIGHWAY_SPEEDS and len(refs) >= 2 and tags.get('access') not in ('no', 'private'):
+                way_refs.append(np.array(refs, dtype=np.int64))
+                way_speeds.append(_way_speed(tags))
+                way_directions.append(_way_direction(tags))
+            refs, tags = [], {}
+            elem.clear()
+        elif tag == 'relation':
+            refs, tags = [], {}
+            elem.clear()
+    return (np.array(node_ids, dtype=np.int64), np.array(lats), np.array(lons),
+            way_refs, np.array(way_speeds, dtype=np.float64), np.array(way_directions, dtype=np.int8))
+
+
+# Mạng đường gọn dựng từ bản trích OSM: chỉ giữ nút giao và đầu mút (các nút tạo hình trên một way được gộp
+# vào cạnh), danh sách kề CSR với quãng đường (km) và thời gian (phút). Điểm đơn hàng được gắn vào nút gần nhất
+# qua cKDTree; bảng khoảng cách/thời gian nhiều-nhiều tính bằng Dijkstra đa nguồn theo khối của scipy.csgraph
+class RoadNetwork:
+    def __init__(self, node_ids, lat, lon, indptr, indices, distance, time, fingerprint='', cache_dir=DEFAULT_CACHE_DIR):
+        self.node_ids = node_ids
+        self.lat = lat
+        self.lon = lon
+        self.indptr = indptr
+        self.indices = indices
+        self.distance = distance
+        self.time = time
+        self.fingerprint = fingerprint
+        self.cache_dir = cache_dir
+        self._graphs = {}
+        self._tree = None
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self):
+        return len(self.indices)
+
+    @classmethod
+    def from_osm(cls, path, cache_dir=DEFAULT_CACHE_DIR):
+        node_ids, lats, lons, way_refs, way_speeds, way_directions = parse_osm(path)
+        order = np.argsort(node_ids)
+        node_ids, lats, lons = node_ids[order], lats[order], lons[order]
+        if not way_refs:
+            raise ValueError(f"Không có đường cho xe trong {path}")
+
+        # Ghép mọi way thành một mảng; bỏ tham chiếu đến nút không có trong file (way bị cắt ở biên bản trích)
+        refs = np.concatenate(way_refs)
+        way_of = np.repeat(np.arange(len(way_refs)), [len(way) for way in way_refs])
+        position = np.clip(np.searchsorted(node_ids, refs), 0, len(node_ids) - 1)
+        present = node_ids[position] == refs
+        refs, way_of, position = refs[present], way_of[present], position[present]
+
+        # Nút giữ lại: xuất hiện nhiều hơn một lần trong các way (nút giao) hoặc là đầu/cuối của way
+        first = np.r_[True, way_of[1:] != way_of[:-1]]
+        last = np.r_[way_of[1:] != way_of[:-1], True]
+        counts = np.bincount(position, minlength=len(node_ids))
+        keep = (counts[position] > 1) | first | last
+
+        # Quãng đường tích lũy dọc way; cạnh nối hai nút giữ lại liên tiếp trong cùng một way
+        segment = np.where(first, 0.0, _haversine(np.roll(lats[position], 1), np.roll(lons[position], 1),
+                                                   lats[position], lons[position]))
+        cumulative = np.cumsum(segment)
+        kept = np.flatnonzero(keep)
+        same_way = way_of[kept[1:]] == way_of[kept[:-1]]
+        start, end = kept[:-1][same_way], kept[1:][same_way]
+        length = cumulative[end] - cumulative[start]
+        edge_way = way_of[start]
+        minutes = length / way_speeds[edge_way] * 60
+
+        used = np.unique(np.r_[position[start], position[end]])
+        remap = np.full(len(node_ids), -1, dtype=np.int64)
+        remap[used] = np.arange(len(used))
+        u, v = remap[position[start]], remap[position[end]]
+        direction = way_directions[edge_way]
+        forward, backward = direction >= 0, direction <= 0
+        sources = np.r_[u[forward], v[backward]]
+        targets = np.r_[v[forward], u[backward]]
+        distance = np.r_[length[forward], length[backward]]
+        time = np.r_[minutes[forward], minutes[backward]]
+
+        with open(path, 'rb') as f:
+            fingerprint = hashlib.sha256(f.read(1 << 20)).hexdigest()[:16] + f"-{os.path.getsize(path)}"
+        return cls.from_arrays(node_ids[used], lats[used], lons[used], sources, targets, distance, time,
+                               fingerprint=fingerprint, cache_dir=cache_dir)
+
+    # CSR từ danh sách cạnh có hướng; cạnh song song giữ cạnh ngắn nhất, bỏ vòng lặp tại chỗ
+    @classmethod
+    def from_arrays(cls, node_ids, lat, lon, sources, targets, distance, time, fingerprint='',
+                    cache_dir=DEFAULT_CACHE_DIR):
+        n = len(node_ids)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        distance = np.asarray(distance, dtype=np.float64)
+        time = np.asarray(time, dtype=np.float64)
+        valid = sources != targets
+        sources, targets, distance, time = sources[valid], targets[valid], distance[valid], time[valid]
+        order = np.lexsort((distance, targets, sources))
+        sources, targets, distance, time = sources[order], targets[order], distance[order], time[order]
+        unique = np.r_[True, (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])]
+        sources, targets, distance, time = sources[unique], targets[unique], distance[unique], time[unique]
+        indptr = np.searchsorted(sources, np.arange(n + 1)).astype(np.int64)
+        return cls(np.asarray(node_ids, dtype=np.int64), np.asarray(lat, dtype=np.float64),
+                   np.asarray(lon, dtype=np.float64), indptr, targets.astype(np.int32), distance, time,
+                   fingerprint=fingerprint, cache_dir=cache_dir)
+
+    # Nạp bản trích OSM; đồ thị đã dựng được lưu cạnh file nguồn (<file>.graph/) và dùng lại khi file không đổi
+    @classmethod
+    def load(cls, path, cache_dir=DEFAULT_CACHE_DIR):
+        if os.path.isdir(path):
+            return cls.load_graph(path, cache_dir=cache_dir)
+        graph_dir = f"{path}.graph"
+        stamp = {'size': os.path.getsize(path), 'mtime': os.path.getmtime(path)}
+        meta_path = os.path.join(graph_dir, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                if json.load(f).get('source') == stamp:
+                    return cls.load_graph(graph_dir, cache_dir=cache_dir)
+        network = cls.from_osm(path, cache_dir=cache_dir)
+        network.save(graph_dir, source=stamp)
+        return network
+
+    def save(self, path, source=None):
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(path, f"{name}.npy"), np.asarray(getattr(self, name)))
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'fingerprint': self.fingerprint, 'source': source}, f)
+
+    @classmethod
+    def load_graph(cls, path, mmap_mode=None, cache_dir=DEFAULT_CACHE_DIR):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in ARRAY_NAMES}
+        return cls(fingerprint=meta['fingerprint'], cache_dir=cache_dir, **arrays)
+
+    def _graph(self, weight):
+        graph = self._graphs.get(weight)
+        if graph is None:
+            from scipy.sparse import csr_matrix
+
+            values = self.distance if weight == 'distance' else self.time
+            graph = csr_matrix((values, self.indices, self.indptr), shape=(self.num_nodes, self.num_nodes))
+            self._graphs[weight] = graph
+        return graph
+
+    # Chiếu phẳng (km) quanh vĩ độ trung bình của mạng để khoảng cách Euclid trong cây xấp xỉ khoảng cách thật
+    def _project(self, lats, lons):
+        scale = np.cos(np.radians(self._lat0))
+        return np.column_stack([np.radians(lats) * EARTH_RADIUS_KM, np.radians(lons) * EARTH_RADIUS_KM * scale])
+
+    # Chỉ gắn vào thành phần liên thông mạnh lớn nhất, để mọi cặp điểm đều có đường đi hai chiều
+    def _snap_tree(self):
+        if self._tree is None:
+            from scipy.sparse.csgraph import connected_components
+            from scipy.spatial import cKDTree
+
+            _, labels = connected_components(self._graph('distance'), directed=True, connection='strong')
+            self._snappable = np.flatnonzero(labels == np.bincount(labels).argmax())
+            self._lat0 = float(np.mean(self.lat[self._snappable]))
+            self._tree = cKDTree(self._project(self.lat[self._snappable], self.lon[self._snappable]))
+        return self._tree
+
+    # Nút đường gần nhất cho mỗi tọa độ và độ dài đoạn nối (km)
+    def snap(self, lats, lons):
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        tree = self._snap_tree()
+        _, nearest = tree.query(self._project(lats, lons))
+        nodes = self._snappable[nearest]
+        return nodes, _haversine(lats, lons, self.lat[nodes], self.lon[nodes])
+
+    # Bảng đường ngắn nhất giữa các nút (theo 'distance' hoặc 'time'), Dijkstra đa nguồn theo khối nguồn
+    # để kết quả trung gian (số nguồn x số nút) không vượt DEFAULT_BLOCK_ELEMENTS
+    def node_table(self, nodes, weight='distance'):
+        from scipy.sparse.csgraph import dijkstra
+
+        nodes = np.asarray(nodes, dtype=np.int64)
+        graph = self._graph(weight)
+        chunk = max(1, DEFAULT_BLOCK_ELEMENTS // max(self.num_nodes, 1))
+        table = np.empty((len(nodes), len(nodes)))
+        for start in range(0, len(nodes), chunk):
+            block = dijkstra(graph, directed=True, indices=nodes[start:start + chunk])
+            table[start:start + chunk] = block[:, nodes]
+        return table
+
+    def _cache_path(self, nodes, weight):
+        digest = hashlib.sha256(self.fingerprint.encode() + weight.encode())
+        digest.update(np.ascontiguousarray(nodes, dtype=np.int64).tobytes())
+        return os.path.join(self.cache_dir, f"{weight}-{digest.hexdigest()}.npy")
+
+    # Bảng trên tập nút (đã sắp, không trùng), lưu đĩa theo tập nút để lần gọi sau với cùng tập điểm đọc lại
+    def cached_node_table(self, nodes, weight='distance'):
+        if self.cache_dir is None:
+            return self.node_table(nodes, weight)
+        path = self._cache_path(nodes, weight)
+        if os.path.exists(path):
+            return np.load(path)
+        table = self.node_table(nodes, weight)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.save(f, table)
+        os.replace(temp_path, path)
+        return table
+
+    # Bảng nhiều-nhiều giữa các tọa độ: quãng đường (km) hoặc thời gian (phút) trên đường, cộng đoạn nối hai đầu.
+    # Các điểm gắn cùng một nút dùng chung một hàng/cột của bảng nút
+    def table(self, lats, lons, weight='distance', min_value=0.0):
+        if weight not in ('distance', 'time'):
+            raise ValueError(f"weight phải là 'distance' hoặc 'time', không phải {weight}")
+        nodes, access = self.snap(lats, lons)
+        unique, inverse = np.unique(nodes, return_inverse=True)
+        base = self.cached_node_table(unique, weight)
+        if weight == 'time':
+            access = access / ACCESS_SPEED_KMH * 60
+        out = base[np.ix_(inverse, inverse)] + access[:, None] + access[None, :]
+        np.maximum(out, min_value, out=out)
+        np.fill_diagonal(out, 0)
+        return out
+
+    def distance_matrix(self, lats, lons, min_distance=0.0):
+        return self.table(lats, lons, 'distance', min_distance)
+
+    def travel_time_matrix(self, lats, lons):
+        return self.table(lats, lons, 'time')
+
+    # Quãng đường từng chặng (from_nodes[i] -> to_nodes[i]) theo chỉ số trong lats/lons
+    def leg_distances(self, lats, lons, from_nodes, to_nodes, min_distance=0.0):
+        from_nodes = np.asarray(from_nodes, dtype=np.intp)
+        to_nodes = np.asarray(to_nodes, dtype=np.intp)
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        involved, inverse = np.unique(np.r_[from_nodes, to_nodes], return_inverse=True)
+        table = self.distance_matrix(lats[involved], lons[involved], min_distance)
+        return table[inverse[:len(from_nodes)], inverse[len(from_nodes):]]
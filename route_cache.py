@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Các cột của df_locations mà solver đọc (khung giờ, nhu cầu) nên phải nằm trong khóa cache
+SOLVER_COLUMNS = ('tw_start', 'tw_end', 'demand')
+# Tọa độ quyết định hệ số giao thông (traffic.arc_multipliers) nên cùng ma trận nhưng khác vị trí là khóa khác
+LOCATION_COLUMNS = ('lat', 'lon')
+
+
+# Hàm tạo khóa nội dung: hash ma trận khoảng cách + các tham số solver
+def make_route_key(distance_matrix, df_locations=None, **params):
+    distance_matrix = np.ascontiguousarray(distance_matrix)
+    digest = hashlib.sha256()
+    digest.update(str(distance_matrix.dtype).encode())
+    digest.update(str(distance_matrix.shape).encode())
+    digest.update(distance_matrix.tobytes())
+    if df_locations is not None:
+        for column in LOCATION_COLUMNS:
+            if column in df_locations.columns:
+                digest.update(column.encode())
+                digest.update(np.ascontiguousarray(df_locations[column].to_numpy(dtype=np.float64)).tobytes())
+        for column in SOLVER_COLUMNS:
+            if column in df_locations.columns:
+                digest.update(column.encode())
+                digest.update(np.ascontiguousarray(df_locations[column].to_numpy(dtype=np.int64)).tobytes())
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+# Cache lời giải dùng chung giữa các phiên, giới hạn theo số mục và số byte (LRU),
+# tùy chọn lưu xuống đĩa (cũng LRU, giới hạn max_disk_bytes) để giữ kết quả qua các lần khởi động lại tiến trình
+class RouteCache:
+    def __init__(self, max_entries=128, max_bytes=64 * 1024 * 1024, disk_dir=None, max_disk_bytes=512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()  # key -> (payload đã pickle, kích thước)
+        self._total_bytes = 0
+        self._disk_entries = OrderedDict()  # key -> kích thước file, cũ nhất (ít dùng nhất) ở đầu
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        if disk_dir is not None:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._scan_disk()
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.pkl")
+
+    # Nạp danh sách file đã có theo thứ tự mtime (lần ghi/đọc gần nhất) để LRU trên đĩa tiếp tục sau khởi động lại
+    def _scan_disk(self):
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith('.pkl'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, entry.name[:-len('.pkl')], stat.st_size))
+        with self._lock:
+            for _, key, size in sorted(files):
+                self._disk_entries[key] = size
+                self._disk_bytes += size
+            self._evict_disk()
+
+    def _evict_disk(self):
+        while self._disk_entries and self._disk_bytes > self.max_disk_bytes:
+            key, size = self._disk_entries.popitem(last=False)
+            self._disk_bytes -= size
+            self.disk_evictions += 1
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass  # Tiến trình khác dùng chung thư mục đã xóa
+
+    # Ghi nhận một lần ghi/đọc file: đưa về cuối hàng LRU rồi xóa file cũ nhất nếu vượt giới hạn
+    def _touch_disk(self, key, size):
+        if key in self._disk_entries:
+            self._disk_bytes -= self._disk_entries.pop(key)
+        self._disk_entries[key] = size
+        self._disk_bytes += size
+        self._evict_disk()
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+            _, (_, size) = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def _store(self, key, payload):
+        if key in self._entries:
+            self._total_bytes -= self._entries.pop(key)[1]
+        if len(payload) > self.max_bytes:
+            return  # Lời giải quá lớn để giữ trong bộ nhớ
+        self._entries[key] = (payload, len(payload))
+        self._total_bytes += len(payload)
+        self._evict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return pickle.loads(entry[0])
+        if self.disk_dir is not None and os.path.exists(self._disk_path(key)):
+            try:
+                with open(self._disk_path(key), 'rb') as f:
+                    payload = f.read()
+                value = pickle.loads(payload)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                value = None
+            if value is not None:
+                try:
+                    os.utime(self._disk_path(key))
+                except OSError:
+                    pass
+                with self._lock:
+                    self._store(key, payload)
+                    self._touch_disk(key, len(payload))
+                    self.hits += 1
+                    self.disk_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._store(key, payload)
+        if self.disk_dir is not None and len(payload) <= self.max_disk_bytes:
+            # Ghi file tạm rồi đổi tên để không đọc phải file ghi dở
+            tmp_path = f"{self._disk_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, self._disk_path(key))
+            with self._lock:
+                self._touch_disk(key, len(payload))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'disk_entries': len(self._disk_entries),
+                'disk_bytes': self._disk_bytes,
+                'disk_evictions': self.disk_evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Hàm gọi solver qua cache: cùng ma trận và tham số thì trả lại lời giải đã có
+def cached_optimize_route(cache, distance_matrix, df_locations, solver=None, **solver_kwargs):
+    key = make_route_key(distance_matrix, df_locations, **solver_kwargs)
+    result = cache.get(key)
+    if result is None:
+        if solver is None:
+            from routing import optimize_route as solver
+        result = solver(distance_matrix, df_locations, **solver_kwargs)
+        cache.put(key, result)
+    return result
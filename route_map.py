@@ -0,0 +1,104 @@
+import hashlib
+import html
+import json
+
+import numpy as np
+
+DEFAULT_CENTER = [10.776, 106.700]
+ROUTE_COLORS = ['blue', 'red', 'green', 'purple', 'orange', 'darkred', 'cadetblue', 'darkgreen', 'pink', 'gray']
+CLUSTER_THRESHOLD = 2000  # Trên ngưỡng này dùng FastMarkerCluster thay cho một lớp GeoJSON
+
+
+def route_color(vehicle):
+    return ROUTE_COLORS[(vehicle - 1) % len(ROUTE_COLORS)]
+
+
+# Chỉ mục node -> ETA (phút) và xe phục vụ, dựng một lần từ route_details.
+# times[k] là thời điểm đến nodes[k + 1]; node xuất hiện ở nhiều tuyến (depot) lấy ETA lớn nhất (lúc xe cuối về)
+def build_eta_index(route_details, num_nodes):
+    eta = np.full(num_nodes, np.nan)
+    vehicle = np.zeros(num_nodes, dtype=np.int64)
+    if not route_details:
+        return eta, vehicle
+    nodes = np.concatenate([np.asarray(detail['nodes'][1:len(detail['times']) + 1], dtype=np.int64)
+                            for detail in route_details])
+    times = np.concatenate([np.asarray(detail['times'], dtype=np.float64) for detail in route_details])
+    vehicles = np.concatenate([np.full(len(detail['times']), detail['vehicle'], dtype=np.int64)
+                               for detail in route_details])
+    np.fmax.at(eta, nodes, times)
+    vehicle[nodes] = vehicles
+    return eta, vehicle
+
+
+# Khóa nhận diện bản đồ: đổi khi tuyến hoặc tọa độ thay đổi, để dùng lại HTML giữa các lần rerun
+def route_signature(df_locations, route_details):
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(df_locations[['lat', 'lon']].to_numpy(dtype=np.float64)).tobytes())
+    digest.update(json.dumps([[detail['vehicle'], list(map(int, detail['nodes'])), list(map(float, detail['times']))]
+                              for detail in route_details]).encode())
+    return digest.hexdigest()
+
+
+def _stops_geojson(lats, lons, names, eta, vehicle, indices):
+    features = []
+    for i in indices.tolist():
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [lons[i], lats[i]]},
+            'properties': {'name': names[i], 'eta': '' if np.isnan(eta[i]) else f"{eta[i]:.1f} phút",
+                           'vehicle': int(vehicle[i]), 'color': route_color(int(vehicle[i])) if vehicle[i] else 'gray'},
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+# Dựng bản đồ tuyến: depot là một Marker riêng, các điểm dừng là một lớp GeoJSON duy nhất
+# (hoặc FastMarkerCluster khi rất nhiều điểm), mỗi xe một PolyLine lấy tọa độ bằng chỉ mục mảng
+def build_route_map(df_locations, route_details, depot=0, center=None, zoom_start=13,
+                    cluster_threshold=CLUSTER_THRESHOLD):
+    import folium
+    from folium.plugins import FastMarkerCluster
+
+    lats = df_locations['lat'].to_numpy(dtype=np.float64)
+    lons = df_locations['lon'].to_numpy(dtype=np.float64)
+    # Tên điểm (từ file đơn hàng) được chèn vào popup/tooltip dưới dạng HTML phía trình duyệt nên phải escape
+    names = [html.escape(name) for name in df_locations['name'].astype(str).tolist()]
+    eta, vehicle = build_eta_index(route_details, len(df_locations))
+
+    m = folium.Map(location=center or DEFAULT_CENTER, zoom_start=zoom_start, prefer_canvas=True)
+    depot_eta = '' if np.isnan(eta[depot]) else f"<br>ETA: {eta[depot]:.1f} phút"
+    folium.Marker([lats[depot], lons[depot]], popup=f"{names[depot]}{depot_eta}",
+                  icon=folium.Icon(color='red')).add_to(m)
+
+    stops = np.flatnonzero(np.arange(len(df_locations)) != depot)
+    if len(stops) > cluster_threshold:
+        # Dữ liệu điểm truyền một lần dưới dạng mảng; marker và popup được tạo phía trình duyệt
+        data = [[lats[i], lons[i], f"{names[i]}<br>ETA: {'' if np.isnan(eta[i]) else f'{eta[i]:.1f} phút'}"]
+                for i in stops.tolist()]
+        callback = """function (row) {
+            var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {radius: 5, color: 'blue'});
+            marker.bindPopup(row[2]);
+            return marker;
+        }"""
+        FastMarkerCluster(data, callback=callback, name='Điểm giao').add_to(m)
+    elif len(stops):
+        folium.GeoJson(
+            _stops_geojson(lats, lons, names, eta, vehicle, stops),
+            name='Điểm giao',
+            marker=folium.CircleMarker(radius=6, fill=True, fill_opacity=0.9),
+            style_function=lambda feature: {'color': feature['properties']['color'],
+                                            'fillColor': feature['properties']['color']},
+            popup=folium.GeoJsonPopup(fields=['name', 'eta'], aliases=['Điểm', 'ETA'], labels=True),
+            tooltip=folium.GeoJsonTooltip(fields=['name']),
+        ).add_to(m)
+
+    for detail in route_details:
+        nodes = np.asarray(detail['nodes'], dtype=np.int64)
+        points = np.column_stack([lats[nodes], lons[nodes]]).tolist()
+        folium.PolyLine(points, color=route_color(detail['vehicle']), weight=2.5,
+                        popup=f"Xe {detail['vehicle']}: {sum(detail['times']):.1f} phút").add_to(m)
+    return m
+
+
+# HTML hoàn chỉnh của bản đồ (để cache và hiển thị bằng components.html)
+def render_route_map_html(df_locations, route_details, **kwargs):
+    return build_route_map(df_locations, route_details, **kwargs).get_root().render()
@@ -0,0 +1,384 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from ortools.constraint_solver import routing_enums_pb2, pywrapcp
+from instrumentation import span
+from traffic import get_traffic_model
+
+# Chiến lược lời giải đầu và metaheuristic có thể chọn theo tên
+FIRST_SOLUTION_STRATEGIES = {
+    'path_cheapest_arc': routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC,
+    'savings': routing_enums_pb2.FirstSolutionStrategy.SAVINGS,
+    'parallel_cheapest_insertion': routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION,
+    'local_cheapest_insertion': routing_enums_pb2.FirstSolutionStrategy.LOCAL_CHEAPEST_INSERTION,
+    'christofides': routing_enums_pb2.FirstSolutionStrategy.CHRISTOFIDES,
+    'global_cheapest_arc': routing_enums_pb2.FirstSolutionStrategy.GLOBAL_CHEAPEST_ARC,
+}
+METAHEURISTICS = {
+    'automatic': routing_enums_pb2.LocalSearchMetaheuristic.AUTOMATIC,
+    'greedy_descent': routing_enums_pb2.LocalSearchMetaheuristic.GREEDY_DESCENT,
+    'guided_local_search': routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH,
+    'simulated_annealing': routing_enums_pb2.LocalSearchMetaheuristic.SIMULATED_ANNEALING,
+    'tabu_search': routing_enums_pb2.LocalSearchMetaheuristic.TABU_SEARCH,
+}
+# Thứ tự chiến lược luân phiên giữa các lần khởi động lại song song
+RESTART_STRATEGIES = ['path_cheapest_arc', 'savings', 'parallel_cheapest_insertion',
+                      'local_cheapest_insertion', 'christofides', 'global_cheapest_arc']
+
+# Hệ số tắc nghẽn cho mọi cặp điểm: tra tensor (vùng x khung 15 phút) của mô hình giao thông quanh giờ xuất phát;
+# chưa có mô hình (không có lịch sử) thì giả lập ngẫu nhiên: 20% cung tắc đường (hệ số 1.3)
+def get_traffic_multipliers(lats, lons, departure=None):
+    model = get_traffic_model()
+    if model is not None:
+        return model.arc_multipliers(lats, lons, departure)
+    n = len(lats)
+    return np.where(np.random.random((n, n)) < 0.2, 1.3, 1.0)
+
+# Hệ số giao thông cho từng chặng from_nodes[i] -> to_nodes[i] (cùng cách tính với get_traffic_multipliers
+# nhưng không dựng ma trận n x n, dùng cho tập điểm rất lớn)
+def get_leg_traffic_multipliers(lats, lons, from_nodes, to_nodes, departure=None):
+    model = get_traffic_model()
+    if model is not None:
+        return model.leg_multipliers(lats, lons, from_nodes, to_nodes, departure)
+    return np.where(np.random.random(len(from_nodes)) < 0.2, 1.3, 1.0)
+
+# Hàm tính trước ma trận chi phí cung đường (đã nhân hệ số giao thông) một lần cho mỗi lần giải
+def build_arc_cost_matrix(distance_matrix, df_locations, departure=None):
+    distance_matrix = np.asarray(distance_matrix, dtype=np.float64)
+    traffic_multipliers = get_traffic_multipliers(df_locations['lat'].to_numpy(), df_locations['lon'].to_numpy(),
+                                                  departure)
+    adjusted_matrix = distance_matrix * traffic_multipliers
+    # Chi phí nguyên cho solver; cạnh không hợp lệ (<= 0) nhận giá trị mặc định 1
+    cost_matrix = np.maximum(1, adjusted_matrix.astype(np.int64))
+    cost_matrix[distance_matrix <= 0] = 1
+    return cost_matrix, adjusted_matrix
+
+# Ma trận thời gian di chuyển (phút, nguyên) từ khoảng cách đã điều chỉnh và tốc độ xe,
+# cộng thời gian phục vụ tại điểm xuất phát (trừ depot)
+def build_time_matrix(adjusted_matrix, speed_km_per_hour, depot=0, service_time_min=0):
+    time_matrix = np.ceil(np.asarray(adjusted_matrix) / speed_km_per_hour * 60).astype(np.int64)
+    if service_time_min:
+        time_matrix += int(service_time_min)
+        time_matrix[depot, :] -= int(service_time_min)
+    np.fill_diagonal(time_matrix, 0)
+    return time_matrix
+
+# Đọc khung giờ giao (phút kể từ lúc xuất phát) từ tham số hoặc cột tw_start/tw_end của df_locations
+def _resolve_time_windows(time_windows, df_locations):
+    if time_windows is not None:
+        return [(int(start), int(end)) for start, end in time_windows]
+    if 'tw_start' in df_locations.columns and 'tw_end' in df_locations.columns:
+        return list(zip(df_locations['tw_start'].astype(int), df_locations['tw_end'].astype(int)))
+    return None
+
+def _resolve_demands(demands, df_locations, depot):
+    if demands is not None:
+        return [int(d) for d in demands]
+    if 'demand' in df_locations.columns:
+        return [int(d) for d in df_locations['demand']]
+    # Mặc định mỗi đơn chiếm 1 đơn vị tải, depot không có nhu cầu
+    return [0 if node == depot else 1 for node in range(len(df_locations))]
+
+# Dựng mô hình định tuyến (chi phí cung đường, tải trọng, khung giờ) dùng chung cho giải mới và tái tối ưu
+def _build_model(cost_matrix, num_vehicles, depot, time_matrix=None, time_windows=None,
+                 demands=None, vehicle_capacities=None):
+    manager = pywrapcp.RoutingIndexManager(len(cost_matrix), num_vehicles, depot)
+    routing = pywrapcp.RoutingModel(manager)
+    transit_callback_index = routing.RegisterTransitMatrix(np.asarray(cost_matrix).tolist())
+    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+
+    if vehicle_capacities is not None:
+        demand_callback_index = routing.RegisterUnaryTransitVector(demands)
+        routing.AddDimensionWithVehicleCapacity(demand_callback_index, 0, list(vehicle_capacities), True, 'Capacity')
+
+    time_dimension = None
+    if time_matrix is not None:
+        horizon = max(end for _, end in time_windows)
+        time_callback_index = routing.RegisterTransitMatrix(time_matrix.tolist())
+        routing.AddDimension(time_callback_index, horizon, horizon, False, 'Time')
+        time_dimension = routing.GetDimensionOrDie('Time')
+        for node, (start, end) in enumerate(time_windows):
+            if node == depot:
+                continue
+            time_dimension.CumulVar(manager.NodeToIndex(node)).SetRange(start, end)
+        depot_start, depot_end = time_windows[depot]
+        for vehicle_id in range(num_vehicles):
+            time_dimension.CumulVar(routing.Start(vehicle_id)).SetRange(depot_start, depot_end)
+            routing.AddVariableMinimizedByFinalizer(time_dimension.CumulVar(routing.End(vehicle_id)))
+    return manager, routing, time_dimension
+
+def _search_parameters(first_solution_strategy='path_cheapest_arc', metaheuristic=None, time_limit_s=None):
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    search_parameters.first_solution_strategy = FIRST_SOLUTION_STRATEGIES[first_solution_strategy]
+    if metaheuristic is not None:
+        search_parameters.local_search_metaheuristic = METAHEURISTICS[metaheuristic]
+    if time_limit_s is not None:
+        search_parameters.time_limit.FromMilliseconds(int(time_limit_s * 1000))
+    return search_parameters
+
+# Đọc danh sách nút và thời điểm đến của từng xe từ lời giải
+def _extract_routes(manager, routing, solution, time_dimension, num_vehicles):
+    routes = []
+    arrival_times = []
+    for vehicle_id in range(num_vehicles):
+        index = routing.Start(vehicle_id)
+        route = [manager.IndexToNode(index)]
+        times = []
+        while not routing.IsEnd(index):
+            index = solution.Value(routing.NextVar(index))
+            route.append(manager.IndexToNode(index))
+            if time_dimension is not None:
+                times.append(solution.Min(time_dimension.CumulVar(index)))
+        routes.append(route)
+        arrival_times.append(times)
+    return routes, arrival_times if time_dimension is not None else None
+
+def _route_cost(cost_matrix, routes):
+    return int(sum(cost_matrix[a, b] for route in routes for a, b in zip(route[:-1], route[1:])))
+
+# Giải một lần với các tham số cho trước; hàm cấp module để chạy được trong ProcessPoolExecutor
+def _solve_once(cost_matrix, num_vehicles, depot, time_matrix=None, time_windows=None,
+                demands=None, vehicle_capacities=None, first_solution_strategy='path_cheapest_arc',
+                metaheuristic=None, time_limit_s=None, seed=0):
+    # Các lần khởi động lại có seed > 0 giải trên chi phí nhiễu nhẹ để đa dạng hóa tìm kiếm;
+    # mục tiêu thật luôn được tính lại trên cost_matrix gốc
+    solver_costs = cost_matrix
+    if seed >= len(RESTART_STRATEGIES):
+        rng = np.random.default_rng(seed)
+        solver_costs = np.maximum(1, np.rint(cost_matrix * rng.uniform(1.0, 1.02, cost_matrix.shape))).astype(np.int64)
+    manager, routing, time_dimension = _build_model(solver_costs, num_vehicles, depot, time_matrix, time_windows,
+                                                    demands, vehicle_capacities)
+    solution = routing.SolveWithParameters(
+        _search_parameters(first_solution_strategy, metaheuristic, time_limit_s))
+    if solution is None:
+        return None
+
+    routes, arrival_times = _extract_routes(manager, routing, solution, time_dimension, num_vehicles)
+    return _route_cost(cost_matrix, routes), routes, arrival_times
+
+# ETA phụ thuộc thời gian (phút từ lúc xuất phát) theo khung giờ thực tế của từng chặng; None nếu chưa có mô hình
+def traffic_etas(routes, distance_matrix, df_locations, speed_km_per_hour, departure=None):
+    model = get_traffic_model()
+    if model is None:
+        return None
+    return model.route_etas(routes, distance_matrix, df_locations['lat'].to_numpy(), df_locations['lon'].to_numpy(),
+                            speed_km_per_hour, departure)
+
+# Dựng routes / route_details / total_distance từ danh sách nút của từng xe
+def build_route_details(routes, adjusted_matrix, speed_km_per_hour, arrival_times=None):
+    route_details = []
+    total_distance = 0
+    for vehicle_id, route in enumerate(routes):
+        route_distance = 0
+        route_times = []
+        cumulative_time = 0
+        for k, (node, next_node) in enumerate(zip(route[:-1], route[1:])):
+            # Dùng cùng ma trận đã tối ưu để khoảng cách và ETA khớp với lời giải
+            adjusted_distance = adjusted_matrix[node][next_node]
+            route_distance += adjusted_distance
+            segment_time = (adjusted_distance / speed_km_per_hour) * 60  # Chuyển đổi sang phút
+            cumulative_time += segment_time
+            # Với khung giờ, ETA lấy từ biến thời gian của solver (đã gồm thời gian chờ/phục vụ);
+            # không có khung giờ thì từ traffic_etas (hệ số theo giờ đến từng chặng) nếu có mô hình giao thông
+            route_times.append(float(arrival_times[vehicle_id][k]) if arrival_times is not None else cumulative_time)
+        total_distance += route_distance
+        route_details.append({
+            'vehicle': vehicle_id + 1,
+            'nodes': route,
+            'distance': route_distance,
+            'times': route_times
+        })
+    return route_details, total_distance
+
+# Kiểm tra metaheuristic dùng chung cho giải mới và tái tối ưu: các metaheuristic không tự dừng cần giới hạn thời gian
+def _validate_metaheuristic(metaheuristic, time_limit_s):
+    if metaheuristic is not None and metaheuristic not in METAHEURISTICS:
+        raise ValueError(f"Metaheuristic không hợp lệ: {metaheuristic}")
+    if metaheuristic in ('guided_local_search', 'simulated_annealing', 'tabu_search') and time_limit_s is None:
+        raise ValueError("Metaheuristic cần time_limit_s để dừng tìm kiếm!")
+
+# Hàm tối ưu lộ trình
+def optimize_route(distance_matrix, df_locations, num_vehicles=1, depot=0, speed_km_per_hour=20,
+                   vehicle_capacities=None, demands=None, time_windows=None, service_time_min=0,
+                   first_solution_strategy='path_cheapest_arc', metaheuristic=None, time_limit_s=None,
+                   num_restarts=1, num_workers=None, departure=None):
+    # Nhận trực tiếp ma trận từ build_distance_matrix (float64/float32/int32 hoặc memmap)
+    distance_matrix = np.asarray(distance_matrix)
+    # Kiểm tra dữ liệu
+    if distance_matrix.shape[0] != distance_matrix.shape[1]:
+        raise ValueError("distance_matrix phải là ma trận vuông!")
+    if len(distance_matrix) != len(df_locations):
+        raise ValueError("Số lượng địa điểm không khớp!")
+    if np.any(distance_matrix < 0) or np.any(np.isnan(distance_matrix)):
+        raise ValueError("distance_matrix chứa giá trị âm hoặc NaN!")
+    if num_vehicles > len(distance_matrix) - 1:
+        raise ValueError("Số xe không được vượt quá số địa điểm trừ depot!")
+    if first_solution_strategy not in FIRST_SOLUTION_STRATEGIES:
+        raise ValueError(f"Chiến lược lời giải đầu không hợp lệ: {first_solution_strategy}")
+    _validate_metaheuristic(metaheuristic, time_limit_s)
+    if num_restarts > 1 and time_limit_s is None:
+        raise ValueError("Chế độ khởi động lại song song cần time_limit_s!")
+
+    if vehicle_capacities is not None:
+        if np.isscalar(vehicle_capacities):
+            vehicle_capacities = [int(vehicle_capacities)] * num_vehicles
+        if len(vehicle_capacities) != num_vehicles:
+            raise ValueError("vehicle_capacities phải có đúng num_vehicles phần tử!")
+        demands = _resolve_demands(demands, df_locations, depot)
+        if len(demands) != len(distance_matrix):
+            raise ValueError("demands phải có đúng một giá trị cho mỗi địa điểm!")
+        if sum(demands) > sum(vehicle_capacities):
+            raise ValueError("Tổng nhu cầu vượt quá tổng tải trọng của đội xe!")
+
+    with span('routing.arc_costs'):
+        cost_matrix, adjusted_matrix = build_arc_cost_matrix(distance_matrix, df_locations, departure)
+
+        time_matrix = None
+        time_windows = _resolve_time_windows(time_windows, df_locations)
+        if time_windows is not None:
+            if len(time_windows) != len(distance_matrix):
+                raise ValueError("time_windows phải có đúng một khung giờ cho mỗi địa điểm!")
+            time_matrix = build_time_matrix(adjusted_matrix, speed_km_per_hour, depot, service_time_min)
+
+    solve_kwargs = dict(num_vehicles=num_vehicles, depot=depot, time_matrix=time_matrix,
+                        time_windows=time_windows, demands=demands, vehicle_capacities=vehicle_capacities,
+                        metaheuristic=metaheuristic, time_limit_s=time_limit_s)
+    with span('routing.solve'):
+        if num_restarts > 1:
+            # Mỗi lần khởi động lại chạy trong một tiến trình riêng (solver giữ GIL nên luồng không song song được)
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                futures = [
+                    executor.submit(_solve_once, cost_matrix,
+                                    first_solution_strategy=RESTART_STRATEGIES[seed % len(RESTART_STRATEGIES)],
+                                    seed=seed, **solve_kwargs)
+                    for seed in range(num_restarts)
+                ]
+                results = [future.result() for future in futures]
+            results = [result for result in results if result is not None]
+            best = min(results, key=lambda result: result[0]) if results else None
+        else:
+            best = _solve_once(cost_matrix, first_solution_strategy=first_solution_strategy, **solve_kwargs)
+
+    if best is None:
+        raise ValueError("Không tìm thấy giải pháp tối ưu! Kiểm tra dữ liệu hoặc giảm số lượng xe.")
+
+    _, routes, arrival_times = best
+    with span('routing.route_details'):
+        if arrival_times is None:
+            arrival_times = traffic_etas(routes, distance_matrix, df_locations, speed_km_per_hour, departure)
+        route_details, total_distance = build_route_details(routes, adjusted_matrix, speed_km_per_hour, arrival_times)
+    return routes, route_details, total_distance
+
+# Chèn rẻ nhất: đặt từng đơn mới vào vị trí (sau phần đã giao) làm tăng chi phí ít nhất, để có lời giải khởi đầu
+# đầy đủ cho solver. inner_routes là các tuyến bỏ depot ở hai đầu, đánh số theo ma trận cost_matrix
+def _cheapest_insertion(cost_matrix, inner_routes, new_nodes, locked, depot=0, demands=None, vehicle_capacities=None):
+    loads = None
+    if vehicle_capacities is not None:
+        loads = [sum(demands[node] for node in route) for route in inner_routes]
+    for node in new_nodes:
+        best = None
+        for vehicle_id, route in enumerate(inner_routes):
+            if loads is not None and loads[vehicle_id] + demands[node] > vehicle_capacities[vehicle_id]:
+                continue
+            path = np.array([depot] + route + [depot])
+            before = path[locked[vehicle_id]:-1]
+            after = path[locked[vehicle_id] + 1:]
+            delta = cost_matrix[before, node] + cost_matrix[node, after] - cost_matrix[before, after]
+            position = int(np.argmin(delta))
+            if best is None or delta[position] < best[0]:
+                best = (delta[position], vehicle_id, locked[vehicle_id] + position)
+        if best is None:
+            raise ValueError("Không còn xe đủ tải trọng để chèn đơn mới!")
+        _, vehicle_id, position = best
+        inner_routes[vehicle_id].insert(position, node)
+        if loads is not None:
+            loads[vehicle_id] += demands[node]
+    return inner_routes
+
+# Tái tối ưu tăng dần từ lộ trình hiện có: bỏ các đơn remove_nodes, chèn các đơn insert_nodes rồi khởi động
+# solver từ lời giải cũ (ReadAssignmentFromRoutes) với thời gian ngắn thay vì giải lại từ đầu.
+# visited: số điểm mỗi xe đã giao (không tính depot); phần tuyến này được khóa cố định.
+# Chỉ các nút nằm trên tuyến được đưa vào mô hình nên chi phí mỗi lần gọi tỷ lệ với số điểm đang phục vụ
+def reoptimize_route(distance_matrix, df_locations, routes, remove_nodes=(), insert_nodes=(), visited=None,
+                     depot=0, speed_km_per_hour=20, vehicle_capacities=None, demands=None, time_windows=None,
+                     service_time_min=0, metaheuristic=None, time_limit_s=1.0, departure=None):
+    distance_matrix = np.asarray(distance_matrix)
+    if distance_matrix.shape[0] != distance_matrix.shape[1]:
+        raise ValueError("distance_matrix phải là ma trận vuông!")
+    if len(distance_matrix) != len(df_locations):
+        raise ValueError("Số lượng địa điểm không khớp!")
+    _validate_metaheuristic(metaheuristic, time_limit_s)
+
+    num_vehicles = len(routes)
+    visited = [0] * num_vehicles if visited is None else [int(count) for count in visited]
+    if len(visited) != num_vehicles:
+        raise ValueError("visited phải có đúng một giá trị cho mỗi xe!")
+    inner_routes = [[int(node) for node in route[1:-1]] for route in routes]
+    locked = [min(max(count, 0), len(route)) for count, route in zip(visited, inner_routes)]
+    remove_nodes = {int(node) for node in remove_nodes}
+    insert_nodes = [int(node) for node in dict.fromkeys(insert_nodes)]
+
+    served = {node for route in inner_routes for node in route}
+    done = {node for route, count in zip(inner_routes, locked) for node in route[:count]}
+    if remove_nodes - served:
+        raise ValueError(f"Các điểm không có trong lộ trình: {sorted(remove_nodes - served)}")
+    if remove_nodes & done:
+        raise ValueError(f"Không thể bỏ các điểm đã giao: {sorted(remove_nodes & done)}")
+    if depot in insert_nodes or set(insert_nodes) & served:
+        raise ValueError("Điểm chèn thêm không được là depot hoặc đã có trong lộ trình!")
+    if insert_nodes and (min(insert_nodes) < 0 or max(insert_nodes) >= len(distance_matrix)):
+        raise ValueError("Điểm chèn thêm nằm ngoài danh sách địa điểm!")
+    inner_routes = [[node for node in route if node not in remove_nodes] for route in inner_routes]
+
+    # Bài toán con trên các nút còn phục vụ; depot mang chỉ số 0
+    active = np.array([depot] + [node for route in inner_routes for node in route] + insert_nodes, dtype=np.int64)
+    local = {int(node): i for i, node in enumerate(active)}
+    sub_matrix = distance_matrix[np.ix_(active, active)]
+    sub_locations = df_locations.iloc[active].reset_index(drop=True)
+    cost_matrix, adjusted_matrix = build_arc_cost_matrix(sub_matrix, sub_locations, departure)
+
+    if vehicle_capacities is not None:
+        if np.isscalar(vehicle_capacities):
+            vehicle_capacities = [int(vehicle_capacities)] * num_vehicles
+        if len(vehicle_capacities) != num_vehicles:
+            raise ValueError("vehicle_capacities phải có đúng một giá trị cho mỗi xe!")
+        demands = [_resolve_demands(demands, df_locations, depot)[node] for node in active]
+
+    time_matrix = None
+    time_windows = _resolve_time_windows(time_windows, df_locations)
+    if time_windows is not None:
+        time_windows = [time_windows[node] for node in active]
+        time_matrix = build_time_matrix(adjusted_matrix, speed_km_per_hour, 0, service_time_min)
+
+    inner_routes = [[local[node] for node in route] for route in inner_routes]
+    inner_routes = _cheapest_insertion(cost_matrix, inner_routes, [local[node] for node in insert_nodes], locked,
+                                       0, demands, vehicle_capacities)
+
+    manager, routing, time_dimension = _build_model(cost_matrix, num_vehicles, 0, time_matrix, time_windows,
+                                                    demands, vehicle_capacities)
+    # Khóa phần đã giao: mỗi nút trong tiền tố phải đi tiếp đúng nút kế tiếp như lộ trình cũ
+    solver = routing.solver()
+    for vehicle_id, (route, count) in enumerate(zip(inner_routes, locked)):
+        chain = [routing.Start(vehicle_id)] + [manager.NodeToIndex(node) for node in route[:count]]
+        for a, b in zip(chain[:-1], chain[1:]):
+            solver.Add(routing.NextVar(a) == b)
+
+    with span('routing.reoptimize_solve'):
+        search_parameters = _search_parameters(metaheuristic=metaheuristic, time_limit_s=time_limit_s)
+        initial = routing.ReadAssignmentFromRoutes(inner_routes, True)
+        if initial is not None:
+            solution = routing.SolveFromAssignmentWithParameters(initial, search_parameters)
+        else:
+            # Lời giải chèn không thỏa khung giờ/tải trọng: để solver tự dựng lời giải đầu (vẫn giữ phần đã khóa)
+            solution = routing.SolveWithParameters(search_parameters)
+    if solution is None:
+        raise ValueError("Không tìm thấy giải pháp khi tái tối ưu! Kiểm tra khung giờ hoặc tải trọng.")
+
+    sub_routes, arrival_times = _extract_routes(manager, routing, solution, time_dimension, num_vehicles)
+    if arrival_times is None:
+        arrival_times = traffic_etas(sub_routes, sub_matrix, sub_locations, speed_km_per_hour, departure)
+    route_details, total_distance = build_route_details(sub_routes, adjusted_matrix, speed_km_per_hour,
+                                                        arrival_times)
+    new_routes = [[int(active[node]) for node in route] for route in sub_routes]
+    for detail, route in zip(route_details, new_routes):
+        detail['nodes'] = route
+    return new_routes, route_details, total_distance
@@ -0,0 +1,390 @@
+import argparse
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import instrumentation
+from instrumentation import span
+from route_cache import RouteCache, SOLVER_COLUMNS
+
+# Dịch vụ định tuyến HTTP/JSON chạy tách khỏi Streamlit: mỗi yêu cầu giải thành một job trong hàng đợi có giới hạn,
+# được một nhóm tiến trình giải (solver giữ GIL nên dùng tiến trình thay vì luồng). Yêu cầu trùng nội dung
+# dùng chung một job / kết quả đã cache; client gửi job rồi hỏi trạng thái (có long-poll bằng ?wait=giây).
+#   POST /jobs          -> 202 {"id", "status", "deduplicated"} | 400 dữ liệu sai | 503 hàng đợi đầy
+#   GET  /jobs/<id>     -> {"id", "status": queued|running|done|failed, "result"?, "error"?}
+#   GET  /health        -> số worker, độ dài hàng đợi, số job
+#
+# Triển khai (app.py chọn theo biến môi trường):
+#   - ROUTING_SERVICE_INPROCESS=1: dịch vụ chạy ngay trong tiến trình web (luồng HTTP trên 127.0.0.1, cổng tự chọn,
+#     cùng hàng đợi và nhóm tiến trình giải). Tùy chọn khi chỉ có một tiến trình web (dòng web: trong Procfile)
+#   - ROUTING_SERVICE_URL=http://host:port: dịch vụ chạy riêng (python routing_service.py --host 0.0.0.0 --port N,
+#     hoặc ROUTING_HOST/ROUTING_PORT) trên máy/container mà tiến trình web truy cập được qua mạng nội bộ. Trên
+#     nền tảng kiểu Heroku, tiến trình không phải web không nhận cổng và không truy cập được từ web dyno, nên
+#     dịch vụ phải là một app web riêng (cổng $PORT) và ROUTING_SERVICE_URL trỏ tới địa chỉ của app đó
+#   - Không đặt biến nào (mặc định của Procfile): giải đồng bộ trong phiên Streamlit
+#   ROUTING_WORKERS: số tiến trình giải (mặc định số CPU - 1); ROUTE_CACHE_DIR: thư mục cache lời giải trên đĩa,
+#   ROUTE_CACHE_DISK_MB: dung lượng tối đa của thư mục đó (mặc định 512, xóa lời giải ít dùng nhất khi vượt)
+
+DEFAULT_PORT = 8502
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+DEFAULT_QUEUE_SIZE = 64
+MAX_JOBS = 1024  # Số job giữ lại để hỏi trạng thái / khử trùng; job đã xong cũ nhất bị bỏ trước
+MAX_WAIT_S = 30.0
+CLUSTER_KEYS = ('max_stops_per_cluster', 'vehicles_per_cluster', 'method', 'improve')
+
+
+class ServiceBusy(Exception):
+    pass
+
+
+def _jsonable(value):
+    if isinstance(value, dict):
+        return {key: _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+# Payload của một job: tọa độ (và cột khung giờ/nhu cầu nếu có), cách tính khoảng cách, tham số solver
+# và tùy chọn chia cụm (None = giải trên ma trận toàn bộ)
+def build_job_payload(df_locations, metric='euclidean', clustering=None, **solver_options):
+    columns = ['name', 'lat', 'lon'] + [column for column in SOLVER_COLUMNS if column in df_locations.columns]
+    return _jsonable({
+        'locations': {column: df_locations[column].tolist() for column in columns},
+        'metric': metric,
+        'clustering': clustering,
+        'options': solver_options,
+    })
+
+
+def job_key(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def validate_payload(payload):
+    if not isinstance(payload, dict) or not isinstance(payload.get('locations'), dict):
+        raise ValueError("Payload phải có trường locations!")
+    locations = payload['locations']
+    if 'lat' not in locations or 'lon' not in locations:
+        raise ValueError("locations phải có lat và lon!")
+    if len(locations['lat']) != len(locations['lon']) or len(locations['lat']) < 2:
+        raise ValueError("Cần ít nhất depot và một điểm giao, lat/lon cùng độ dài!")
+    if payload.get('metric', 'euclidean') not in ('euclidean', 'haversine', 'road'):
+        raise ValueError(f"Cách tính khoảng cách không hợp lệ: {payload.get('metric')}")
+    clustering = payload.get('clustering')
+    if clustering is not None and set(clustering) - set(CLUSTER_KEYS):
+        raise ValueError(f"Tùy chọn chia cụm không hợp lệ: {sorted(set(clustering) - set(CLUSTER_KEYS))}")
+
+
+# Giải một job; hàm cấp module để chạy trong ProcessPoolExecutor. Thư viện nặng chỉ nạp trong tiến trình worker
+def solve_job(payload):
+    import pandas as pd
+    from distance_engine import build_distance_matrix
+
+    df_locations = pd.DataFrame(payload['locations'])
+    if 'name' not in df_locations.columns:
+        df_locations['name'] = [str(i) for i in range(len(df_locations))]
+    metric = payload.get('metric', 'euclidean')
+    options = dict(payload.get('options') or {})
+    if options.get('time_windows') is not None:
+        options['time_windows'] = [tuple(window) for window in options['time_windows']]
+
+    start = time.perf_counter()
+    # Thời gian từng công đoạn (routing.arc_costs, routing.solve...) đo trong worker, trả về cùng kết quả
+    with instrumentation.collect() as stages:
+        if payload.get('clustering') is not None:
+            from decomposition import optimize_route_clustered
+
+            clustering = dict(payload['clustering'])
+            options.pop('num_vehicles', None)
+            options.pop('num_restarts', None)
+            with span('optimize_route'):
+                routes, route_details, total_distance = optimize_route_clustered(df_locations, metric=metric,
+                                                                                 **clustering, **options)
+        else:
+            from routing import optimize_route
+
+            with span('distance_matrix'):
+                distance_matrix = build_distance_matrix(df_locations['lat'].to_numpy(),
+                                                        df_locations['lon'].to_numpy(), metric=metric)
+            with span('optimize_route'):
+                routes, route_details, total_distance = optimize_route(distance_matrix, df_locations, **options)
+    return _jsonable({'routes': routes, 'route_details': route_details, 'total_distance': total_distance,
+                      'solve_s': time.perf_counter() - start, 'stages': stages})
+
+
+# Hàng đợi job + nhóm worker. Mỗi worker là một luồng điều phối lấy job từ hàng đợi và giải trên
+# ProcessPoolExecutor cùng kích thước, nên số lời giải chạy đồng thời không vượt quá num_workers
+class RoutingService:
+    def __init__(self, num_workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE, max_jobs=MAX_JOBS,
+                 cache=None, solver=solve_job):
+        self.num_workers = num_workers
+        self.max_jobs = max_jobs
+        self.cache = cache if cache is not None else RouteCache(max_entries=256)
+        self._solver = solver
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._jobs = OrderedDict()  # id -> job
+        self._by_key = {}           # khóa nội dung -> id của job đang chờ/đang giải/đã xong
+        self._lock = threading.Lock()
+        self._executor = ProcessPoolExecutor(max_workers=num_workers)
+        self._threads = [threading.Thread(target=self._work, name=f"routing-worker-{i}", daemon=True)
+                         for i in range(num_workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _new_job(self, key, status='queued', result=None):
+        return {'id': uuid.uuid4().hex, 'key': key, 'status': status, 'created': time.time(), 'started': None,
+                'finished': None, 'result': result, 'error': None, 'event': threading.Event()}
+
+    def _register(self, job):
+        self._jobs[job['id']] = job
+        self._by_key[job['key']] = job['id']
+        # Bỏ các job đã kết thúc cũ nhất khi vượt giới hạn (job đang chờ/đang giải luôn được giữ)
+        if len(self._jobs) > self.max_jobs:
+            for job_id in [job_id for job_id, old in self._jobs.items() if old['status'] in ('done', 'failed')]:
+                if len(self._jobs) <= self.max_jobs:
+                    break
+                old = self._jobs.pop(job_id)
+                if self._by_key.get(old['key']) == job_id:
+                    del self._by_key[old['key']]
+
+    # Nhận một job; trả về (job, deduplicated). Job trùng nội dung với job chưa thất bại được dùng lại
+    def submit(self, payload):
+        validate_payload(payload)
+        key = job_key(payload)
+        with self._lock:
+            existing = self._jobs.get(self._by_key.get(key))
+            if existing is not None and existing['status'] != 'failed':
+                return existing, True
+            cached = self.cache.get(key)
+            if cached is not None:
+                job = self._new_job(key, 'done', cached)
+                job['finished'] = job['created']
+                job['event'].set()
+                self._register(job)
+                return job, True
+            job = self._new_job(key)
+            job['payload'] = payload
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise ServiceBusy("Hàng đợi định tuyến đã đầy, thử lại sau.")
+            self._register(job)
+            return job, False
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                job['status'] = 'running'
+                job['started'] = time.time()
+            try:
+                result = self._executor.submit(self._solver, job.pop('payload')).result()
+                self.cache.put(job['key'], result)
+                status, error = 'done', None
+            except Exception as e:
+                result, status, error = None, 'failed', str(e)
+            with self._lock:
+                job.update(status=status, result=result, error=error, finished=time.time())
+            job['event'].set()
+
+    # Trạng thái job (không gồm dữ liệu nội bộ); wait > 0 chờ tối đa wait giây cho đến khi job kết thúc
+    def job(self, job_id, wait=0.0):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if wait > 0:
+            job['event'].wait(min(wait, MAX_WAIT_S))
+        with self._lock:
+            view = {key: job[key] for key in ('id', 'status', 'created', 'started', 'finished', 'error')}
+            if job['status'] == 'done':
+                view['result'] = job['result']
+            if job['status'] == 'queued':
+                view['queue_length'] = self._queue.qsize()
+            return view
+
+    def health(self):
+        with self._lock:
+            statuses = [job['status'] for job in self._jobs.values()]
+        return {'workers': self.num_workers, 'queue_length': self._queue.qsize(),
+                'queue_capacity': self._queue.maxsize, 'running': statuses.count('running'),
+                'jobs': len(statuses), 'cache': self.cache.stats()}
+
+    def shutdown(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _ServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/jobs':
+            return self._send(404, {'error': 'Not found'})
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'null')
+            job, deduplicated = self.server.service.submit(payload)
+        except ServiceBusy as e:
+            return self._send(503, {'error': str(e)}, {'Retry-After': '1'})
+        except (ValueError, TypeError) as e:
+            return self._send(400, {'error': str(e)})
+        self._send(202, {'id': job['id'], 'status': job['status'], 'deduplicated': deduplicated},
+                   {'Location': f"/jobs/{job['id']}"})
+
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        if path == '/health':
+            return self._send(200, self.server.service.health())
+        if path.startswith('/jobs/'):
+            params = dict(part.split('=', 1) for part in query.split('&') if '=' in part)
+            try:
+                wait = float(params.get('wait', 0))
+            except ValueError:
+                return self._send(400, {'error': 'wait phải là số giây'})
+            job = self.server.service.job(path[len('/jobs/'):], wait=wait)
+            return self._send(200, job) if job is not None else self._send(404, {'error': 'Job không tồn tại'})
+        self._send(404, {'error': 'Not found'})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host='127.0.0.1', port=DEFAULT_PORT, **service_kwargs):
+    server = ThreadingHTTPServer((host, port), _ServiceHandler)
+    server.daemon_threads = True
+    server.service = RoutingService(**service_kwargs)
+    return server
+
+
+# Chạy dịch vụ trong tiến trình hiện tại ở luồng nền (port=0: hệ điều hành chọn cổng trống); trả về server,
+# địa chỉ thực ở server.server_address
+def start_in_background(host='127.0.0.1', port=0, **service_kwargs):
+    server = serve(host, port, **service_kwargs)
+    threading.Thread(target=server.serve_forever, name='routing-service', daemon=True).start()
+    return server
+
+
+# Client mỏng cho UI: gửi job, hỏi trạng thái (long-poll), hoặc chờ đến khi có kết quả
+class RoutingServiceClient:
+    def __init__(self, base_url, timeout=10.0):
+        import requests
+
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def _check(self, response):
+        if response.status_code == 503:
+            raise ServiceBusy(response.json().get('error', response.text))
+        if response.status_code >= 400:
+            try:
+                message = response.json().get('error', response.text)
+            except ValueError:
+                message = response.text
+            raise ValueError(f"Dịch vụ định tuyến trả lỗi {response.status_code}: {message}")
+        return response.json()
+
+    def submit(self, payload):
+        return self._check(self._session.post(f"{self.base_url}/jobs", json=payload, timeout=self.timeout))
+
+    def job(self, job_id, wait=0.0):
+        return self._check(self._session.get(f"{self.base_url}/jobs/{job_id}", params={'wait': wait},
+                                             timeout=self.timeout + wait))
+
+    def health(self):
+        return self._check(self._session.get(f"{self.base_url}/health", timeout=self.timeout))
+
+    # Gửi và chờ kết quả (chặn tối đa timeout giây); trả về (routes, route_details, total_distance)
+    # Hàng đợi đầy thì gửi lại sau một giây cho đến hết thời hạn
+    def solve(self, payload, timeout=None, poll_wait=5.0):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                job = self.submit(payload)
+                break
+            except ServiceBusy:
+                if deadline is not None and time.monotonic() + 1.0 >= deadline:
+                    raise
+                time.sleep(1.0)
+        while True:
+            remaining = poll_wait if deadline is None else min(poll_wait, deadline - time.monotonic())
+            job = self.job(job['id'], wait=max(0.0, remaining))
+            if job['status'] in ('done', 'failed'):
+                return job_result(job)
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Job {job['id']} chưa xong sau {timeout} giây")
+
+
+# Ghi thời gian giải của job đã xong (solve_s và từng công đoạn đo trong worker) vào instrumentation của tiến trình
+# gọi, để panel debug / Prometheus có số liệu như khi giải tại chỗ. Job lấy thẳng từ cache (không giải) bị bỏ qua
+def observe_job(job):
+    if job.get('status') != 'done' or job.get('started') is None:
+        return
+    result = job.get('result') or {}
+    if 'solve_s' in result:
+        instrumentation.observe('routing_service.solve', result['solve_s'])
+    for name, seconds in (result.get('stages') or {}).items():
+        instrumentation.observe(name, seconds)
+
+
+# Kết quả của job đã xong ở dạng optimize_route trả về; job thất bại ném ValueError
+def job_result(job):
+    if job['status'] == 'failed':
+        raise ValueError(job['error'])
+    result = job['result']
+    return result['routes'], result['route_details'], result['total_distance']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dịch vụ định tuyến HTTP/JSON")
+    parser.add_argument('--host', default=os.environ.get('ROUTING_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('ROUTING_PORT', DEFAULT_PORT)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('ROUTING_WORKERS', DEFAULT_WORKERS)))
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE)
+    parser.add_argument('--cache-dir', default=os.environ.get('ROUTE_CACHE_DIR'))
+    parser.add_argument('--cache-disk-mb', type=int, default=int(os.environ.get('ROUTE_CACHE_DISK_MB', 512)))
+    args = parser.parse_args(argv)
+
+    server = serve(args.host, args.port, num_workers=args.workers, queue_size=args.queue_size,
+                   cache=RouteCache(max_entries=256, max_bytes=128 * 1024 * 1024, disk_dir=args.cache_dir,
+                                    max_disk_bytes=args.cache_disk_mb * 1024 * 1024))
+    print(f"Dịch vụ định tuyến: http://{args.host}:{args.port} ({args.workers} worker)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.service.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,10 @@ import networkx as nx
 import matplotlib.pyplot as plt
 import numpy as np
 import random
+from green_routing import GreenRouter
+from logistics_graph import LogisticsGraph
 from scipy.stats import linregress
+from telemetry import collect_simulated
 
 # Tạo đồ thị logistics
 G = nx.Graph()
@@ -27,37 +30,31 @@ edges = [
 ]
 G.add_edges_from(edges)
 
-# Hàm tính chi phí tuyến đường
-def path_cost(path):
-    total_distance = 0
-    total_emissions = 0
-    for i in range(len(path) - 1):
-        edge_data = G.get_edge_data(path[i], path[i+1])
-        total_distance += edge_data['distance']
-        total_emissions += edge_data['distance'] * edge_data['emissions_factor']
-    return total_distance, total_emissions
+# Đồ thị CSR gọn (đỉnh số nguyên, quãng đường/phát thải trong mảng NumPy) để tính chi phí tuyến theo lô
+graph = LogisticsGraph.from_edges(edges, locations)
 
 # Tuyến truyền thống
 traditional_path = ['Hanoi', 'Hai Phong', 'Da Nang', 'HCMC', 'Cai Mep Port']
-trad_distance, trad_emissions = path_cost(traditional_path)
 
-# Tuyến tối ưu hóa bằng A*
-def emissions_heuristic(u, v):
-    return 0  # Heuristic đơn giản
-optimized_path = nx.astar_path(G, source='Hanoi', target='Cai Mep Port',
-                               heuristic=emissions_heuristic, weight=lambda u, v, d: d['distance'] * d['emissions_factor'])
-opt_distance, opt_emissions = path_cost(optimized_path)
+# Tuyến tối ưu hóa bằng A* với cận dưới landmark (ALT) trên trọng số phát thải
+router = GreenRouter(graph)
+optimized_path, _, _ = router.shortest_path('Hanoi', 'Cai Mep Port', objective='emissions')
+# Tập Pareto quãng đường / phát thải để cân nhắc đánh đổi
+pareto_routes = router.pareto_paths('Hanoi', 'Cai Mep Port')
+(trad_distance, opt_distance), (trad_emissions, opt_emissions) = graph.path_costs([traditional_path, optimized_path])
 
 # Tính tiết kiệm
 distance_savings = (trad_distance - opt_distance) / trad_distance * 100
 emissions_savings = (trad_emissions - opt_emissions) / trad_emissions * 100
 
-# IoT simulation: 50 xe tải
+# IoT: 50 xe tải, dữ liệu đọc từ bộ đệm vòng telemetry (nguồn giả lập cục bộ thay cho feed thật)
 num_trucks = 50
-iot_fuel = np.random.normal(30, 5, num_trucks)  # Trước tối ưu
-iot_fuel_opt = iot_fuel * (1 - 0.15)  # Sau tối ưu
-iot_temp = np.random.normal(25, 5, num_trucks)
-iot_humidity = np.random.normal(60, 10, num_trucks)
+telemetry_before = collect_simulated(num_trucks)  # Trước tối ưu
+telemetry_after = collect_simulated(num_trucks, fuel_factor=1 - 0.15)  # Sau tối ưu
+iot_fuel = telemetry_before.truck_means('fuel')
+iot_fuel_opt = telemetry_after.truck_means('fuel')
+iot_temp = telemetry_after.truck_means('temp')
+iot_humidity = telemetry_after.truck_means('humidity')
 
 # AI Demand Forecasting: 24 tháng
 time = np.arange(1, 25)
@@ -89,7 +86,13 @@ print(f"Distance: {trad_distance:.2f} km, Emissions: {trad_emissions:.2f} kg CO2
 print("Optimized Route:", optimized_path)
 print(f"Distance: {opt_distance:.2f} km, Emissions: {opt_emissions:.2f} kg CO2")
 print(f"Savings: Distance {distance_savings:.2f}%, Emissions {emissions_savings:.2f}%")
-print(f"IoT Data (Average): Fuel Before {iot_fuel.mean():.2f} L/100km, After {iot_fuel_opt.mean():.2f} L/100km")
+print("Pareto Routes (Distance vs Emissions):")
+for route in pareto_routes:
+    print(f"  {route['path']}: {route['distance']:.2f} km, {route['emissions']:.2f} kg CO2")
+print(f"IoT Data (Average): Fuel Before {telemetry_before.mean('fuel'):.2f} L/100km, "
+      f"After {telemetry_after.mean('fuel'):.2f} L/100km")
+print(f"IoT Excursions: Temperature {telemetry_after.excursions('temp')}, "
+      f"Humidity {telemetry_after.excursions('humidity')} of {telemetry_after.count.sum()} readings")
 print(f"Demand Forecast Month 25: {forecast_month_25:.2f} units")
 print("Blockchain Log Sample:", blockchain_log[:3])
 print(f"Reverse Logistics: Recovered {recovered:.0f} tons, Revenue {revenue_from_recovery:.0f} million VND")
@@ -21,31 +21,73 @@ locations = [
     {"name": "Customer14", "lat": 10.783, "lon": 106.704},
 ]
 
-# Ma trận khoảng cách (km, giả lập)
-np.random.seed(42)
-num_locations = len(locations)
-distance_matrix = np.random.randint(1, 10, size=(num_locations, num_locations))
-distance_matrix = (distance_matrix + distance_matrix.T) // 2  # Đối xứng
-np.fill_diagonal(distance_matrix, 0)
-
-# Dữ liệu time-series cho ETA (365 ngày)
-start_date = datetime(2024, 1, 1)
-dates = [start_date + timedelta(days=i) for i in range(365)]
-delivery_times = np.random.normal(30, 5, 365) + np.sin(np.arange(365)/365*2*np.pi)*10  # Phút, có mùa vụ
-weather = np.random.choice(['Sunny', 'Rainy'], size=365, p=[0.7, 0.3])  # Giả lập thời tiết
-weather_effect = np.where(weather == 'Rainy', 1.2, 1.0)  # Mưa tăng 20% thời gian
-delivery_times *= weather_effect
-
-# Lưu dữ liệu time-series
-df_time_series = pd.DataFrame({
-    'date': dates,
-    'delivery_time': delivery_times,
-    'weather': weather
-})
-df_time_series.to_csv('train.csv', index=False)
-
-# Lưu dữ liệu vị trí và khoảng cách
-df_locations = pd.DataFrame(locations)
-df_locations.to_csv('locations.csv', index=False)
-pd.DataFrame(distance_matrix, columns=[loc['name'] for loc in locations], index=[loc['name'] for loc in locations]).to_csv('distance_matrix.csv')
-print("Dữ liệu giả lập đã tạo: train.csv, locations.csv, distance_matrix.csv")
\ No newline at end of file
+DEPOT_LAT, DEPOT_LON = 10.776, 106.700
+
+
+# Bộ sinh dữ liệu có seed cho benchmark và thử nghiệm quy mô lớn (cùng seed -> cùng dữ liệu)
+
+# Depot ở dòng 0 và num_stops điểm giao rải đều trong bán kính radius_deg quanh depot
+def generate_locations(num_stops, seed=0, radius_deg=0.05, center=(DEPOT_LAT, DEPOT_LON)):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'name': ['Depot'] + [f"Customer{i + 1}" for i in range(num_stops)],
+        'lat': np.r_[center[0], center[0] + rng.uniform(-radius_deg, radius_deg, num_stops)],
+        'lon': np.r_[center[1], center[1] + rng.uniform(-radius_deg, radius_deg, num_stops)],
+    })
+
+# Chuỗi thời gian giao hàng có mùa vụ và ảnh hưởng thời tiết (như train.csv)
+def generate_time_series(num_days=365, seed=0, start_date=datetime(2024, 1, 1)):
+    rng = np.random.default_rng(seed)
+    weather = rng.choice(['Sunny', 'Rainy'], size=num_days, p=[0.7, 0.3])
+    delivery_times = rng.normal(30, 5, num_days) + np.sin(np.arange(num_days) / 365 * 2 * np.pi) * 10
+    delivery_times *= np.where(weather == 'Rainy', 1.2, 1.0)
+    return pd.DataFrame({
+        'date': pd.date_range(start_date, periods=num_days, freq='D'),
+        'delivery_time': delivery_times,
+        'weather': weather,
+    })
+
+# Mạng đường dạng lưới ~num_nodes đỉnh (nối 4 hướng), quãng đường và hệ số phát thải ngẫu nhiên.
+# Trả về (danh sách đỉnh, danh sách cạnh (u, v, thuộc tính)) dùng được cho networkx và LogisticsGraph.from_edges
+def generate_road_network(num_nodes, seed=0, distance_range=(1.0, 10.0), emission_factors=(0.05, 0.15, 0.2)):
+    rng = np.random.default_rng(seed)
+    side = max(2, int(np.ceil(np.sqrt(num_nodes))))
+    ids = np.arange(side * side).reshape(side, side)
+    sources = np.r_[ids[:, :-1].ravel(), ids[:-1, :].ravel()]
+    targets = np.r_[ids[:, 1:].ravel(), ids[1:, :].ravel()]
+    distances = rng.uniform(*distance_range, len(sources)).round(2)
+    factors = rng.choice(emission_factors, len(sources))
+    edges = [(u, v, {'distance': d, 'emissions_factor': f})
+             for u, v, d, f in zip(sources.tolist(), targets.tolist(), distances.tolist(), factors.tolist())]
+    return list(range(side * side)), edges
+
+
+if __name__ == '__main__':
+    # Ma trận khoảng cách (km, giả lập)
+    np.random.seed(42)
+    num_locations = len(locations)
+    distance_matrix = np.random.randint(1, 10, size=(num_locations, num_locations))
+    distance_matrix = (distance_matrix + distance_matrix.T) // 2  # Đối xứng
+    np.fill_diagonal(distance_matrix, 0)
+
+    # Dữ liệu time-series cho ETA (365 ngày)
+    start_date = datetime(2024, 1, 1)
+    dates = [start_date + timedelta(days=i) for i in range(365)]
+    delivery_times = np.random.normal(30, 5, 365) + np.sin(np.arange(365)/365*2*np.pi)*10  # Phút, có mùa vụ
+    weather = np.random.choice(['Sunny', 'Rainy'], size=365, p=[0.7, 0.3])  # Giả lập thời tiết
+    weather_effect = np.where(weather == 'Rainy', 1.2, 1.0)  # Mưa tăng 20% thời gian
+    delivery_times *= weather_effect
+
+    # Lưu dữ liệu time-series
+    df_time_series = pd.DataFrame({
+        'date': dates,
+        'delivery_time': delivery_times,
+        'weather': weather
+    })
+    df_time_series.to_csv('train.csv', index=False)
+
+    # Lưu dữ liệu vị trí và khoảng cách
+    df_locations = pd.DataFrame(locations)
+    df_locations.to_csv('locations.csv', index=False)
+    pd.DataFrame(distance_matrix, columns=[loc['name'] for loc in locations], index=[loc['name'] for loc in locations]).to_csv('distance_matrix.csv')
+    print("Dữ liệu giả lập đã tạo: train.csv, locations.csv, distance_matrix.csv")
@@ -0,0 +1,194 @@
+import asyncio
+
+import numpy as np
+
+FIELDS = ('fuel', 'temp', 'humidity')  # Nhiên liệu (L/100km), nhiệt độ (°C), độ ẩm (%)
+# Ngưỡng cho phép; giá trị ngoài ngưỡng được tính là một lần vượt ngưỡng (excursion)
+DEFAULT_LIMITS = {'temp': (15.0, 35.0), 'humidity': (40.0, 80.0)}
+DEFAULT_WINDOW = 256
+RESYNC_EVERY = 1_000_000  # Số lần ghi trước khi tính lại tổng từ bộ đệm để chặn sai số cộng dồn
+
+
+# Bộ đệm vòng cho toàn đội xe: mỗi xe một cửa sổ cố định các lần đọc gần nhất, cấp phát sẵn trong một mảng
+# (xe x cửa sổ x trường). Tổng và số lần vượt ngưỡng được cập nhật tăng dần khi ghi đè, nên trung bình
+# cửa sổ của một xe hoặc của cả đội được truy vấn trong O(1)
+class TelemetryBuffer:
+    def __init__(self, num_trucks, window=DEFAULT_WINDOW, fields=FIELDS, limits=None):
+        self.num_trucks = num_trucks
+        self.window = window
+        self.fields = tuple(fields)
+        self._field_index = {field: i for i, field in enumerate(self.fields)}
+        limits = DEFAULT_LIMITS if limits is None else limits
+        num_fields = len(self.fields)
+        self._low = np.array([limits.get(field, (-np.inf, np.inf))[0] for field in self.fields])
+        self._high = np.array([limits.get(field, (-np.inf, np.inf))[1] for field in self.fields])
+
+        self.values = np.zeros((num_trucks, window, num_fields), dtype=np.float64)
+        self.timestamps = np.zeros((num_trucks, window), dtype=np.float64)
+        self.head = np.zeros(num_trucks, dtype=np.int64)    # Vị trí ghi tiếp theo của mỗi xe
+        self.count = np.zeros(num_trucks, dtype=np.int64)   # Số lần đọc đang có trong cửa sổ
+        self.total_readings = 0
+
+        self._sums = np.zeros((num_trucks, num_fields))
+        self._excursions = np.zeros((num_trucks, num_fields), dtype=np.int64)
+        self._fleet_sums = np.zeros(num_fields)
+        self._fleet_excursions = np.zeros(num_fields, dtype=np.int64)
+        self._fleet_count = 0
+        self._writes_since_resync = 0
+
+    def _outside(self, values):
+        return (values < self._low) | (values > self._high)
+
+    # Ghi một lô lần đọc: truck_ids (n,), values (n, số trường), timestamps (n,).
+    # Một xe có thể xuất hiện nhiều lần trong lô; các lần đọc được ghi theo thứ tự xuất hiện
+    def ingest(self, truck_ids, values, timestamps=None):
+        truck_ids = np.asarray(truck_ids, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64).reshape(len(truck_ids), len(self.fields))
+        timestamps = np.zeros(len(truck_ids)) if timestamps is None else np.asarray(timestamps, np.float64)
+        if len(truck_ids) and (truck_ids.min() < 0 or truck_ids.max() >= self.num_trucks):
+            raise ValueError(f"Mã xe phải nằm trong [0, {self.num_trucks})")
+
+        # Thứ hạng xuất hiện của mỗi lần đọc trong cùng xe; mỗi vòng ghi tối đa một lần đọc cho mỗi xe
+        order = np.argsort(truck_ids, kind='stable')
+        sorted_ids = truck_ids[order]
+        group_start = np.r_[0, np.flatnonzero(np.diff(sorted_ids)) + 1] if len(sorted_ids) else np.array([], int)
+        ranks = np.empty(len(truck_ids), dtype=np.int64)
+        ranks[order] = np.arange(len(sorted_ids)) - np.repeat(group_start, np.diff(np.r_[group_start, len(sorted_ids)]))
+        if not len(ranks):
+            return
+        if ranks.max() < self.window:
+            # Trường hợp thường gặp: mỗi xe có ít hơn window lần đọc trong lô, các vị trí ghi không trùng nhau
+            self._write(truck_ids, values, timestamps, ranks)
+        else:
+            for rank in range(int(ranks.max()) + 1):
+                selected = ranks == rank
+                self._write(truck_ids[selected], values[selected], timestamps[selected], 0)
+
+        self._writes_since_resync += len(truck_ids)
+        if self._writes_since_resync >= RESYNC_EVERY:
+            self.resync()
+
+    def _write(self, trucks, values, timestamps, ranks):
+        slots = (self.head[trucks] + ranks) % self.window
+        full = self.count[trucks] + ranks >= self.window  # Vị trí ghi đang chứa một lần đọc cũ
+        old = np.where(full[:, None], self.values[trucks, slots], 0.0)
+        old_outside = self._outside(old) & full[:, None]
+        new_outside = self._outside(values)
+
+        delta = values - old
+        delta_outside = new_outside.astype(np.int64) - old_outside
+        for i in range(len(self.fields)):
+            self._sums[:, i] += np.bincount(trucks, weights=delta[:, i], minlength=self.num_trucks)
+            self._excursions[:, i] += np.bincount(trucks, weights=delta_outside[:, i],
+                                                  minlength=self.num_trucks).astype(np.int64)
+        self._fleet_sums += delta.sum(axis=0)
+        self._fleet_excursions += new_outside.sum(axis=0) - old_outside.sum(axis=0)
+        self._fleet_count += int((~full).sum())
+
+        self.values[trucks, slots] = values
+        self.timestamps[trucks, slots] = timestamps
+        written = np.bincount(trucks, minlength=self.num_trucks)
+        self.head = (self.head + written) % self.window
+        self.count = np.minimum(self.count + written, self.window)
+        self.total_readings += len(trucks)
+
+    # Tính lại các tổng từ dữ liệu trong bộ đệm (loại bỏ sai số dấu phẩy động tích lũy)
+    def resync(self):
+        valid = np.arange(self.window)[None, :] < self.count[:, None]
+        # Khi cửa sổ chưa đầy, dữ liệu nằm ở các vị trí [0, count) vì head bắt đầu từ 0
+        masked = np.where(valid[:, :, None], self.values, 0.0)
+        self._sums = masked.sum(axis=1)
+        self._excursions = (self._outside(self.values) & valid[:, :, None]).sum(axis=1)
+        self._fleet_sums = self._sums.sum(axis=0)
+        self._fleet_excursions = self._excursions.sum(axis=0)
+        self._fleet_count = int(self.count.sum())
+        self._writes_since_resync = 0
+
+    # Trung bình cửa sổ của một trường: cho một xe hoặc cả đội (O(1))
+    def mean(self, field, truck=None):
+        i = self._field_index[field]
+        if truck is None:
+            return self._fleet_sums[i] / self._fleet_count if self._fleet_count else np.nan
+        count = self.count[truck]
+        return self._sums[truck, i] / count if count else np.nan
+
+    # Số lần đọc vượt ngưỡng trong cửa sổ: cho một xe hoặc cả đội (O(1))
+    def excursions(self, field, truck=None):
+        i = self._field_index[field]
+        if truck is None:
+            return int(self._fleet_excursions[i])
+        return int(self._excursions[truck, i])
+
+    # Trung bình cửa sổ của từng xe (mảng num_trucks), dùng cho biểu đồ toàn đội
+    def truck_means(self, field):
+        i = self._field_index[field]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._sums[:, i] / self.count
+
+    # Các lần đọc của một xe theo thứ tự thời gian (cũ -> mới)
+    def history(self, truck, field=None):
+        count = self.count[truck]
+        start = (self.head[truck] - count) % self.window
+        slots = (start + np.arange(count)) % self.window
+        values = self.values[truck, slots]
+        return values if field is None else values[:, self._field_index[field]]
+
+    def latest(self, truck):
+        if not self.count[truck]:
+            return None
+        slot = (self.head[truck] - 1) % self.window
+        return dict(zip(self.fields, self.values[truck, slot].tolist()), timestamp=self.timestamps[truck, slot])
+
+
+# Nguồn dữ liệu giả lập chạy cục bộ thay cho feed thật: sinh lô lần đọc ngẫu nhiên cho num_trucks xe.
+# fuel_factor < 1 mô phỏng mức tiêu thụ sau tối ưu tuyến
+async def simulated_feed(num_trucks, num_batches, batch_size=None, interval=0.0, fuel_factor=1.0, seed=None,
+                         fuel=(30, 5), temp=(25, 5), humidity=(60, 10)):
+    rng = np.random.default_rng(seed)
+    batch_size = batch_size or num_trucks
+    for batch in range(num_batches):
+        if batch_size == num_trucks:
+            trucks = np.arange(num_trucks)
+        else:
+            trucks = rng.integers(0, num_trucks, batch_size)
+        readings = np.column_stack([
+            rng.normal(*fuel, len(trucks)) * fuel_factor,
+            rng.normal(*temp, len(trucks)),
+            rng.normal(*humidity, len(trucks)),
+        ])
+        yield trucks, readings, np.full(len(trucks), float(batch))
+        if interval:
+            await asyncio.sleep(interval)
+
+
+# Bộ tiêu thụ asyncio: producer đẩy lô vào hàng đợi có giới hạn, consumer ghi vào bộ đệm vòng.
+# Hàng đợi đầy thì producer phải chờ (backpressure) thay vì làm tăng bộ nhớ
+class TelemetryConsumer:
+    def __init__(self, buffer, queue_size=64):
+        self.buffer = buffer
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.batches = 0
+
+    async def _produce(self, feed):
+        async for batch in feed:
+            await self.queue.put(batch)
+        await self.queue.put(None)
+
+    async def _consume(self):
+        while True:
+            batch = await self.queue.get()
+            if batch is None:
+                return
+            self.buffer.ingest(*batch)
+            self.batches += 1
+
+    async def run(self, feed):
+        await asyncio.gather(self._produce(feed), self._consume())
+        return self.buffer
+
+
+# Tiện ích đồng bộ cho script: nạp num_batches lô từ nguồn giả lập vào một bộ đệm mới
+def collect_simulated(num_trucks, num_batches=DEFAULT_WINDOW, window=DEFAULT_WINDOW, **feed_kwargs):
+    buffer = TelemetryBuffer(num_trucks, window=window)
+    asyncio.run(TelemetryConsumer(buffer).run(simulated_feed(num_trucks, num_batches, **feed_kwargs)))
+    return buffer
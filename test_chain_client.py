@@ -0,0 +1,81 @@
+import pytest
+
+pytest.importorskip('eth_tester')
+
+from chain_client import NonceManager
+
+
+def _pending(client):
+    return client.w3.eth.get_transaction_count(client.wallet_address, 'pending')
+
+
+def test_submit_many_sends_in_nonce_order(client):
+    updates = [{'id': f'ORD{i}', 'lat': 10.7 + i / 1000, 'lon': 106.7, 'status': 'In Transit'} for i in range(5)]
+    results = client.submit_many(updates)
+    assert [order_id for order_id, _, _ in results] == [u['id'] for u in updates]
+    assert all(error is None for _, _, error in results)
+    assert _pending(client) == 5
+
+
+# Tọa độ âm không mã hóa được thành uint256: đơn đó nhận lỗi riêng, không tốn nonce, các đơn khác vẫn được gửi
+def test_invalid_update_does_not_leave_nonce_gap(client):
+    updates = [
+        {'id': 'ORD1', 'lat': 10.7, 'lon': 106.7, 'status': 'In Transit'},
+        {'id': 'BAD', 'lat': -10.7, 'lon': 106.7, 'status': 'In Transit'},
+        {'id': 'ORD2', 'lat': 10.8, 'lon': 106.7, 'status': 'Delivered'},
+    ]
+    results = client.submit_many(updates)
+    errors = {order_id: error for order_id, _, error in results}
+    assert errors['ORD1'] is None and errors['ORD2'] is None
+    assert errors['BAD'] is not None
+    assert _pending(client) == 2
+
+    # Giao dịch tiếp theo dùng đúng nonce kế tiếp và được node nhận
+    tx_hash = client.update_order_status('ORD1', 'Delivered')
+    assert client.w3.eth.wait_for_transaction_receipt(tx_hash)['status'] == 1
+    assert _pending(client) == 3
+
+
+def test_failed_sign_releases_nonce(client):
+    with pytest.raises(Exception):
+        client.update_order_location_and_status('BAD', -1.0, 106.7, 'Pending')
+    tx_hash = client.update_order_location_and_status('ORD1', 10.7, 106.7, 'Pending')
+    assert client.w3.eth.wait_for_transaction_receipt(tx_hash)['status'] == 1
+
+
+# Một lô JSON-RPC lỗi: các lô sau không được gửi (nonce cao hơn sẽ bị kẹt) và bộ cấp nonce được đồng bộ lại
+def test_failed_chunk_stops_later_chunks(client):
+    client.rpc_url = 'http://node.invalid'
+    client.batch_size = 2
+    sent = []
+
+    def send_batch(raw_transactions):
+        sent.append(len(raw_transactions))
+        if len(sent) == 1:
+            return [(b'\x01', None), (None, RuntimeError('nonce too low'))]
+        return [(b'\x02', None)] * len(raw_transactions)
+
+    client._send_batch = send_batch
+    updates = [{'id': f'ORD{i}', 'lat': 10.7, 'lon': 106.7, 'status': 'Pending'} for i in range(5)]
+    results = client.submit_many(updates)
+    assert sent == [2]
+    assert results[0][2] is None
+    assert all(error is not None for _, _, error in results[1:])
+    assert client.nonces._next_nonce is None
+
+
+# Nonce trả lại khi luồng khác đã cấp nonce lớn hơn: được cấp lại (nhỏ nhất trước), không đồng bộ lại với node
+def test_released_nonce_is_reused_without_duplicates():
+    fetches = []
+    nonces = NonceManager(lambda: fetches.append(1) or 7)
+    allocated = [nonces.allocate() for _ in range(4)]
+    assert allocated == [7, 8, 9, 10]
+    nonces.release(9)
+    nonces.release(8)
+    nonces.release(8)
+    assert [nonces.allocate() for _ in range(3)] == [8, 9, 11]
+    assert len(fetches) == 1
+
+    nonces.reset()
+    nonces.release(10)  # Cấp trước lần đặt lại: bị bỏ qua
+    assert nonces.allocate() == 7 and len(fetches) == 2
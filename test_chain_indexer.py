@@ -0,0 +1,134 @@
+import pytest
+
+pytest.importorskip('eth_tester')
+
+from chain_indexer import ChainIndexer
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'chain_index.sqlite')
+
+
+# Gửi từng cập nhật (mỗi giao dịch một block trên eth-tester) và chờ receipt
+def _submit(client, updates):
+    for order_id, lat, status in updates:
+        tx_hash = client.update_order_location_and_status(order_id, lat, 106.7, status)
+        assert client.w3.eth.wait_for_transaction_receipt(tx_hash)['status'] == 1
+
+
+def _indexer(client, db_path, **kwargs):
+    return ChainIndexer.from_client(client, path=db_path, confirmations=0, **kwargs)
+
+
+def test_sync_indexes_latest_status_per_order(client, db_path):
+    _submit(client, [('ORD1', 10.70, 'Pending'), ('ORD2', 10.80, 'Pending'), ('ORD1', 10.75, 'Delivered')])
+    indexer = _indexer(client, db_path)
+    assert indexer.sync() == 3
+    assert indexer.sync() == 0
+
+    statuses = indexer.statuses(['ORD1', 'ORD2', 'ORD3'])
+    assert set(statuses) == {'ORD1', 'ORD2'}
+    assert statuses['ORD1']['status'] == 'Delivered'
+    assert statuses['ORD1']['lat'] == pytest.approx(10.75)
+    assert [event['status'] for event in indexer.history('ORD1')] == ['Pending', 'Delivered']
+    assert indexer.status_counts() == {'Delivered': 1, 'Pending': 1}
+    indexer.close()
+
+
+# Dừng giữa chừng (max_batches) rồi mở lại: chạy tiếp từ checkpoint, không lập chỉ mục trùng
+def test_sync_resumes_from_checkpoint(client, db_path):
+    _submit(client, [(f'ORD{i}', 10.7, 'In Transit') for i in range(4)])
+    indexer = _indexer(client, db_path, batch_blocks=1)
+    first = indexer.sync(max_batches=3)
+    checkpoint = indexer.checkpoint()
+    indexer.close()
+
+    reopened = _indexer(client, db_path, batch_blocks=1)
+    assert reopened.checkpoint() == checkpoint
+    assert first + reopened.sync() == 4
+    assert reopened.stats()['events'] == 4
+    assert reopened.checkpoint() == client.w3.eth.block_number
+    reopened.close()
+
+
+# Node từ chối dải quá rộng: dải được chia đôi cho đến khi lấy được log
+def test_sync_halves_range_when_node_rejects_query(client, db_path):
+    _submit(client, [(f'ORD{i}', 10.7, 'Pending') for i in range(3)])
+    indexer = _indexer(client, db_path, batch_blocks=64)
+    fetch = indexer._fetch_logs
+    ranges = []
+
+    def limited_fetch(start, end):
+        ranges.append((start, end))
+        if end - start + 1 > 4:
+            raise ValueError('query returned more than 10000 results')
+        return fetch(start, end)
+
+    indexer._fetch_logs = limited_fetch
+    assert indexer.sync() == 3
+    assert all(end - start + 1 <= 4 for start, end in ranges[-2:])
+    indexer.close()
+
+
+# Rollback xóa sự kiện sau điểm rẽ nhánh và dựng lại trạng thái từ sự kiện còn lại
+def test_rollback_rebuilds_status_from_remaining_events(client, db_path):
+    _submit(client, [('ORD1', 10.70, 'Pending'), ('ORD2', 10.80, 'Pending')])
+    fork_block = client.w3.eth.block_number
+    _submit(client, [('ORD1', 10.75, 'Delivered'), ('ORD3', 10.90, 'Pending')])
+    indexer = _indexer(client, db_path)
+    indexer.sync()
+
+    indexer._rollback(fork_block)
+    assert indexer.checkpoint() == fork_block
+    statuses = indexer.statuses(['ORD1', 'ORD2', 'ORD3'])
+    assert set(statuses) == {'ORD1', 'ORD2'}
+    assert statuses['ORD1']['status'] == 'Pending'
+    assert statuses['ORD1']['lat'] == pytest.approx(10.70)
+    assert indexer.stats()['events'] == 2
+    indexer.close()
+
+
+# Reorg thật trên eth-tester (revert snapshot rồi nối chuỗi khác): sync phát hiện hash lệch và lập chỉ mục lại
+def test_sync_detects_reorg(client, db_path):
+    tester = client.w3.provider.ethereum_tester
+    _submit(client, [('ORD1', 10.70, 'Pending')])
+    snapshot = tester.take_snapshot()
+    _submit(client, [('ORD1', 10.75, 'Delivered'), ('ORD2', 10.80, 'Pending')])
+    indexer = _indexer(client, db_path)
+    indexer.sync()
+    assert indexer.status('ORD1')['status'] == 'Delivered'
+
+    tester.revert_to_snapshot(snapshot)
+    client.nonces.reset()
+    _submit(client, [('ORD1', 10.71, 'Failed - Customer Absent'), ('ORD3', 10.90, 'Pending'),
+                     ('ORD3', 10.91, 'In Transit')])
+    indexer.sync()
+    statuses = indexer.statuses(['ORD1', 'ORD2', 'ORD3'])
+    assert set(statuses) == {'ORD1', 'ORD3'}
+    assert statuses['ORD1']['status'] == 'Failed - Customer Absent'
+    assert statuses['ORD3']['status'] == 'In Transit'
+    assert [event['status'] for event in indexer.history('ORD1')] == ['Pending', 'Failed - Customer Absent']
+    indexer.close()
+
+
+# Chuỗi sau reorg ngắn hơn block đã lập chỉ mục: block không còn tồn tại được coi như hash lệch và rollback
+def test_sync_recovers_when_reorged_chain_is_shorter(client, db_path):
+    tester = client.w3.provider.ethereum_tester
+    _submit(client, [('ORD1', 10.70, 'Pending')])
+    snapshot = tester.take_snapshot()
+    _submit(client, [('ORD1', 10.75, 'In Transit'), ('ORD2', 10.80, 'Pending'), ('ORD1', 10.76, 'Delivered')])
+    indexer = _indexer(client, db_path)
+    indexer.sync()
+    old_checkpoint = indexer.checkpoint()
+
+    tester.revert_to_snapshot(snapshot)
+    client.nonces.reset()
+    _submit(client, [('ORD3', 10.90, 'Pending')])
+    assert client.w3.eth.block_number < old_checkpoint
+    assert indexer.sync() == 1
+    assert indexer.checkpoint() == client.w3.eth.block_number
+    statuses = indexer.statuses(['ORD1', 'ORD2', 'ORD3'])
+    assert set(statuses) == {'ORD1', 'ORD3'}
+    assert statuses['ORD1']['status'] == 'Pending'
+    indexer.close()
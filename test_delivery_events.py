@@ -0,0 +1,75 @@
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+import delivery_events
+from delivery_events import COMPACT_FANOUT, DeliveryEventStore
+
+DISPATCH = 1_700_000_000
+
+
+def _record_orders(store, count, start=0):
+    for i in range(start, start + count):
+        locations = pd.DataFrame({'name': ['Depot', f'ORD{i}']})
+        store.record_route_etas([{'vehicle': 1, 'nodes': [0, 1, 0], 'times': [30.0, 40.0]}], locations,
+                                dispatch_time=DISPATCH)
+        status = 'Delivered' if i % 3 else 'Failed - Customer Absent'
+        store.record_status(f'ORD{i}', status, event_time=DISPATCH + 600)
+
+
+def test_rollups_survive_reopen(tmp_path):
+    store = DeliveryEventStore(str(tmp_path), flush_every=4)
+    _record_orders(store, 30)
+    store.record_route_etas([{'vehicle': 2, 'nodes': [0, 1, 0], 'times': [15.0, 25.0]}],
+                            pd.DataFrame({'name': ['Depot', 'OPEN1']}), dispatch_time=DISPATCH)
+    store.flush()
+    kpis = store.kpis()
+    assert kpis['completed'] == 30 and kpis['open_orders'] == 1
+
+    reopened = DeliveryEventStore(str(tmp_path))
+    assert reopened.kpis() == kpis
+    assert reopened.open_orders['OPEN1']['vehicle'] == 2
+    assert len(reopened.scan()) == kpis['events']
+
+
+# Mỗi lần flush chỉ ghi file tầng 0; đủ COMPACT_FANOUT file thì gộp lên tầng trên, không gộp toàn bộ lịch sử
+def test_compaction_is_tiered(tmp_path):
+    store = DeliveryEventStore(str(tmp_path), flush_every=2)
+    _record_orders(store, COMPACT_FANOUT ** 2)
+    store.flush()
+    tiers = [delivery_events._tier(name) for name in os.listdir(tmp_path) if name.startswith('part-')]
+    assert max(tiers) == 2
+    assert tiers.count(0) < COMPACT_FANOUT
+    assert len(store.scan()) == store.kpis()['events']
+
+
+# Dừng sau khi ghi file gộp nhưng trước khi xóa file nguồn: mở lại không được cộng trùng
+def test_interrupted_compaction_is_not_double_counted(tmp_path, monkeypatch):
+    store = DeliveryEventStore(str(tmp_path), flush_every=2)
+    monkeypatch.setattr(DeliveryEventStore, '_recover_compaction', lambda self: None)
+    _record_orders(store, COMPACT_FANOUT)
+    kpis = store.kpis()
+    assert store.compaction is not None
+    monkeypatch.undo()
+
+    reopened = DeliveryEventStore(str(tmp_path))
+    assert reopened.compaction is None
+    assert reopened.kpis() == kpis
+    assert len(reopened.scan()) == kpis['events']
+
+
+# Một hàm atexit chung ghi nốt sự kiện còn chờ của mọi kho đang mở (không đăng ký thêm cho mỗi kho)
+def test_exit_flush_covers_every_open_store(tmp_path, monkeypatch):
+    registered = []
+    monkeypatch.setattr(delivery_events.atexit, 'register', registered.append)
+    stores = [DeliveryEventStore(str(tmp_path / name), flush_every=1000, flush_interval_s=60) for name in 'ab']
+    for store in stores:
+        store.record_status('ORD1', 'Delivered', event_time=DISPATCH)
+    assert registered == []
+    delivery_events._flush_open_stores()
+    for store in stores:
+        assert len(store.scan()) == 1
+        store.flush()
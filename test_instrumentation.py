@@ -0,0 +1,33 @@
+import instrumentation
+from instrumentation import collect, span
+
+
+# collect() gom thời gian các span kể cả khi đo đang tắt, và không ghi vào thống kê của tiến trình
+def test_collect_gathers_spans_while_disabled(monkeypatch):
+    monkeypatch.setattr(instrumentation, '_enabled', False)
+    instrumentation.reset()
+    with collect() as stages:
+        with span('routing.solve'):
+            pass
+        with span('routing.solve'):
+            pass
+        with span('routing.route_details'):
+            pass
+    assert set(stages) == {'routing.solve', 'routing.route_details'}
+    assert all(seconds >= 0 for seconds in stages.values())
+    assert instrumentation.snapshot() == []
+    with span('routing.solve'):
+        pass
+    assert set(stages) == {'routing.solve', 'routing.route_details'}
+
+
+# Thời gian đo ở tiến trình khác được ghi lại bằng observe() khi đo đang bật
+def test_observe_records_external_timings(monkeypatch):
+    monkeypatch.setattr(instrumentation, '_enabled', True)
+    instrumentation.reset()
+    instrumentation.observe('routing_service.solve', 0.2)
+    instrumentation.observe('routing_service.solve', 0.4)
+    (stats,) = instrumentation.snapshot()
+    assert stats['stage'] == 'routing_service.solve' and stats['count'] == 2
+    assert stats['max_s'] == 0.4
+    instrumentation.reset()
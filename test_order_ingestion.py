@@ -0,0 +1,68 @@
+import io
+
+import pandas as pd
+import pytest
+
+from order_ingestion import DEPOT, DUPLICATE_ERROR, load_orders, validate_orders
+
+ORDERS_CSV = """id,address,lat,lon
+A,1 Le Loi,10.77,106.70
+B,,10.78,106.70
+B,2 Hai Ba Trung,10.79,106.70
+C,3 Pasteur,95,106.70
+D,4 Nguyen Hue,10.80,abc
+B,5 Ly Tu Trong,10.81,106.70
+A,6 Dong Khoi,10.82,106.70
+,7 Ham Nghi,10.83,106.70
+E,8 Le Duan,10.84,106.71
+"""
+
+
+def test_validate_orders_flags_each_reason():
+    chunk = pd.read_csv(io.StringIO(ORDERS_CSV), dtype={'id': str, 'address': str})
+    valid, errors = validate_orders(chunk, pd.Index(['E']), row_offset=10)
+    assert valid['id'].tolist() == ['A']
+    reasons = dict(zip(errors['row'], errors['error']))
+    assert reasons[12] == 'Thiếu địa chỉ'
+    assert reasons[13] == DUPLICATE_ERROR
+    assert reasons[14] == 'Vĩ độ không hợp lệ'
+    assert reasons[15] == 'Kinh độ không hợp lệ'
+    assert reasons[17] == DUPLICATE_ERROR
+    assert reasons[18] == 'Thiếu ID đơn hàng'
+    assert reasons[19] == DUPLICATE_ERROR  # Đã gặp ở khối trước
+
+
+# Kết quả không phụ thuộc cách chia khối: ID của dòng lỗi cũng được tính là đã gặp
+@pytest.mark.parametrize('chunk_size', [1, 2, 4, 100])
+def test_duplicates_are_independent_of_chunk_boundaries(chunk_size):
+    orders, df_locations, errors, error_count = load_orders(io.StringIO(ORDERS_CSV), 'orders.csv',
+                                                            chunk_size=chunk_size)
+    assert [order['id'] for order in orders] == ['A', 'E']
+    assert error_count == 7
+    assert errors['row'].tolist() == [2, 3, 4, 5, 6, 7, 8]
+    assert errors.loc[errors['row'].isin([3, 6, 7]), 'error'].eq(DUPLICATE_ERROR).all()
+    assert df_locations['name'].tolist() == [DEPOT['name'], 'A', 'E']
+    assert df_locations.loc[0, ['lat', 'lon']].tolist() == [DEPOT['lat'], DEPOT['lon']]
+
+
+def test_error_table_is_capped_but_counted():
+    rows = '\n'.join(f'X{i},,10.7,106.7' for i in range(50))
+    _, _, errors, error_count = load_orders(io.StringIO('id,address,lat,lon\n' + rows), 'orders.csv', chunk_size=7,
+                                            max_errors=10)
+    assert len(errors) == 10 and error_count == 50
+
+
+def test_missing_column_and_unknown_format_are_rejected():
+    with pytest.raises(ValueError, match='thiếu cột'):
+        load_orders(io.StringIO('id,address,lat\nA,x,10.7\n'), 'orders.csv')
+    with pytest.raises(ValueError, match='không hỗ trợ'):
+        load_orders(io.StringIO(''), 'orders.xlsx')
+
+
+def test_parquet_matches_csv(tmp_path):
+    pytest.importorskip('pyarrow')
+    path = tmp_path / 'orders.parquet'
+    pd.read_csv(io.StringIO(ORDERS_CSV), dtype={'id': str, 'address': str}).to_parquet(path)
+    orders, _, errors, _ = load_orders(str(path), chunk_size=3)
+    assert [order['id'] for order in orders] == ['A', 'E']
+    assert errors['row'].tolist() == [2, 3, 4, 5, 6, 7, 8]
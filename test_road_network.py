@@ -0,0 +1,25 @@
+import pytest
+
+pytest.importorskip('scipy')
+
+from road_network import HIGHWAY_SPEEDS, parse_osm
+
+OSM_WITH_TAGGED_NODE = """<osm>
+<node id="1" lat="10.000" lon="106.000"><tag k="barrier" v="gate"/><tag k="access" v="private"/>
+<tag k="maxspeed" v="5"/><tag k="oneway" v="yes"/></node>
+<node id="2" lat="10.010" lon="106.000"/>
+<way id="10"><nd ref="1"/><nd ref="2"/><tag k="highway" v="residential"/></way>
+</osm>
+"""
+
+
+# Tag của nút đứng trước way đầu tiên không được ảnh hưởng tới way đó
+def test_node_tags_do_not_leak_into_next_way(tmp_path):
+    path = tmp_path / 'extract.osm'
+    path.write_text(OSM_WITH_TAGGED_NODE)
+    node_ids, _, _, way_refs, speeds, directions = parse_osm(str(path))
+    assert node_ids.tolist() == [1, 2]
+    assert len(way_refs) == 1
+    assert way_refs[0].tolist() == [1, 2]
+    assert speeds[0] == HIGHWAY_SPEEDS['residential']
+    assert directions[0] == 0
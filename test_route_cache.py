@@ -0,0 +1,55 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from route_cache import RouteCache, cached_optimize_route, make_route_key
+
+
+def _locations(lats, lons):
+    return pd.DataFrame({'name': [f'P{i}' for i in range(len(lats))], 'lat': lats, 'lon': lons})
+
+
+# Cùng ma trận và tham số nhưng khác tọa độ (hệ số giao thông khác) thì khóa khác
+def test_key_depends_on_coordinates():
+    matrix = np.arange(9, dtype=float).reshape(3, 3)
+    base = _locations([10.70, 10.75, 10.80], [106.60, 106.65, 106.70])
+    moved = _locations([10.70, 10.75, 10.81], [106.60, 106.65, 106.70])
+    assert make_route_key(matrix, base, num_vehicles=2) == make_route_key(matrix, base.copy(), num_vehicles=2)
+    assert make_route_key(matrix, base, num_vehicles=2) != make_route_key(matrix, moved, num_vehicles=2)
+
+
+def test_cached_optimize_route_solves_each_location_set_once():
+    matrix = np.ones((2, 2))
+    calls = []
+
+    def solver(distance_matrix, df_locations, **kwargs):
+        calls.append(df_locations['lat'].tolist())
+        return [[0, 1, 0]], [], float(len(calls))
+
+    cache = RouteCache()
+    first = _locations([10.70, 10.75], [106.6, 106.6])
+    second = _locations([10.70, 10.90], [106.6, 106.6])
+    assert cached_optimize_route(cache, matrix, first, solver=solver)[2] == 1.0
+    assert cached_optimize_route(cache, matrix, second, solver=solver)[2] == 2.0
+    assert cached_optimize_route(cache, matrix, first, solver=solver)[2] == 1.0
+    assert len(calls) == 2
+
+
+# Thư mục trên đĩa bị giới hạn dung lượng: file ít dùng nhất bị xóa, kể cả sau khi mở lại cache
+def test_disk_store_evicts_least_recently_used(tmp_path):
+    payload = b'x' * 1000
+    size = len(pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL))
+    cache = RouteCache(max_entries=1, disk_dir=str(tmp_path), max_disk_bytes=3 * size)
+    for key in ['a', 'b', 'c']:
+        cache.put(key, payload)
+    assert cache.get('a') == payload  # Đọc lại từ đĩa: 'a' thành mới dùng nhất
+    cache.put('d', payload)
+    assert sorted(os.listdir(tmp_path)) == ['a.pkl', 'c.pkl', 'd.pkl']
+    assert cache.stats()['disk_evictions'] == 1
+    assert cache.stats()['disk_bytes'] == 3 * size
+
+    reopened = RouteCache(disk_dir=str(tmp_path), max_disk_bytes=2 * size)
+    assert reopened.stats()['disk_entries'] == 2
+    assert len(os.listdir(tmp_path)) == 2
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('ortools')
+
+import routing
+from decomposition import optimize_route_clustered
+from distance_engine import build_distance_matrix
+from routing import build_time_matrix, optimize_route, reoptimize_route
+
+SPEED_KM_PER_HOUR = 30
+
+
+# Bỏ hệ số giao thông ngẫu nhiên (khi chưa có mô hình) để kết quả giải lặp lại được
+@pytest.fixture(autouse=True)
+def no_traffic(monkeypatch):
+    monkeypatch.setattr(routing, 'get_traffic_multipliers', lambda lats, lons, departure=None: np.ones((len(lats),) * 2))
+
+
+# Depot ở giữa và 8 điểm trên hai vòng tròn; ma trận khoảng cách Euclid (km) trên lưới phẳng
+@pytest.fixture
+def instance():
+    angles = np.linspace(0, 2 * np.pi, 8, endpoint=False)
+    radius = np.where(np.arange(8) % 2 == 0, 3.0, 6.0)
+    xy = np.vstack([[0.0, 0.0], np.column_stack([radius * np.cos(angles), radius * np.sin(angles)])])
+    df_locations = pd.DataFrame({
+        'name': ['Depot'] + [f'P{i}' for i in range(1, 9)],
+        'lat': 10.77 + xy[:, 1] / 111.0,
+        'lon': 106.70 + xy[:, 0] / 111.0,
+        'demand': [0, 2, 3, 1, 4, 2, 3, 1, 2],
+    })
+    distance_matrix = np.hypot(*(xy[:, None, :] - xy[None, :, :]).transpose(2, 0, 1))
+    return distance_matrix, df_locations
+
+
+def _visits(routes):
+    return sorted(node for route in routes for node in route[1:-1])
+
+
+def test_capacity_is_respected(instance):
+    distance_matrix, df_locations = instance
+    routes, route_details, _ = optimize_route(distance_matrix, df_locations, num_vehicles=3, vehicle_capacities=7,
+                                              speed_km_per_hour=SPEED_KM_PER_HOUR, time_limit_s=1)
+    assert _visits(routes) == list(range(1, 9))
+    assert all(route[0] == 0 and route[-1] == 0 for route in routes)
+    assert max(df_locations['demand'].iloc[route[1:-1]].sum() for route in routes) <= 7
+    assert len(route_details) == 3
+
+
+# Mỗi điểm được đến trong khung giờ của nó và thời gian đến khớp thời gian di chuyển trên ma trận
+def test_time_windows_are_respected(instance):
+    distance_matrix, df_locations = instance
+    tw_start = [0, 0, 20, 0, 40, 0, 20, 0, 40]
+    tw_end = [300, 30, 60, 45, 90, 45, 60, 30, 90]
+    df_locations = df_locations.assign(tw_start=tw_start, tw_end=tw_end)
+    routes, route_details, _ = optimize_route(distance_matrix, df_locations, num_vehicles=2,
+                                              speed_km_per_hour=SPEED_KM_PER_HOUR, service_time_min=5,
+                                              time_limit_s=1)
+    assert _visits(routes) == list(range(1, 9))
+    time_matrix = build_time_matrix(distance_matrix, SPEED_KM_PER_HOUR, 0, 5)
+    for route, detail in zip(routes, route_details):
+        arrivals = [0] + detail['times']
+        for k, node in enumerate(route[1:], start=1):
+            assert arrivals[k] >= arrivals[k - 1] + time_matrix[route[k - 1], node]
+            if node != 0:
+                assert tw_start[node] <= arrivals[k] <= tw_end[node]
+
+
+def test_infeasible_capacity_is_rejected(instance):
+    distance_matrix, df_locations = instance
+    with pytest.raises(ValueError, match='tải trọng'):
+        optimize_route(distance_matrix, df_locations, num_vehicles=2, vehicle_capacities=5)
+
+
+# Tái tối ưu: tiền tố đã giao của mỗi xe giữ nguyên, đơn bị hủy biến mất và đơn mới được phục vụ đúng một lần
+def test_reoptimize_keeps_visited_prefixes(instance):
+    distance_matrix, df_locations = instance
+    first = [0, 1, 2, 3, 4, 5, 6]
+    routes, _, _ = optimize_route(distance_matrix[np.ix_(first, first)], df_locations.iloc[first], num_vehicles=2,
+                                  time_limit_s=1)
+    visited = [min(2, len(route) - 2) for route in routes]
+    prefixes = [route[:count + 1] for route, count in zip(routes, visited)]
+    removed = next(node for route, count in zip(routes, visited) for node in route[count + 1:-1])
+
+    new_routes, route_details, _ = reoptimize_route(distance_matrix, df_locations, routes, remove_nodes=[removed],
+                                                    insert_nodes=[7, 8], visited=visited, time_limit_s=1)
+    for route, prefix in zip(new_routes, prefixes):
+        assert route[:len(prefix)] == prefix
+        assert route[-1] == 0
+    assert _visits(new_routes) == sorted(set(range(1, 9)) - {removed})
+    assert [detail['nodes'] for detail in route_details] == new_routes
+
+
+# Giải mới và tái tối ưu dùng chung một bước kiểm tra metaheuristic
+def test_metaheuristic_is_validated(instance):
+    distance_matrix, df_locations = instance
+    for solve, extra in [(optimize_route, ()), (reoptimize_route, ([[0, 1, 0], [0, 2, 0]],))]:
+        with pytest.raises(ValueError, match='không hợp lệ'):
+            solve(distance_matrix, df_locations, *extra, metaheuristic='hill_climbing')
+        with pytest.raises(ValueError, match='time_limit_s'):
+            solve(distance_matrix, df_locations, *extra, metaheuristic='tabu_search', time_limit_s=None)
+
+
+# Chia cụm rồi ghép (có hoặc không cải thiện xuyên cụm) phục vụ đúng tập điểm như giải một lần
+@pytest.mark.parametrize('improve', [False, True])
+@pytest.mark.parametrize('method', ['sweep', 'kmeans'])
+def test_clustered_solve_visits_same_stops_as_single_solve(instance, method, improve):
+    _, df_locations = instance
+    distance_matrix = build_distance_matrix(df_locations['lat'].to_numpy(), df_locations['lon'].to_numpy())
+    single, _, _ = optimize_route(distance_matrix, df_locations, num_vehicles=3, time_limit_s=1)
+    routes, route_details, total_distance = optimize_route_clustered(df_locations, num_clusters=3, method=method,
+                                                                     max_workers=1, improve=improve, time_limit_s=1)
+    assert _visits(routes) == _visits(single) == list(range(1, 9))
+    assert all(route[0] == 0 and route[-1] == 0 for route in routes)
+    assert [detail['nodes'] for detail in route_details] == routes
+    assert total_distance == pytest.approx(sum(detail['distance'] for detail in route_details))
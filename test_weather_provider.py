@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+from weather_provider import DEFAULT_WEATHER, StubWeatherBackend, WeatherProvider
+
+
+@pytest.fixture
+def backend():
+    return StubWeatherBackend({'Ho Chi Minh City': 'Rain', 'Ha Noi': 'Clear'})
+
+
+@pytest.fixture
+def make_provider(backend):
+    providers = []
+
+    def make(**kwargs):
+        providers.append(WeatherProvider(backend, **kwargs))
+        return providers[-1]
+
+    yield make
+    for provider in providers:
+        provider.close()
+
+
+# Chờ các lần làm mới ở nền chạy xong
+def _drain(provider, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while provider._pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not provider._pending
+
+
+def test_first_get_fetches_then_serves_from_cache(make_provider, backend):
+    provider = make_provider(ttl=600)
+    assert provider.get('Ho Chi Minh City') == ('Rainy', 1.2)
+    assert provider.get('Ho Chi Minh City') == ('Rainy', 1.2)
+    assert backend.calls == 1
+
+
+# Hết TTL: trả ngay giá trị cũ, làm mới ở nền, lần gọi sau nhận giá trị mới
+def test_expired_entry_is_served_stale_and_refreshed(make_provider, backend):
+    provider = make_provider(ttl=0.05)
+    assert provider.get('Ho Chi Minh City') == ('Rainy', 1.2)
+    backend.conditions['Ho Chi Minh City'] = 'Clear'
+    backend.delay = 0.2
+    time.sleep(0.06)
+    started = time.monotonic()
+    assert provider.get('Ho Chi Minh City') == ('Rainy', 1.2)
+    assert time.monotonic() - started < backend.delay
+    _drain(provider)
+    assert backend.calls == 2
+    assert provider.get('Ho Chi Minh City') == DEFAULT_WEATHER
+
+
+# Nhiều lần gọi khi đang làm mới chỉ tạo một lần gọi backend cho mỗi thành phố
+def test_concurrent_refreshes_are_deduplicated(make_provider, backend):
+    provider = make_provider(ttl=0.0)
+    provider.get('Ha Noi')
+    backend.delay = 0.1
+    for _ in range(5):
+        provider.get('Ha Noi')
+    _drain(provider)
+    assert backend.calls == 2
+
+
+# Backend lỗi khi chưa có giá trị: trả mặc định và thử lại ở lần gọi sau
+def test_backend_error_falls_back_and_retries(make_provider, backend, monkeypatch):
+    provider = make_provider(ttl=600)
+    fetch = backend.fetch
+
+    def unreachable(city):
+        raise ConnectionError('timeout')
+
+    monkeypatch.setattr(backend, 'fetch', unreachable)
+    assert provider.get('Ho Chi Minh City') == DEFAULT_WEATHER
+
+    monkeypatch.setattr(backend, 'fetch', fetch)
+    provider.get('Ho Chi Minh City')
+    _drain(provider)
+    assert provider.get('Ho Chi Minh City') == ('Rainy', 1.2)
+
+
+def test_get_many_fetches_missing_cities_in_parallel(make_provider, backend):
+    provider = make_provider(ttl=600, max_workers=4)
+    backend.delay = 0.2
+    started = time.monotonic()
+    results = provider.get_many(['Ho Chi Minh City', 'Ha Noi', 'Da Nang'])
+    assert time.monotonic() - started < 2 * backend.delay
+    assert results == {'Ho Chi Minh City': ('Rainy', 1.2), 'Ha Noi': DEFAULT_WEATHER, 'Da Nang': DEFAULT_WEATHER}
+    assert backend.calls == 3
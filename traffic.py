@@ -0,0 +1,222 @@
+import os
+import threading
+
+import numpy as np
+
+BUCKET_MIN = 15
+NUM_BUCKETS = 24 * 60 // BUCKET_MIN  # 96 khung 15 phút mỗi ngày
+DEFAULT_ZONE_DEG = 0.01  # Cạnh ô vùng (~1.1 km)
+MIN_SAMPLES = 5          # Số mẫu tối thiểu để tin hệ số của một ô (vùng, khung giờ); ít hơn thì dùng hệ số chung
+MULTIPLIER_RANGE = (0.7, 3.0)
+DEFAULT_HORIZON_MIN = 120  # Khoảng thời gian lấy trung bình hệ số cho ma trận chi phí tĩnh của solver
+MAX_ETA_PASSES = 10
+DEFAULT_HISTORY_FILE = 'train.csv'
+
+# Hồ sơ trong ngày mặc định (giờ cao điểm sáng/chiều 1.3 như "Traffic Jam" cũ, đêm thông thoáng) khi lịch sử
+# chỉ có dữ liệu theo ngày như train.csv; mỗi phần tử là (phút bắt đầu, phút kết thúc, hệ số)
+DEFAULT_DAY_PROFILE = [(0, 360, 0.9), (360, 420, 1.1), (420, 540, 1.3), (540, 960, 1.05), (960, 1140, 1.3),
+                       (1140, 1260, 1.1), (1260, 1440, 0.95)]
+
+
+def _profile_array(profile=DEFAULT_DAY_PROFILE):
+    starts = np.arange(NUM_BUCKETS) * BUCKET_MIN
+    values = np.ones(NUM_BUCKETS)
+    for start, end, value in profile:
+        values[(starts >= start) & (starts < end)] = value
+    return values
+
+
+# Thời điểm xuất phát -> (thứ trong tuần 0-6, phút trong ngày); nhận datetime, Timestamp, chuỗi ISO hoặc None (bây giờ)
+def departure_parts(departure=None):
+    import pandas as pd
+
+    timestamp = pd.Timestamp.now() if departure is None else pd.Timestamp(departure)
+    return int(timestamp.weekday()), timestamp.hour * 60 + timestamp.minute + timestamp.second / 60
+
+
+# Mô hình giao thông phụ thuộc thời gian: tensor hệ số tắc nghẽn (thứ x vùng x khung 15 phút) float32.
+# Vùng là ô lưới lat/lon; điểm ngoài lưới hoặc ô thiếu dữ liệu dùng hồ sơ chung (thứ x khung).
+# Hệ số của cung (i, j) là trung bình hệ số vùng của hai đầu mút
+class TrafficModel:
+    def __init__(self, tensor, global_profile, origin=(0.0, 0.0), zone_deg=DEFAULT_ZONE_DEG, shape=(0, 0)):
+        self.tensor = np.asarray(tensor, dtype=np.float32)
+        self.global_profile = np.asarray(global_profile, dtype=np.float32)
+        self.origin = tuple(float(value) for value in origin)
+        self.zone_deg = float(zone_deg)
+        self.shape = tuple(int(value) for value in shape)  # (số hàng, số cột) của lưới vùng
+
+    @property
+    def num_zones(self):
+        return self.shape[0] * self.shape[1]
+
+    # Dựng từ lịch sử giao hàng: value_col là thời gian giao; hệ số = trung vị của nhóm / trung vị toàn bộ.
+    # Có giờ trong ngày thì học hồ sơ theo khung 15 phút, có lat/lon thì học theo vùng; thiếu thì dùng
+    # DEFAULT_DAY_PROFILE nhân hệ số theo thứ. Ngày mưa bị loại vì ảnh hưởng thời tiết được tính riêng
+    @classmethod
+    def from_history(cls, df, date_col='date', value_col='delivery_time', lat_col='lat', lon_col='lon',
+                     zone_deg=DEFAULT_ZONE_DEG, min_samples=MIN_SAMPLES, weather_col='weather'):
+        import pandas as pd
+
+        if weather_col in df.columns:
+            df = df[df[weather_col].astype(str).str.lower() != 'rainy']
+        df = df.dropna(subset=[date_col, value_col])
+        if df.empty:
+            raise ValueError("Lịch sử giao hàng rỗng, không dựng được mô hình giao thông!")
+        timestamps = pd.to_datetime(df[date_col])
+        values = df[value_col].to_numpy(dtype=np.float64)
+        overall = np.median(values)
+        weekdays = timestamps.dt.weekday.to_numpy()
+        minutes = (timestamps.dt.hour * 60 + timestamps.dt.minute).to_numpy()
+        buckets = minutes // BUCKET_MIN
+
+        weekday_factor = np.ones(7)
+        for day in range(7):
+            selected = values[weekdays == day]
+            if len(selected) >= min_samples:
+                weekday_factor[day] = np.median(selected) / overall
+
+        if minutes.any():
+            # Có giờ trong ngày: hồ sơ theo khung, khung thiếu mẫu lấy hồ sơ mặc định
+            day_profile = _profile_array()
+            ratios = values / overall
+            counts = np.bincount(buckets, minlength=NUM_BUCKETS)
+            for bucket in np.flatnonzero(counts >= min_samples):
+                day_profile[bucket] = np.median(ratios[buckets == bucket])
+            normalised = values / weekday_factor[weekdays]
+        else:
+            day_profile = _profile_array()
+            normalised = values
+        global_profile = np.clip(weekday_factor[:, None] * day_profile[None, :], *MULTIPLIER_RANGE)
+
+        origin, shape = (0.0, 0.0), (0, 0)
+        tensor = np.zeros((7, 0, NUM_BUCKETS))
+        if lat_col in df.columns and lon_col in df.columns and minutes.any():
+            lats = df[lat_col].to_numpy(dtype=np.float64)
+            lons = df[lon_col].to_numpy(dtype=np.float64)
+            origin = (lats.min(), lons.min())
+            rows = ((lats - origin[0]) // zone_deg).astype(np.int64)
+            cols = ((lons - origin[1]) // zone_deg).astype(np.int64)
+            shape = (int(rows.max()) + 1, int(cols.max()) + 1)
+            zones = rows * shape[1] + cols
+            # Hệ số vùng = trung vị (giá trị đã bỏ hệ số thứ / hồ sơ ngày) theo (vùng, khung), nhân lại hồ sơ chung
+            residual = normalised / overall / day_profile[buckets]
+            tensor = np.repeat(global_profile[:, None, :], shape[0] * shape[1], axis=1)
+            keys = zones * NUM_BUCKETS + buckets
+            order = np.argsort(keys, kind='stable')
+            unique, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+            for key, start, count in zip(unique, starts, counts):
+                if count >= min_samples:
+                    zone, bucket = divmod(int(key), NUM_BUCKETS)
+                    factor = np.median(residual[order[start:start + count]])
+                    tensor[:, zone, bucket] = np.clip(global_profile[:, bucket] * factor, *MULTIPLIER_RANGE)
+        return cls(tensor, global_profile, origin, zone_deg, shape)
+
+    def save(self, path):
+        np.savez_compressed(path, tensor=self.tensor, global_profile=self.global_profile,
+                            origin=np.array(self.origin), zone_deg=np.array(self.zone_deg), shape=np.array(self.shape))
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['tensor'], data['global_profile'], tuple(data['origin']), float(data['zone_deg']),
+                       tuple(data['shape']))
+
+    # Chỉ số vùng của mỗi điểm (-1 nếu nằm ngoài lưới)
+    def zone_of(self, lats, lons):
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        if not self.num_zones:
+            return np.full(lats.shape, -1, dtype=np.int64)
+        rows = np.floor((lats - self.origin[0]) / self.zone_deg).astype(np.int64)
+        cols = np.floor((lons - self.origin[1]) / self.zone_deg).astype(np.int64)
+        inside = (rows >= 0) & (rows < self.shape[0]) & (cols >= 0) & (cols < self.shape[1])
+        return np.where(inside, rows * self.shape[1] + cols, -1)
+
+    # Hồ sơ hệ số của từng điểm trong một ngày (số điểm x 96)
+    def node_profiles(self, lats, lons, weekday):
+        zones = self.zone_of(lats, lons)
+        profiles = np.repeat(self.global_profile[weekday][None, :], len(zones), axis=0)
+        inside = zones >= 0
+        if inside.any():
+            profiles[inside] = self.tensor[weekday, zones[inside]]
+        return profiles
+
+    # Hệ số của từng điểm, trung bình các khung trong [xuất phát, xuất phát + horizon_min)
+    def node_factors(self, lats, lons, departure=None, horizon_min=DEFAULT_HORIZON_MIN):
+        weekday, minute = departure_parts(departure)
+        start = int(minute // BUCKET_MIN)
+        window = (start + np.arange(max(1, int(np.ceil(horizon_min / BUCKET_MIN))))) % NUM_BUCKETS
+        return self.node_profiles(lats, lons, weekday)[:, window].mean(axis=1)
+
+    # Ma trận hệ số cung cho solver
+    def arc_multipliers(self, lats, lons, departure=None, horizon_min=DEFAULT_HORIZON_MIN):
+        node_factor = self.node_factors(lats, lons, departure, horizon_min)
+        return 0.5 * (node_factor[:, None] + node_factor[None, :])
+
+    # Hệ số của từng chặng from_nodes[i] -> to_nodes[i], cùng giá trị với arc_multipliers nhưng không dựng ma trận
+    def leg_multipliers(self, lats, lons, from_nodes, to_nodes, departure=None, horizon_min=DEFAULT_HORIZON_MIN):
+        node_factor = self.node_factors(lats, lons, departure, horizon_min)
+        return 0.5 * (node_factor[np.asarray(from_nodes)] + node_factor[np.asarray(to_nodes)])
+
+    # ETA phụ thuộc thời gian cho nhiều tuyến: thời gian mỗi chặng = thời gian thông thoáng x hệ số của khung
+    # lúc xe rời điểm đầu chặng. Mỗi lượt tính lại mọi chặng của mọi tuyến cùng lúc (cumsum theo tuyến) và lặp
+    # đến khi khung giờ của các chặng không đổi (thường 2-3 lượt). Trả về thời điểm đến (phút từ lúc xuất phát).
+    # leg_km: quãng đường các chặng đã tính sẵn (nối theo thứ tự tuyến) thay cho distance_matrix khi không có ma trận
+    def route_etas(self, routes, distance_matrix, lats, lons, speed_km_per_hour, departure=None, leg_km=None):
+        weekday, minute = departure_parts(departure)
+        routes = [np.asarray(route, dtype=np.int64) for route in routes]
+        sources = np.concatenate([route[:-1] for route in routes]) if routes else np.array([], dtype=np.int64)
+        targets = np.concatenate([route[1:] for route in routes]) if routes else np.array([], dtype=np.int64)
+        lengths = np.array([max(len(route) - 1, 0) for route in routes])
+        if not len(sources):
+            return [np.array([]) for _ in routes]
+        route_start = np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+        profiles = self.node_profiles(lats, lons, weekday)
+        legs = np.asarray(leg_km, dtype=np.float64) if leg_km is not None else np.asarray(distance_matrix)[sources, targets]
+        free_flow = legs / speed_km_per_hour * 60
+        leg_times = free_flow.copy()
+        buckets = None
+        for _ in range(MAX_ETA_PASSES):
+            arrivals = np.cumsum(leg_times)
+            arrivals -= np.r_[0.0, arrivals][route_start]  # Cộng dồn riêng từng tuyến
+            departures = minute + arrivals - leg_times
+            new_buckets = (departures // BUCKET_MIN).astype(np.int64) % NUM_BUCKETS
+            if buckets is not None and np.array_equal(new_buckets, buckets):
+                break
+            buckets = new_buckets
+            leg_times = free_flow * 0.5 * (profiles[sources, buckets] + profiles[targets, buckets])
+        arrivals = np.cumsum(leg_times)
+        arrivals -= np.r_[0.0, arrivals][route_start]
+        return np.split(arrivals, np.cumsum(lengths)[:-1])
+
+
+_model = None
+_model_loaded = False
+_lock = threading.Lock()
+
+
+def register_traffic_model(model):
+    global _model, _model_loaded
+    _model, _model_loaded = model, True
+
+
+# Mô hình dùng chung trong tiến trình: TRAFFIC_MODEL_FILE (.npz đã lưu) nếu có, nếu không dựng từ lịch sử
+# TRAFFIC_HISTORY_FILE (mặc định train.csv). Không có dữ liệu nào thì trả về None (solver dùng hệ số ngẫu nhiên cũ)
+def get_traffic_model():
+    global _model, _model_loaded
+    if _model_loaded:
+        return _model
+    with _lock:
+        if not _model_loaded:
+            model_path = os.environ.get('TRAFFIC_MODEL_FILE')
+            history_path = os.environ.get('TRAFFIC_HISTORY_FILE', DEFAULT_HISTORY_FILE)
+            if model_path and os.path.exists(model_path):
+                _model = TrafficModel.load(model_path)
+            elif history_path and os.path.exists(history_path):
+                import pandas as pd
+
+                _model = TrafficModel.from_history(pd.read_csv(history_path))
+            _model_loaded = True
+    return _model
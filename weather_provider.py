@@ -0,0 +1,127 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+OPENWEATHERMAP_URL = "http://api.openweathermap.org/data/2.5/weather"
+DEFAULT_WEATHER = ("Sunny", 1.0)
+
+
+# Quy đổi thời tiết thô sang (trạng thái, hệ số ETA) như get_weather ban đầu
+def weather_multiplier(condition):
+    if condition == "Rain":
+        return "Rainy", 1.2  # Tăng ETA 20%
+    return DEFAULT_WEATHER
+
+
+# Backend gọi OpenWeatherMap qua một phiên HTTP dùng chung, timeout chặt
+class OpenWeatherMapBackend:
+    def __init__(self, api_key, session=None, timeout=(2, 3), pool_size=10):
+        self.api_key = api_key
+        self.timeout = timeout
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+
+    def fetch(self, city):
+        response = self.session.get(OPENWEATHERMAP_URL, params={'q': city, 'appid': self.api_key}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()['weather'][0]['main']
+
+
+# Backend giả lập chạy offline để kiểm thử: trả về điều kiện cấu hình sẵn theo thành phố
+class StubWeatherBackend:
+    def __init__(self, conditions=None, default="Clear", delay=0.0):
+        self.conditions = dict(conditions or {})
+        self.default = default
+        self.delay = delay
+        self.calls = 0
+
+    def fetch(self, city):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return self.conditions.get(city, self.default)
+
+
+# Nguồn thời tiết có cache TTL theo thành phố; khi hết hạn, giá trị cũ được trả ngay
+# và làm mới ở nền (stale-while-revalidate)
+class WeatherProvider:
+    def __init__(self, backend, ttl=600, max_workers=4, wait_timeout=3.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout  # Thời gian chờ tối đa khi thành phố chưa có giá trị nào
+        self._cache = {}  # city -> (kết quả, thời điểm lấy)
+        self._pending = {}  # city -> future đang làm mới
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="weather")
+
+    def _refresh(self, city):
+        try:
+            result = weather_multiplier(self.backend.fetch(city))
+        except Exception:
+            # Giữ giá trị đã biết; nếu chưa có thì dùng mặc định nhưng cho phép thử lại ở lần gọi sau
+            with self._lock:
+                if city not in self._cache:
+                    self._cache[city] = (DEFAULT_WEATHER, float("-inf"))  # Luôn coi là hết hạn
+                return self._cache[city][0]
+        with self._lock:
+            self._cache[city] = (result, time.monotonic())
+        return result
+
+    def _schedule(self, city):
+        with self._lock:
+            future = self._pending.get(city)
+            if future is None:
+                future = self._executor.submit(self._refresh, city)
+                self._pending[city] = future
+                future.add_done_callback(lambda _: self._clear_pending(city))
+            return future
+
+    def _clear_pending(self, city):
+        with self._lock:
+            self._pending.pop(city, None)
+
+    def _cached(self, city):
+        with self._lock:
+            return self._cache.get(city)
+
+    def get(self, city="Ho Chi Minh City"):
+        entry = self._cached(city)
+        if entry is not None:
+            result, fetched_at = entry
+            if time.monotonic() - fetched_at > self.ttl:
+                self._schedule(city)
+            return result
+        future = self._schedule(city)
+        wait([future], timeout=self.wait_timeout)
+        entry = self._cached(city)
+        return entry[0] if entry is not None else DEFAULT_WEATHER
+
+    # Tra cứu nhiều thành phố cùng lúc (nhiều depot); các thành phố chưa có giá trị được lấy song song
+    def get_many(self, cities):
+        missing = [city for city in cities if self._cached(city) is None]
+        if missing:
+            wait([self._schedule(city) for city in missing], timeout=self.wait_timeout)
+        results = {}
+        for city in cities:
+            entry = self._cached(city)
+            if entry is None:
+                results[city] = DEFAULT_WEATHER
+                continue
+            if time.monotonic() - entry[1] > self.ttl:
+                self._schedule(city)
+            results[city] = entry[0]
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def close(self):
+        self._executor.shutdown(wait=False)